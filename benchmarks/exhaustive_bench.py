@@ -0,0 +1,136 @@
+"""
+Exhaustive evaluation of a local guesser: every secret of the game is played, the 210
+digit sets of the simplified game or the 5040 codes of the full game, and the full
+distribution of rounds to win is reported.
+
+The secrets are sharded across a process pool. The feedback tables are built once by the
+parent and shared with the workers through shared memory (`SharedFeedbackTable`), and
+the workers are spawned, so they neither rebuild nor unpickle the 50MB of tables.
+With `--scaling` the evaluation is repeated for 1, 2, 4... workers to check the speedup.
+
+Run with:
+    python -m benchmarks.exhaustive_bench [--guesser solver] [--full] [--workers 8] [--scaling]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from statistics import mean
+from time import perf_counter
+
+import numpy as np
+
+from feedback_table import (
+    CODE_COUNT, CODE_INDEX, FULL_FEEDBACKS, FULL_WIN, SIMPLIFIED_CODE_IDS, SIMPLIFIED_WIN,
+    FeedbackTableProvider, SharedFeedbackTable)
+
+SHARDS_PER_WORKER = 8
+
+
+def init_worker(table_name: str) -> None:
+    FeedbackTableProvider.set_table(SharedFeedbackTable.attach(table_name))
+
+
+def warm_up(seconds: float) -> None:
+    """Keeps a worker busy so that every worker of the pool gets started."""
+    time.sleep(seconds)
+
+
+def play_shard(
+        guesser_name: str, simplified: bool, secret_ids: list[int],
+        max_attempts: int) -> list[int]:
+    """Rounds the guesser needed for each secret of the shard, 0 for a lost game."""
+    from benchmarks.tournament import local_guessers
+
+    table = FeedbackTableProvider.get_table()
+    scores = table.simplified if simplified else table.full
+    win = SIMPLIFIED_WIN if simplified else FULL_WIN
+    create_guesser = local_guessers(simplified)[guesser_name]
+    rounds = []
+    for secret_id in secret_ids:
+        guesser = create_guesser()
+        result = 0
+        for attempt in range(1, max_attempts + 1):
+            guess = guesser.guess()
+            if guess is None:
+                break
+            score = int(scores[CODE_INDEX[guess.guess], secret_id])
+            if score == win:
+                result = attempt
+                break
+            guesser.provide_feedback((score, 0) if simplified else FULL_FEEDBACKS[score])
+        rounds.append(result)
+    return rounds
+
+
+def evaluate(
+        guesser_name: str, simplified: bool, workers: int, table_name: str,
+        max_attempts: int = 20) -> tuple[list[int], float]:
+    """Rounds for every secret, and the seconds taken once the workers were started."""
+    secrets = SIMPLIFIED_CODE_IDS if simplified else np.arange(CODE_COUNT)
+    shards = [shard.tolist() for shard in np.array_split(secrets, workers * SHARDS_PER_WORKER)]
+    with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker, initargs=(table_name,)) as pool:
+        for future in [pool.submit(warm_up, 0.2) for _ in range(workers)]:
+            future.result()
+        started_at = perf_counter()
+        futures = [
+            pool.submit(play_shard, guesser_name, simplified, shard, max_attempts)
+            for shard in shards if shard]
+        rounds = [result for future in futures for result in future.result()]
+        return rounds, perf_counter() - started_at
+
+
+def print_distribution(rounds: list[int]) -> None:
+    wins = [result for result in rounds if result > 0]
+    print(f"{len(rounds)} secrets, {len(rounds) - len(wins)} lost, "
+          f"mean {mean(wins):.4f} rounds, worst {max(wins)}")
+    counts = Counter(wins)
+    for attempt in sorted(counts):
+        share = counts[attempt] / len(rounds)
+        bar = "#" * round(share * 50)
+        print(f"{attempt:>3} rounds: {counts[attempt]:>5}  {share:>6.1%}  {bar}")
+
+
+def main():
+    from benchmarks.tournament import local_guessers
+    from policy_book import PolicyBookProvider
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--guesser", default="solver", help="local guesser of the tournament")
+    parser.add_argument("--full", action="store_true", help="full game instead of simplified")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes")
+    parser.add_argument("--max-attempts", type=int, default=20, help="rounds per game")
+    parser.add_argument("--scaling", action="store_true", help="time 1, 2, 4... workers")
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    simplified = not args.full
+    if args.guesser not in local_guessers(simplified):
+        raise SystemExit(f"Unknown guesser: {args.guesser}, "
+                         f"guessers: {list(local_guessers(simplified))}")
+    if args.guesser == "policy-book":
+        # built once here rather than concurrently by every worker
+        PolicyBookProvider.get_book(simplified)
+
+    worker_counts = [args.workers]
+    if args.scaling:
+        worker_counts = [2 ** i for i in range(args.workers.bit_length()) if 2 ** i < args.workers]
+        worker_counts.append(args.workers)
+
+    game = "simplified" if simplified else "full"
+    with SharedFeedbackTable(FeedbackTableProvider.get_table()) as shared:
+        baseline = None
+        for workers in worker_counts:
+            rounds, elapsed = evaluate(
+                args.guesser, simplified, workers, shared.name, args.max_attempts)
+            baseline = baseline or elapsed
+            print(f"{args.guesser} on the {game} game, {workers} workers: {elapsed:.2f}s, "
+                  f"speedup {baseline / elapsed:.2f}x")
+    print_distribution(rounds)
+
+
+if __name__ == "__main__":
+    main()
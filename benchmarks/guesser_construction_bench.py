@@ -0,0 +1,66 @@
+"""
+Microbenchmark of guesser construction and per-guess chain building,
+comparing a fresh agent and prompt per call with the shared AgentRegistry.
+No LLM requests are made, only the objects are built.
+
+Run with:
+    OPENAI_API_KEY=... python -m benchmarks.guesser_construction_bench [--games 50]
+"""
+import argparse
+from time import perf_counter
+
+from langchain.agents import create_agent
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+
+from chains.guesser_v1 import AsyncGuesserV1, SYSTEM_PROMPT as V1_SYSTEM_PROMPT
+from chains.guesser_v3 import AsyncGuesserV3, system_message
+from chains.registry import AgentRegistry
+from agent_protocol import GuessResponse
+from config import ConfigProvider
+from feedback_table import FeedbackTableProvider
+from models.guesser_v3 import GuesserV3Response
+from prompts.guesser_v3 import MESSAGE_PROMPT
+
+
+def per_call_construction(model: str) -> None:
+    """What starting a game and making its first guess cost before the registry."""
+    create_agent(model, system_prompt=V1_SYSTEM_PROMPT, response_format=GuessResponse)
+    agent = create_agent(model, response_format=GuesserV3Response)
+    prompt = ChatPromptTemplate.from_messages([
+        system_message, HumanMessagePromptTemplate.from_template(MESSAGE_PROMPT)])
+    prompt | agent
+
+
+def registry_construction() -> None:
+    AsyncGuesserV1()
+    AsyncGuesserV3()
+
+
+def timed(label: str, games: int, fn) -> float:
+    t1 = perf_counter()
+    for _ in range(games):
+        fn()
+    per_game = (perf_counter() - t1) / games
+    print(f"{label:<28} {per_game * 1e3:8.2f}ms per game")
+    return per_game
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=50, help="games (pairs of guessers) started")
+    args = parser.parse_args()
+    model = ConfigProvider.get_config().BASE_MODEL
+    # shared by both variants through the guess validator, not part of the comparison
+    FeedbackTableProvider.get_table()
+
+    before = timed("agent + chain per game", args.games, lambda: per_call_construction(model))
+    AgentRegistry.clear()
+    t1 = perf_counter()
+    registry_construction()
+    print(f"{'registry, first game':<28} {(perf_counter() - t1) * 1e3:8.2f}ms")
+    after = timed("registry, warm", args.games, registry_construction)
+    print(f"speedup: {before / after:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
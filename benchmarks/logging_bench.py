@@ -0,0 +1,125 @@
+"""
+Event loop stall caused by logging: concurrent games log every turn like AsyncGuesserV3
+and GameEngine do, while a probe task measures how late the event loop wakes it up.
+
+- `before`: f-string messages, including the full state dump at INFO, written to the log
+  files synchronously on the event loop thread.
+- `after`: lazy %-style messages with the state dump at DEBUG, written by the background
+  thread of `LoggerProvider`.
+
+`--disk-latency` adds a delay to every write, as on a busy or network file system.
+
+Run with:
+    python -m benchmarks.logging_bench [--games 200] [--turns 8] [--disk-latency 0.0002]
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from statistics import mean
+from time import perf_counter
+
+from chains.guesser_v3_rules import GuesserV3Rules
+from logger_provider import LoggerProvider, LogSettings
+from models.guesser_v3 import State
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def sample_state() -> State:
+    """State of the rule engine after a few turns, as large as the ones logged in games."""
+    guesser = GuesserV3Rules()
+    for feedback in (1, 2, 1, 2):
+        guesser.guess()
+        guesser.provide_feedback((feedback, 0))
+    return guesser.state
+
+
+async def turn_before(log: logging.Logger, game_id: str, turn: int, state: State) -> None:
+    log.info(f"Round: {turn}")
+    log.info("Last guess: 0123")
+    log.info("Feedback: 0123 has 1 correct digits")
+    log.info(f"Updated state: {state.model_dump()}")
+    log.info("Guess: 4567")
+    log.info(f"Making guess: 4567 for player: player_2 for game: {game_id}")
+    log.info(f"Publishing update for game: {game_id}")
+    log.info(f"Received update for game: {game_id}")
+
+
+async def turn_after(log: logging.Logger, game_id: str, turn: int, state: State) -> None:
+    log.info("Round: %s", turn)
+    log.info("Last guess: %s", "0123")
+    log.info("Feedback: %s", "0123 has 1 correct digits")
+    log.debug("Updated state: %s", state)
+    log.info("Guess: %s", "4567")
+    log.info("Making guess: %s for player: %s for game: %s", "4567", "player_2", game_id)
+    log.debug("Publishing update for game: %s", game_id)
+    log.debug("Received update for game: %s", game_id)
+
+
+async def run(mode: str, args: argparse.Namespace, directory: str) -> None:
+    LoggerProvider.configure(LogSettings(directory=directory, asynchronous=mode == "after"))
+    log = LoggerProvider.get_logger(f"logging_bench_{mode}")
+    state = sample_state()
+    turn = turn_before if mode == "before" else turn_after
+    lags: list[float] = []
+    running = True
+
+    async def probe() -> None:
+        while running:
+            expected = perf_counter() + args.interval
+            await asyncio.sleep(args.interval)
+            lags.append(max(0.0, perf_counter() - expected))
+
+    async def game(index: int) -> None:
+        for round_ in range(1, args.turns + 1):
+            await turn(log, f"game-{index}", round_, state)
+            # the LLM call of the next turn
+            await asyncio.sleep(args.think)
+
+    probe_task = asyncio.create_task(probe())
+    started_at = perf_counter()
+    await asyncio.gather(*[game(index) for index in range(args.games)])
+    elapsed = perf_counter() - started_at
+    running = False
+    await probe_task
+    flush_started_at = perf_counter()
+    LoggerProvider.shutdown()
+    print(f"{mode:<7} loop lag p50 {percentile(lags, 0.5) * 1e3:7.2f}ms  "
+          f"p99 {percentile(lags, 0.99) * 1e3:7.2f}ms  max {max(lags) * 1e3:7.2f}ms  "
+          f"mean {mean(lags) * 1e3:6.2f}ms  workload {elapsed:.2f}s  "
+          f"writer drain {perf_counter() - flush_started_at:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=200, help="concurrent games")
+    parser.add_argument("--turns", type=int, default=8, help="turns per game")
+    parser.add_argument("--think", type=float, default=0.05, help="seconds between turns")
+    parser.add_argument("--interval", type=float, default=0.001, help="probe period")
+    parser.add_argument(
+        "--disk-latency", type=float, default=0.0, help="seconds added to every log write")
+    args = parser.parse_args()
+
+    if args.disk_latency > 0:
+        emit = logging.FileHandler.emit
+
+        def slow_emit(self, record):
+            time.sleep(args.disk_latency)
+            emit(self, record)
+
+        logging.FileHandler.emit = slow_emit  # type: ignore[method-assign]
+
+    print(f"{args.games} games x {args.turns} turns, disk latency {args.disk_latency * 1e3}ms")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("before", "after"):
+            asyncio.run(run(mode, args, directory))
+    LoggerProvider.configure(LogSettings())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of the policy books: build time, file size, startup (mmap load) cost
+and per-move latency of GuesserPolicyBook over every secret.
+
+Run with:
+    python -m benchmarks.policy_book_bench [--full]
+"""
+import argparse
+import tempfile
+from pathlib import Path
+from statistics import mean
+from time import perf_counter
+
+from chains.guesser_policy_book import GuesserPolicyBook
+from feedback_table import (
+    CODES, CODE_INDEX, FULL_FEEDBACKS, SIMPLIFIED_CODE_IDS, FeedbackTableProvider)
+from policy_book import PolicyBook
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench(simplified: bool) -> None:
+    table = FeedbackTableProvider.get_table()
+    scores = table.simplified if simplified else table.full
+
+    t1 = perf_counter()
+    book = PolicyBook.build(simplified)
+    build_time = perf_counter() - t1
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "book.cbpb"
+        book.save(path)
+        size = path.stat().st_size
+        t1 = perf_counter()
+        book = PolicyBook.load(path)
+        load_time = perf_counter() - t1
+
+        secrets = [CODES[i] for i in SIMPLIFIED_CODE_IDS] if simplified else CODES
+        move_times: list[float] = []
+        rounds: list[int] = []
+        for secret in secrets:
+            guesser = GuesserPolicyBook(book=book)
+            for attempt in range(1, 20):
+                t1 = perf_counter()
+                guess = guesser.guess()
+                move_times.append(perf_counter() - t1)
+                assert guess is not None
+                score = int(scores[CODE_INDEX[guess.guess], CODE_INDEX[secret]])
+                feedback = (score, 0) if simplified else FULL_FEEDBACKS[score]
+                if feedback == (4, 0):
+                    break
+                t1 = perf_counter()
+                guesser.provide_feedback(feedback)
+                move_times[-1] += perf_counter() - t1
+            rounds.append(attempt)
+        del book
+
+    print(f"game:          {'simplified' if simplified else 'full'}")
+    print(f"build:         {build_time:.2f}s")
+    print(f"file size:     {size / 1024:.1f} KiB")
+    print(f"load (mmap):   {load_time * 1e6:.0f}us")
+    print(f"per move:      mean {mean(move_times) * 1e6:.2f}us, "
+          f"p99 {percentile(move_times, 0.99) * 1e6:.2f}us")
+    print(f"rounds to win: mean {mean(rounds):.3f}, max {max(rounds)} over {len(rounds)} secrets")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="benchmark the full game")
+    args = parser.parse_args()
+    bench(simplified=not args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Record AsyncGuesserV3 games to a transcript, then replay them without network calls to
+time the non-LLM part of the pipeline (prompting, parsing, validation, game engine).
+
+The secrets are drawn from `--seed`, so replaying with the same seed and game count
+asks exactly the recorded prompts.
+
+Run with:
+    python -m benchmarks.replay_bench record [--games 1000] [--model fake:solver]
+    python -m benchmarks.replay_bench replay [--games 1000]
+"""
+import argparse
+import asyncio
+import os
+from random import Random
+from statistics import mean
+from time import perf_counter
+
+
+async def play(guesser, engine, secret: str, max_attempts: int) -> int | None:
+    """Rounds the guesser needed to find the digits of `secret`, None if it did not."""
+    for attempt in range(1, max_attempts + 1):
+        guess = await guesser.guess()
+        if guess is None:
+            return None
+        feedback = await engine.evaluate_guess(guess.guess, secret)
+        await guesser.provide_feedback((feedback, 0))
+        if feedback == 4:
+            return attempt
+    return None
+
+
+async def run(args: argparse.Namespace) -> None:
+    from chains.guesser_v3 import AsyncGuesserV3
+    from config import ConfigProvider
+    from game_engine import GameEngine
+    from llm_client_provider import LLMClientProvider
+    from transcripts import Transcript
+
+    config = ConfigProvider.get_config().model_copy(update={
+        "LLM_TRANSCRIPT_PATH": args.transcript, "LLM_RECORD_TRANSCRIPTS": args.mode == "record",
+        "FAKE_LLM_LATENCY_MEDIAN": 0.0 if args.mode == "replay" else args.latency})
+    client_provider = LLMClientProvider(config)
+    model = args.model if args.mode == "record" else "fake:replay"
+    engine = GameEngine()
+    random = Random(args.seed)
+    secrets = ["".join(map(str, random.sample(range(10), 4))) for _ in range(args.games)]
+
+    async def game(secret: str) -> int | None:
+        # without a response cache, every turn goes to the model
+        guesser = AsyncGuesserV3(
+            model=model, client_provider=client_provider, response_cache=None)
+        return await play(guesser, engine, secret, args.max_attempts)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited_game(secret: str) -> int | None:
+        async with semaphore:
+            return await game(secret)
+
+    started_at = perf_counter()
+    results = await asyncio.gather(
+        *[limited_game(secret) for secret in secrets], return_exceptions=True)
+    elapsed = perf_counter() - started_at
+
+    rounds = [result for result in results if isinstance(result, int)]
+    failed = len(results) - len(rounds)
+    print(f"{args.mode} with {model}: {len(rounds)} games won, {failed} failed, "
+          f"{elapsed:.2f}s ({elapsed / len(results) * 1e3:.2f}ms per game)")
+    if rounds:
+        print(f"mean rounds per game: {mean(rounds):.2f}")
+    if args.mode == "record":
+        print(f"transcript: {args.transcript}")
+    else:
+        transcript = Transcript.get_transcript(args.transcript)
+        print(f"transcript hits {transcript.hits}, misses {transcript.misses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("--games", type=int, default=1000, help="games played")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the secrets")
+    parser.add_argument("--model", default="fake:solver", help="model recorded")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="median latency of a fake recorded model")
+    parser.add_argument("--concurrency", type=int, default=32, help="games played at once")
+    parser.add_argument("--max-attempts", type=int, default=15, help="rounds per game")
+    parser.add_argument(
+        "--transcript", default="transcripts/replay_bench.jsonl", help="JSONL transcript")
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
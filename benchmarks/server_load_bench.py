@@ -0,0 +1,126 @@
+"""
+Offline load test of the FastAPI server: AI vs AI games played end to end over HTTP
+and SSE against the `fake:solver` chat model, without network access or API costs.
+
+The server runs in-process under uvicorn with the rate limiter and the response cache
+disabled. Every client starts a game and follows its update stream until it completes.
+
+Run with:
+    python -m benchmarks.server_load_bench [--games 200] [--concurrency 50] [--latency 0.5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+from random import Random
+from time import perf_counter
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def play_game(client, secret: str, timeout: float) -> tuple[float, float, int]:
+    """Start latency, game duration and number of guesses of one AI vs AI game."""
+    started_at = perf_counter()
+    response = await client.post("/start-new-game-ai-vs-ai", params={"secret": secret})
+    response.raise_for_status()
+    start_latency = perf_counter() - started_at
+    game_id = response.json()["game_id"]
+    state: dict = {"history": []}
+    async with asyncio.timeout(timeout):
+        async with client.stream(
+                "GET", "/get-game-updates", params={"game_id": game_id}) as stream:
+            event = "message"
+            async for line in stream.aiter_lines():
+                if line.startswith("event: "):
+                    event = line.removeprefix("event: ")
+                elif line.startswith("data: "):
+                    data = json.loads(line.removeprefix("data: "))
+                    if event == "delta":
+                        state["history"].extend(data.pop("history"))
+                        state.update(data)
+                    else:
+                        state = data
+                    if state["status"] == "completed":
+                        break
+    return start_latency, perf_counter() - started_at, len(state["history"])
+
+
+async def run(args: argparse.Namespace) -> None:
+    import httpx
+    import uvicorn
+
+    from fastapi_server import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    random = Random(args.seed)
+    secrets = ["".join(map(str, random.sample(range(10), 4))) for _ in range(args.games)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async def client_game(client, secret: str):
+        async with semaphore:
+            return await play_game(client, secret, args.timeout)
+
+    async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=args.timeout) as client:
+        started_at = perf_counter()
+        results = await asyncio.gather(
+            *[client_game(client, secret) for secret in secrets], return_exceptions=True)
+        elapsed = perf_counter() - started_at
+
+    server.should_exit = True
+    await serve
+
+    games = [result for result in results if isinstance(result, tuple)]
+    failures = [result for result in results if not isinstance(result, tuple)]
+    if not games:
+        raise RuntimeError(f"Every game failed, first error: {failures[0]!r}")
+    start_latencies = [result[0] for result in games]
+    durations = [result[1] for result in games]
+    guesses = sum(result[2] for result in games)
+    print(f"{len(games)} games, {len(failures)} failed, {elapsed:.1f}s, "
+          f"concurrency {args.concurrency}, fake LLM median latency {args.latency}s")
+    print(f"throughput: {len(games) / elapsed:.1f} games/s, {guesses / elapsed:.1f} guesses/s")
+    for label, values in (("start game", start_latencies), ("game duration", durations)):
+        print(f"{label:<14} p50 {percentile(values, 0.5) * 1e3:8.1f}ms  "
+              f"p95 {percentile(values, 0.95) * 1e3:8.1f}ms  "
+              f"p99 {percentile(values, 0.99) * 1e3:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=200, help="games played")
+    parser.add_argument("--concurrency", type=int, default=50, help="games played at once")
+    parser.add_argument(
+        "--latency", type=float, default=0.5, help="median fake LLM latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal latency shape")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per game")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the secrets")
+    args = parser.parse_args()
+    # the configuration is read once on import of the server, so it is set up front
+    os.environ.update({
+        "BASE_MODEL": "fake:solver", "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "fake"),
+        "RATE_LIMIT_ENABLED": "false", "RESPONSE_CACHE_ENABLED": "false",
+        "FAKE_LLM_LATENCY_MEDIAN": str(args.latency), "FAKE_LLM_LATENCY_SIGMA": str(args.sigma),
+        "LLM_MAX_CONCURRENT_REQUESTS": str(max(32, args.concurrency * 4))})
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Spectator load on the update streams: CPU time per published update as a function of the
+number of subscribers of a game.
+
+- `per-subscriber`: every stream serializes the state itself, as the streams did before
+  the events were encoded by the engine.
+- `shared`: every stream writes the bytes of the `GameEvent` encoded once by
+  `GameEngine.publish_update`, a delta holding the new guess.
+
+Each game is played to the end, so the later updates carry a long history.
+
+Run with:
+    python -m benchmarks.sse_fanout_bench [--subscribers 1 10 100 500 1000] [--rounds 10]
+"""
+import argparse
+import asyncio
+import os
+from time import process_time
+
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+from game_engine import GameEngine, GameEvent, Player  # noqa: E402
+
+SECRETS = ("0123", "4567")
+MISSES = ["8901", "2345", "6789", "1357", "2468", "0246", "1350", "9753", "8642", "3579"]
+
+
+def per_subscriber(event: GameEvent) -> bytes:
+    return f"data: {event.state.model_dump_json()}\n\n".encode()
+
+
+def shared(event: GameEvent) -> bytes:
+    return event.data
+
+
+async def measure(subscribers: int, rounds: int, encode) -> tuple[float, int, int]:
+    """CPU seconds per published update, updates published and bytes sent per stream."""
+    engine = GameEngine()
+    game_id = (await engine.create_game(SECRETS)).game_id
+    sizes = [0]
+
+    async def stream() -> None:
+        async for event in engine.listen_for_events(game_id):
+            sizes[0] += len(encode(event))
+
+    streams = [asyncio.create_task(stream()) for _ in range(subscribers)]
+    await asyncio.sleep(0)
+
+    started_at = process_time()
+    for round_ in range(rounds):
+        await engine.make_guess(game_id, MISSES[round_ % len(MISSES)], Player.PLAYER_1)
+        await engine.make_guess(game_id, MISSES[round_ % len(MISSES)], Player.PLAYER_2)
+        await asyncio.sleep(0)
+    await engine.make_guess(game_id, SECRETS[1], Player.PLAYER_1)
+    await asyncio.gather(*streams)
+    updates = 2 * rounds + 1
+    return (process_time() - started_at) / updates, updates, sizes[0] // subscribers
+
+
+async def run(args: argparse.Namespace) -> None:
+    await measure(1, 1, per_subscriber)  # warm up
+    print(f"{'subscribers':>11} {'per-subscriber':>16} {'shared':>12} {'speedup':>8}")
+    for subscribers in args.subscribers:
+        before, updates, full_size = await measure(subscribers, args.rounds, per_subscriber)
+        after, _, size = await measure(subscribers, args.rounds, shared)
+        print(f"{subscribers:>11} {before * 1e3:>14.3f}ms {after * 1e3:>10.3f}ms "
+              f"{before / after:>7.1f}x")
+    print(f"{updates} updates per game, bytes per stream: "
+          f"{full_size} as full states, {size} as a snapshot and deltas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--subscribers", type=int, nargs="+", default=[1, 10, 100, 500, 1000],
+        help="streams following the game")
+    parser.add_argument("--rounds", type=int, default=10, help="missed guesses per player")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
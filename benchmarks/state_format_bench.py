@@ -0,0 +1,100 @@
+"""
+Benchmark of the GuesserV3 state wire formats: tokens sent to and expected back from
+the model per round, and the latency they imply, for the full and compact formats.
+
+Every round of every simplified game is replayed with the local rule engine, which
+produces the state the model is asked to emit. Tokens are counted with tiktoken
+(estimated as 4 characters per token when the encoding is not available offline).
+No LLM requests are made.
+
+Run with:
+    OPENAI_API_KEY=... python -m benchmarks.state_format_bench [--output-tps 60]
+"""
+import argparse
+import json
+from statistics import mean
+from typing import Callable
+
+from chains.guesser_v3 import STATE_FORMATS, encode_state
+from chains.guesser_v3_rules import respond
+from feedback_table import CODES, SIMPLIFIED_CODE_IDS
+from models.guesser_v3 import (
+    CompactGuesserV3Response, CompactState, GuesserV3Response, State, StateFormat)
+
+
+def token_counter(encoding: str) -> Callable[[str], int]:
+    try:
+        import tiktoken
+        encode = tiktoken.get_encoding(encoding).encode
+        return lambda text: len(encode(text))
+    except Exception as e:
+        print(f"tiktoken encoding {encoding} not available ({type(e).__name__}), "
+              "estimating 4 characters per token")
+        return lambda text: (len(text) + 3) // 4
+
+
+def game_rounds(secret: str) -> list[tuple[dict, State, GuesserV3Response]]:
+    """Inputs, previous state and expected response of every round of one game."""
+    rounds = []
+    state, previous_guess, feedback = State(), None, None
+    for round_number in range(1, 11):
+        response = respond(state, previous_guess, feedback)
+        inputs = {"round": round_number, "previous_guess": previous_guess, "feedback":
+                  f"{previous_guess} has {feedback} correct digits" if feedback is not None
+                  else None}
+        rounds.append((inputs, state, response))
+        if sorted(response.guess) == sorted(secret):
+            break
+        state, previous_guess = response.updated_state, response.guess
+        feedback = len(set(secret) & set(previous_guess))
+    return rounds
+
+
+def expected_output(state_format: StateFormat, state: State, response: GuesserV3Response) -> str:
+    if state_format == StateFormat.COMPACT:
+        return CompactGuesserV3Response(
+            state_update=CompactState.diff(state, response.updated_state), guess=response.guess,
+            reasoning=response.reasoning,
+            comments=response.comments).model_dump_json(exclude_none=True)
+    return response.model_dump_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--encoding", default="o200k_base", help="tiktoken encoding")
+    parser.add_argument(
+        "--output-tps", type=float, default=60.0, help="generated tokens per second")
+    parser.add_argument(
+        "--input-tps", type=float, default=5000.0, help="prompt tokens processed per second")
+    args = parser.parse_args()
+    count_tokens = token_counter(args.encoding)
+    games = [game_rounds(CODES[code_id]) for code_id in SIMPLIFIED_CODE_IDS]
+    turns = [turn for game in games for turn in game]
+    print(f"{len(games)} games, {len(turns)} rounds, "
+          f"{len(turns) / len(games):.2f} rounds per game")
+
+    results = {}
+    for state_format, (_, prompt, _, response_format) in STATE_FORMATS.items():
+        # the response schema goes with every request as the structured output definition
+        schema_tokens = count_tokens(json.dumps(response_format.model_json_schema()))
+        input_tokens, output_tokens = [], []
+        for inputs, state, response in turns:
+            messages = prompt.format_messages(
+                current_state=encode_state(state, state_format), **inputs)
+            input_tokens.append(
+                schema_tokens + sum(count_tokens(message.content) for message in messages))
+            output_tokens.append(count_tokens(expected_output(state_format, state, response)))
+        latency = mean(input_tokens) / args.input_tps + mean(output_tokens) / args.output_tps
+        results[state_format] = (mean(input_tokens), mean(output_tokens), latency)
+        print(f"{state_format.value:<8} input {mean(input_tokens):8.1f} tok/round  "
+              f"output {mean(output_tokens):6.1f} tok/round  "
+              f"est. latency {latency * 1e3:7.0f}ms/round")
+
+    full, compact = results[StateFormat.FULL], results[StateFormat.COMPACT]
+    print(f"compact saves {1 - compact[0] / full[0]:.0%} input tokens, "
+          f"{1 - compact[1] / full[1]:.0%} output tokens, "
+          f"{1 - compact[2] / full[2]:.0%} estimated latency per round")
+
+
+if __name__ == "__main__":
+    main()
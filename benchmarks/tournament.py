@@ -0,0 +1,316 @@
+"""
+Tournament of guessers: every secret is played by every guesser with every model,
+through the runners of `tests.agent_test_runner`. The V3 guessers also play with each of
+`--samples` candidate guesses per turn, to weigh the rounds saved by sampling against the
+tokens it spends.
+
+LLM guessers play concurrently on the event loop, at most `llm_concurrency` games at once.
+Local guessers are CPU-bound and play in a process pool. Each finished game is appended
+to a JSONL results file as it completes, and a run pointed at an existing file only plays
+the games that are missing from it (or that failed with an error), so an interrupted
+tournament resumes where it stopped.
+
+Run with:
+    python -m benchmarks.tournament --guessers v3,solver --models fake:solver,gpt-4.1-mini \
+        [--samples 1,4] [--secrets 100] [--results tournaments/results.jsonl]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+from random import Random
+from statistics import mean
+from time import perf_counter
+from typing import Callable
+
+from pydantic import BaseModel
+
+from agent_protocol import IAsyncGuesser, IGuesser
+from feedback_table import CODES
+from llm_client_provider import LLMClientProvider
+from logger_provider import LoggerProvider
+from tests.agent_test_runner import test_agent_simplified as run_agent_simplified
+from tests.agent_test_runner import test_agent_simplified_async as run_agent_simplified_async
+
+log = LoggerProvider.get_logger('tournament')
+
+LOCAL_MODEL = "local"  # model column of the guessers that do not use an LLM
+SAMPLING_GUESSERS = ("v3", "v3-compact")  # guessers that can sample candidate guesses
+
+GuesserFactory = Callable[[str, LLMClientProvider | None, int], IAsyncGuesser]
+
+
+def llm_guessers() -> dict[str, GuesserFactory]:
+    """LLM guessers by name, built for a model, a client provider and samples per turn."""
+    from chains.guesser_v1 import AsyncGuesserV1
+    from chains.guesser_v3 import AsyncGuesserV3
+    from models.guesser_v3 import StateFormat
+
+    # without a response cache, repeated turns would otherwise skip the model
+    return {
+        "v1": lambda model, client_provider, samples: AsyncGuesserV1(
+            model=model, client_provider=client_provider),
+        "v3": lambda model, client_provider, samples: AsyncGuesserV3(
+            model=model, client_provider=client_provider, response_cache=None,
+            state_format=StateFormat.FULL, samples=samples),
+        "v3-compact": lambda model, client_provider, samples: AsyncGuesserV3(
+            model=model, client_provider=client_provider, response_cache=None,
+            state_format=StateFormat.COMPACT, samples=samples),
+    }
+
+
+def local_guessers(simplified: bool = True) -> dict[str, Callable[[], IGuesser]]:
+    """Guessers by name that play without an LLM, the rules only play the simplified game."""
+    from chains.guesser_policy_book import GuesserPolicyBook
+    from chains.guesser_solver import GuesserSolver, SolverStrategy
+    from chains.guesser_v3_rules import GuesserV3Rules
+
+    guessers: dict[str, Callable[[], IGuesser]] = {
+        "solver": partial(GuesserSolver, simplified=simplified),
+        "solver-entropy": partial(
+            GuesserSolver, simplified=simplified, strategy=SolverStrategy.ENTROPY),
+        "policy-book": partial(GuesserPolicyBook, simplified=simplified),
+    }
+    if simplified:
+        guessers["rules"] = GuesserV3Rules
+    return guessers
+
+
+class Match(BaseModel):
+    """One game of the tournament."""
+    guesser: str
+    model: str
+    secret: str
+    samples: int = 1  # candidate guesses per turn
+
+    @property
+    def key(self) -> tuple[str, str, str, int]:
+        return self.guesser, self.model, self.secret, self.samples
+
+
+class MatchResult(Match):
+    success: bool
+    rounds: int
+    latency: float  # seconds for the whole game
+    input_tokens: int = 0
+    output_tokens: int = 0
+    error: str | None = None
+
+
+def matches(
+        guessers: list[str], models: list[str], secrets: list[str],
+        samples: list[int] | None = None) -> list[Match]:
+    """
+    Every secret for every guesser, with every model for the LLM guessers and with every
+    number of `samples` for the ones that sample candidate guesses.
+    """
+    samples = samples or [1]
+    llm = llm_guessers()
+    local = local_guessers()
+    result = []
+    for guesser in guessers:
+        if guesser in llm:
+            guesser_samples = samples if guesser in SAMPLING_GUESSERS else [1]
+            result += [Match(guesser=guesser, model=model, secret=secret, samples=count)
+                       for model in models for count in guesser_samples for secret in secrets]
+        elif guesser in local:
+            result += [Match(guesser=guesser, model=LOCAL_MODEL, secret=secret)
+                       for secret in secrets]
+        else:
+            raise ValueError(f"Unknown guesser: {guesser}, guessers: {[*llm, *local]}")
+    return result
+
+
+def failed(match: Match, error: Exception, latency: float) -> MatchResult:
+    """Result of a match that raised, played again when the tournament resumes."""
+    log.error("Match %s failed: %r", match.key, error)
+    return MatchResult(
+        **match.model_dump(), success=False, rounds=0, latency=latency, error=repr(error))
+
+
+def play_local(match: Match, max_attempts: int) -> MatchResult:
+    """Play a match of a local guesser, in a worker process of the pool."""
+    started_at = perf_counter()
+    try:
+        success, rounds = run_agent_simplified(
+            local_guessers()[match.guesser](), match.secret, max_attempts)
+    except Exception as e:
+        return failed(match, e, perf_counter() - started_at)
+    return MatchResult(
+        **match.model_dump(), success=success, rounds=rounds,
+        latency=perf_counter() - started_at)
+
+
+async def play_llm(
+        match: Match, max_attempts: int,
+        client_provider: LLMClientProvider | None = None) -> MatchResult:
+    started_at = perf_counter()
+    guesser = llm_guessers()[match.guesser](match.model, client_provider, match.samples)
+    try:
+        success, rounds = await run_agent_simplified_async(guesser, match.secret, max_attempts)
+    except Exception as e:
+        return failed(match, e, perf_counter() - started_at)
+    finally:
+        aclose = getattr(guesser, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    usage = getattr(guesser, "token_usage", None)
+    return MatchResult(
+        **match.model_dump(), success=success, rounds=rounds,
+        latency=perf_counter() - started_at,
+        input_tokens=usage.input_tokens if usage else 0,
+        output_tokens=usage.output_tokens if usage else 0)
+
+
+def load_results(path: Path) -> list[MatchResult]:
+    """Results already in `path`, the last one of a match wins."""
+    if not path.exists():
+        return []
+    results: dict[tuple[str, str, str, int], MatchResult] = {}
+    with path.open(encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                result = MatchResult.model_validate_json(line)
+                results[result.key] = result
+    return list(results.values())
+
+
+async def run_tournament(
+        to_play: list[Match], results_path: str | Path, max_attempts: int = 20,
+        llm_concurrency: int = 16, workers: int | None = None,
+        client_provider: LLMClientProvider | None = None) -> list[MatchResult]:
+    """
+    Play the matches missing from `results_path`, appending each result as it completes.
+    LLM guessers get their models from `client_provider`, the process-wide one by default.
+    Returns the results of every match of `to_play`.
+    """
+    path = Path(results_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    done = {result.key: result for result in load_results(path) if result.error is None}
+    pending = [match for match in to_play if match.key not in done]
+    log.info(
+        "Tournament: %s matches, %s already played", len(to_play), len(to_play) - len(pending))
+    llm = llm_guessers()
+    semaphore = asyncio.Semaphore(llm_concurrency)
+    loop = asyncio.get_running_loop()
+
+    with ExitStack() as stack:
+        file = stack.enter_context(path.open("a", encoding="utf-8"))
+        pool = None
+        if any(match.guesser not in llm for match in pending):
+            # spawned, forking a process running the log writer and HTTP threads is unsafe
+            pool = stack.enter_context(ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")))
+
+        def record(result: MatchResult) -> MatchResult:
+            file.write(result.model_dump_json() + "\n")
+            file.flush()
+            done[result.key] = result
+            return result
+
+        async def play(match: Match) -> MatchResult:
+            if match.guesser in llm:
+                async with semaphore:
+                    return record(await play_llm(match, max_attempts, client_provider))
+            started_at = perf_counter()
+            try:
+                result = await loop.run_in_executor(pool, play_local, match, max_attempts)
+            except Exception as e:
+                # the worker died or the match could not be sent to it
+                result = failed(match, e, perf_counter() - started_at)
+            return record(result)
+
+        await asyncio.gather(*[play(match) for match in pending])
+    return [done[match.key] for match in to_play if match.key in done]
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(results: list[MatchResult]) -> list[dict[str, float | int | str]]:
+    """
+    Statistics by (guesser, model, samples): win rate, rounds, latency and tokens. Sampled
+    configurations are compared with the same guesser and model playing one sample per
+    turn: rounds saved per game and tokens spent per game on top of it.
+    """
+    groups: dict[tuple[str, str, int], list[MatchResult]] = {}
+    for result in results:
+        groups.setdefault((result.guesser, result.model, result.samples), []).append(result)
+    summary = []
+    for (guesser, model, samples), group in groups.items():
+        wins = [result for result in group if result.success]
+        rounds = [float(result.rounds) for result in wins]
+        latencies = [result.latency for result in group]
+        tokens = [result.input_tokens + result.output_tokens for result in group]
+        summary.append({
+            "guesser": guesser, "model": model, "samples": samples, "games": len(group),
+            "errors": sum(result.error is not None for result in group),
+            "win_rate": len(wins) / len(group),
+            "rounds_mean": mean(rounds) if rounds else 0.0,
+            "rounds_p50": percentile(rounds, 0.5) if rounds else 0.0,
+            "rounds_p90": percentile(rounds, 0.9) if rounds else 0.0,
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p95": percentile(latencies, 0.95),
+            "tokens_mean": mean(tokens),
+            "tokens_per_round": sum(tokens) / max(1, sum(result.rounds for result in group)),
+        })
+    baselines = {(row["guesser"], row["model"]): row for row in summary if row["samples"] == 1}
+    for row in summary:
+        baseline = baselines.get((row["guesser"], row["model"]))
+        row["rounds_saved"] = baseline["rounds_mean"] - row["rounds_mean"] if baseline else 0.0
+        row["extra_tokens"] = row["tokens_mean"] - baseline["tokens_mean"] if baseline else 0.0
+    return summary
+
+
+def print_summary(summary: list[dict[str, float | int | str]]) -> None:
+    print(f"{'guesser':<16}{'model':<20}{'k':>3}{'games':>6}{'win':>7}{'rounds':>8}{'p50':>5}"
+          f"{'p90':>5}{'lat p50':>9}{'lat p95':>9}{'tokens':>9}{'tok/rnd':>9}"
+          f"{'saved':>7}{'+tokens':>9}")
+    for row in summary:
+        print(f"{row['guesser']:<16}{row['model']:<20}{row['samples']:>3}{row['games']:>6}"
+              f"{row['win_rate']:>7.1%}"
+              f"{row['rounds_mean']:>8.2f}{row['rounds_p50']:>5.0f}{row['rounds_p90']:>5.0f}"
+              f"{row['latency_p50']:>8.2f}s{row['latency_p95']:>8.2f}s"
+              f"{row['tokens_mean']:>9.0f}{row['tokens_per_round']:>9.0f}"
+              f"{row['rounds_saved']:>7.2f}{row['extra_tokens']:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--guessers", default="v3,solver", help="comma-separated guessers")
+    parser.add_argument(
+        "--models", default="fake:solver", help="comma-separated models of the LLM guessers")
+    parser.add_argument(
+        "--samples", default="1", help="comma-separated candidate guesses per turn of V3")
+    parser.add_argument("--secrets", type=int, default=20, help="secrets played")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the secrets")
+    parser.add_argument("--max-attempts", type=int, default=20, help="rounds per game")
+    parser.add_argument(
+        "--llm-concurrency", type=int, default=16, help="LLM games played at once")
+    parser.add_argument("--workers", type=int, default=None, help="processes of local games")
+    parser.add_argument(
+        "--results", default="tournaments/results.jsonl", help="JSONL results, resumed")
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+    secrets = Random(args.seed).sample(CODES, min(args.secrets, len(CODES)))
+    to_play = matches(
+        [name.strip() for name in args.guessers.split(",") if name.strip()],
+        [name.strip() for name in args.models.split(",") if name.strip()], secrets,
+        [int(count) for count in args.samples.split(",") if count.strip()])
+    started_at = perf_counter()
+    results = asyncio.run(run_tournament(
+        to_play, args.results, args.max_attempts, args.llm_concurrency, args.workers))
+    print(f"{len(results)} of {len(to_play)} matches in {perf_counter() - started_at:.1f}s, "
+          f"results in {args.results}")
+    print_summary(summarize(results))
+
+
+if __name__ == "__main__":
+    main()
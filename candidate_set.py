@@ -0,0 +1,155 @@
+"""
+Bitset-encoded sets of candidate codes.
+
+A candidate set is a 5040-bit integer where bit `i` is set when code id `i` (see
+`feedback_table.CODES`) is still consistent with the feedback. For every guess the
+partition masks (the secrets that would produce each feedback value) are computed once
+and cached, so filtering by feedback is a single AND and counting is a single popcount.
+"""
+from math import log2
+from typing import Iterator, Optional
+
+import numpy as np
+
+from agent_protocol import GuessResponse
+from feedback_table import (
+    CODES, CODE_COUNT, FULL_FEEDBACK_COUNT, FULL_FEEDBACK_INDEX, SIMPLIFIED_CODE_IDS,
+    SIMPLIFIED_FEEDBACK_COUNT, CodeRef, FeedbackTableProvider, code_id)
+
+CODE_BYTES = (CODE_COUNT + 7) // 8
+
+
+def ids_to_bits(ids: np.ndarray) -> int:
+    """Encode an array of code ids as a bitset."""
+    flags = np.zeros(CODE_COUNT, dtype=bool)
+    flags[ids] = True
+    return flags_to_bits(flags)
+
+
+def flags_to_bits(flags: np.ndarray) -> int:
+    """Encode a bool array indexed by code id as a bitset."""
+    return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+
+def bits_to_ids(bits: int) -> np.ndarray:
+    """Decode a bitset into a sorted array of code ids."""
+    packed = np.frombuffer(bits.to_bytes(CODE_BYTES, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed, bitorder='little')[:CODE_COUNT])
+
+
+class PartitionMasks:
+    """
+    Per-(guess, feedback) bitsets of the secrets producing that feedback.
+    Use `PartitionMasks.for_game(simplified)` to get the process-wide instance.
+    """
+    __instances: dict[bool, "PartitionMasks"] = {}
+
+    def __init__(self, simplified: bool):
+        table = FeedbackTableProvider.get_table()
+        self.simplified = simplified
+        self.scores = table.simplified if simplified else table.full
+        self.feedback_count = SIMPLIFIED_FEEDBACK_COUNT if simplified else FULL_FEEDBACK_COUNT
+        self.universe = ids_to_bits(SIMPLIFIED_CODE_IDS if simplified else np.arange(CODE_COUNT))
+        self.__masks: dict[int, tuple[int, ...]] = {}
+
+    @classmethod
+    def for_game(cls, simplified: bool) -> "PartitionMasks":
+        if simplified not in cls.__instances:
+            cls.__instances[simplified] = cls(simplified)
+        return cls.__instances[simplified]
+
+    def feedback_value(self, feedback: tuple[int, int]) -> int:
+        """Convert protocol feedback to the value stored in the feedback table."""
+        if self.simplified:
+            return feedback[0] + feedback[1]
+        return FULL_FEEDBACK_INDEX[feedback]
+
+    def get(self, guess: CodeRef) -> tuple[int, ...]:
+        """Bitsets of the codes in the universe producing each feedback value for `guess`."""
+        guess_id = code_id(guess)
+        masks = self.__masks.get(guess_id)
+        if masks is None:
+            row = self.scores[guess_id]
+            masks = tuple(
+                flags_to_bits(row == value) & self.universe
+                for value in range(self.feedback_count))
+            self.__masks[guess_id] = masks
+        return masks
+
+
+class CandidateSet:
+    """
+    Set of codes still consistent with the feedback, driven by guesses and feedback
+    in the same format as `IGuesser.provide_feedback`.
+    """
+    __slots__ = ('masks', 'bits')
+
+    def __init__(self, simplified: bool = False, bits: Optional[int] = None):
+        self.masks = PartitionMasks.for_game(simplified)
+        self.bits = self.masks.universe if bits is None else bits
+
+    @property
+    def simplified(self) -> bool:
+        return self.masks.simplified
+
+    def apply(self, guess: GuessResponse | CodeRef, feedback: tuple[int, int]) -> None:
+        """Keep only the codes that would have produced `feedback` for `guess`."""
+        if isinstance(guess, GuessResponse):
+            guess = guess.guess
+        self.bits &= self.masks.get(guess)[self.masks.feedback_value(feedback)]
+
+    def filtered(
+            self, guess: GuessResponse | CodeRef, feedback: tuple[int, int]) -> "CandidateSet":
+        """Copy of this set with `feedback` for `guess` applied."""
+        candidates = self.copy()
+        candidates.apply(guess, feedback)
+        return candidates
+
+    def partition_sizes(self, guess: CodeRef) -> list[int]:
+        """Number of candidates that would remain after each feedback value for `guess`."""
+        return [(self.bits & mask).bit_count() for mask in self.masks.get(guess)]
+
+    def expected_information(self, guess: CodeRef) -> float:
+        """Expected information in bits of the feedback for `guess` (entropy of its partition)."""
+        total = len(self)
+        return sum(
+            size / total * log2(total / size) for size in self.partition_sizes(guess) if size)
+
+    def copy(self) -> "CandidateSet":
+        return CandidateSet(self.simplified, self.bits)
+
+    def ids(self) -> np.ndarray:
+        return bits_to_ids(self.bits)
+
+    def first(self) -> str | None:
+        """Candidate with the lowest code id, or None if the set is empty."""
+        if self.bits == 0:
+            return None
+        return CODES[(self.bits & -self.bits).bit_length() - 1]
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __contains__(self, code: object) -> bool:
+        if not isinstance(code, (int, str)):
+            return False
+        if self.simplified and isinstance(code, str):
+            # every ordering of the same digits is represented by the sorted code
+            code = "".join(sorted(code))
+        try:
+            return bool(self.bits >> code_id(code) & 1)
+        except ValueError:
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        return (CODES[i] for i in self.ids())
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, CandidateSet) and self.simplified == other.simplified
+                and self.bits == other.bits)
+
+    def __hash__(self) -> int:
+        return hash((self.simplified, self.bits))
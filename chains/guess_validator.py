@@ -0,0 +1,69 @@
+from pydantic import BaseModel
+
+from chains.guesser_solver import CandidateSolver, SolverStrategy
+from evaluation_function import validate_input
+from logger_provider import LoggerProvider
+
+log = LoggerProvider.get_logger('guess_validator')
+
+
+class ValidationStats(BaseModel):
+    """Counts of how each guess left the validation stage."""
+    accepted: int = 0  # first guess of the turn passed the checks
+    repaired: int = 0  # passed the checks after a re-prompt
+    fallback: int = 0  # replaced by the best locally computed guess
+    reprompts: int = 0  # re-prompts issued, a turn can issue several
+
+
+class GuessValidator:
+    """
+    Checks guesses against the game rules and the feedback history before they reach the engine.
+
+    A guess is rejected when it is not a valid code, repeats an earlier guess, or cannot tell
+    any of the remaining candidate codes apart (every candidate would give the same feedback).
+    With `require_consistent` it must also be one of the remaining candidates.
+    """
+    totals = ValidationStats()
+
+    def __init__(
+            self, simplified: bool = True, require_consistent: bool = False,
+            strategy: SolverStrategy = SolverStrategy.ENTROPY):
+        self.solver = CandidateSolver(simplified=simplified, strategy=strategy)
+        self.require_consistent = require_consistent
+        self.guessed: set[str] = set()
+        self.stats = ValidationStats()
+
+    def record_feedback(self, guess: str, feedback: tuple[int, int]) -> None:
+        self.guessed.add(self.__canonical(guess))
+        self.solver.apply_feedback(guess, feedback)
+
+    def check(self, guess: str) -> str | None:
+        """Reason why `guess` should be rejected, or None if it is acceptable."""
+        try:
+            validate_input(guess)
+        except ValueError as e:
+            return f"{e}."
+        if self.__canonical(guess) in self.guessed:
+            return "This guess was already made."
+
+        candidates = self.solver.candidates
+        is_candidate = guess in candidates
+        if self.require_consistent and not is_candidate:
+            return "This code is ruled out by the feedback received so far."
+        if not is_candidate and max(candidates.partition_sizes(guess)) == len(candidates):
+            return "This guess gives no new information, " \
+                "every code still possible would produce the same feedback."
+        return None
+
+    def fallback(self) -> str | None:
+        """Best guess consistent with the feedback history."""
+        return self.solver.next_guess(consistent_only=True)
+
+    def record_outcome(self, outcome: str) -> None:
+        """Count a turn outcome, one of `accepted`, `repaired`, `fallback` or `reprompts`."""
+        for stats in (self.stats, GuessValidator.totals):
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+
+    def __canonical(self, guess: str) -> str:
+        # in the simplified game every ordering of the same digits is the same guess
+        return "".join(sorted(guess)) if self.solver.simplified else guess
@@ -0,0 +1,50 @@
+from agent_protocol import GuessResponse
+from feedback_table import FULL_FEEDBACK_INDEX
+from logger_provider import LoggerProvider
+from policy_book import PolicyBook, PolicyBookProvider
+
+log = LoggerProvider.get_logger('guesser_policy_book')
+
+
+class GuesserPolicyBook:
+    """
+    GuesserPolicyBook is a class that implements the Guesser interface.
+    It follows a precompiled decision tree of the solver,
+    so every guess is a single lookup without any search.
+    """
+
+    def __init__(self, simplified: bool = True, book: PolicyBook | None = None):
+        self.book = book or PolicyBookProvider.get_book(simplified)
+        self.node: int | None = 0
+        self.last_guess: str | None = None
+
+    def provide_feedback(self, feedback: tuple[int, int]) -> None:
+        if self.last_guess is None or self.node is None:
+            raise ValueError("No guess has been made yet.")
+        if self.book.simplified:
+            value = feedback[0] + feedback[1]
+        else:
+            value = FULL_FEEDBACK_INDEX[feedback]
+        self.node = self.book.child(self.node, value)
+
+    def guess(self) -> GuessResponse | None:
+        if self.node is None:
+            log.error("Feedback is not covered by the policy book")
+            return None
+        self.last_guess = self.book.guess(self.node)
+        return GuessResponse(guess=self.last_guess, comments=f"Policy book node {self.node}")
+
+
+class AsyncGuesserPolicyBook:
+    """
+    AsyncGuesserPolicyBook is an async version of GuesserPolicyBook.
+    """
+
+    def __init__(self, simplified: bool = True, book: PolicyBook | None = None):
+        self.guesser = GuesserPolicyBook(simplified, book)
+
+    async def provide_feedback(self, feedback: tuple[int, int]) -> None:
+        self.guesser.provide_feedback(feedback)
+
+    async def guess(self) -> GuessResponse | None:
+        return self.guesser.guess()
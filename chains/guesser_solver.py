@@ -0,0 +1,137 @@
+from enum import Enum
+from functools import lru_cache
+
+import numpy as np
+
+from agent_protocol import GuessResponse
+from candidate_set import CandidateSet, PartitionMasks, bits_to_ids
+from feedback_table import CODES, CODE_COUNT, SIMPLIFIED_CODE_IDS
+from logger_provider import LoggerProvider
+
+log = LoggerProvider.get_logger('guesser_solver')
+
+
+class SolverStrategy(str, Enum):
+    """Scoring used to pick the next guess."""
+    MINIMAX = "minimax"  # minimize the largest remaining partition
+    ENTROPY = "entropy"  # maximize the expected information of the feedback
+
+
+class CandidateSolver:
+    """
+    Tracks the codes still consistent with all feedback received so far
+    and picks the next guess by scoring how each guess would partition them.
+    """
+
+    def __init__(self, simplified: bool = True, strategy: SolverStrategy = SolverStrategy.MINIMAX):
+        self.simplified = simplified
+        self.strategy = SolverStrategy(strategy)
+        self.candidates = CandidateSet(simplified)
+
+    def apply_feedback(self, guess: str, feedback: tuple[int, int]) -> None:
+        """Keep only the candidates that would have produced `feedback` for `guess`."""
+        self.candidates.apply(guess, feedback)
+
+    def next_guess(self, consistent_only: bool = False) -> str | None:
+        """
+        Best guess for the current candidates, or None if no code is consistent.
+        With `consistent_only` the guess is picked among the candidates themselves.
+        """
+        count = len(self.candidates)
+        # every guess is equivalent before the first feedback, and guessing a candidate
+        # is optimal once at most two remain
+        if count <= 2 or self.candidates.bits == self.candidates.masks.universe:
+            return self.candidates.first()
+        return best_guess(self.simplified, self.strategy, self.candidates.bits, consistent_only)
+
+
+def partition_sizes(
+        simplified: bool, guesses: np.ndarray, candidate_ids: np.ndarray) -> np.ndarray:
+    """Sizes of the candidate partitions for each guess, shape (len(guesses), feedbacks)."""
+    masks = PartitionMasks.for_game(simplified)
+    scores = masks.scores[np.ix_(guesses, candidate_ids)].astype(np.intp)
+    scores += np.arange(len(guesses))[:, None] * masks.feedback_count
+    counts = np.bincount(scores.ravel(), minlength=len(guesses) * masks.feedback_count)
+    return counts.reshape(len(guesses), masks.feedback_count)
+
+
+# The solver is deterministic, so the states it reaches on its own form a bounded decision
+# tree and repeated games are served from the cache.
+@lru_cache(maxsize=1 << 16)
+def best_guess(
+        simplified: bool, strategy: SolverStrategy, bits: int,
+        consistent_only: bool = False) -> str:
+    """Guess with the lowest `strategy` cost for the candidate bitset `bits`."""
+    candidate_ids = bits_to_ids(bits)
+    if consistent_only:
+        guess_pool = candidate_ids
+    else:
+        guess_pool = SIMPLIFIED_CODE_IDS if simplified else np.arange(CODE_COUNT)
+    sizes = partition_sizes(simplified, guess_pool, candidate_ids)
+    if strategy == SolverStrategy.MINIMAX:
+        cost = sizes.max(axis=1).astype(np.float64)
+    else:
+        # maximizing entropy is the same as minimizing sum(s * log(s))
+        cost = (sizes * np.log2(np.maximum(sizes, 1))).sum(axis=1)
+    is_candidate = np.isin(guess_pool, candidate_ids)
+    # lowest cost first, candidates (that can win right away) break ties
+    best = np.lexsort((~is_candidate, cost))[0]
+    return CODES[guess_pool[best]]
+
+
+class GuesserSolver:
+    """
+    GuesserSolver is a class that implements the Guesser interface without an LLM.
+    It eliminates codes inconsistent with the feedback and picks the guess
+    that best partitions the remaining candidates.
+    Serves as the reference solver the LLM guessers are measured against.
+    """
+
+    def __init__(
+            self, simplified: bool = True, strategy: SolverStrategy = SolverStrategy.MINIMAX):
+        self.solver = CandidateSolver(simplified=simplified, strategy=strategy)
+        self.last_guess: str | None = None
+
+    def provide_feedback(self, feedback: tuple[int, int]) -> None:
+        if self.last_guess is None:
+            raise ValueError("No guess has been made yet.")
+        self.solver.apply_feedback(self.last_guess, feedback)
+        log.info("Feedback: %s, candidates left: %s", feedback, len(self.solver.candidates))
+
+    def guess(self) -> GuessResponse | None:
+        guess = self.solver.next_guess()
+        if guess is None:
+            log.error("No code is consistent with the feedback")
+            return None
+        self.last_guess = guess
+        log.info("Guess: %s", guess)
+        return GuessResponse(
+            guess=guess, comments=f"{len(self.solver.candidates)} possible codes remaining")
+
+
+class AsyncGuesserSolver:
+    """
+    AsyncGuesserSolver is an async version of GuesserSolver.
+    Guessing is CPU-bound and takes well under a millisecond after the first feedback.
+    """
+
+    def __init__(
+            self, simplified: bool = True, strategy: SolverStrategy = SolverStrategy.MINIMAX):
+        self.solver = CandidateSolver(simplified=simplified, strategy=strategy)
+        self.last_guess: str | None = None
+
+    async def provide_feedback(self, feedback: tuple[int, int]) -> None:
+        if self.last_guess is None:
+            raise ValueError("No guess has been made yet.")
+        self.solver.apply_feedback(self.last_guess, feedback)
+        log.info("Feedback: %s, candidates left: %s", feedback, len(self.solver.candidates))
+
+    async def guess(self) -> GuessResponse | None:
+        guess = self.solver.next_guess()
+        if guess is None:
+            log.error("No code is consistent with the feedback")
+            return None
+        self.last_guess = guess
+        log.info("Guess: %s", guess)
+        return GuessResponse(
+            guess=guess, comments=f"{len(self.solver.candidates)} possible codes remaining")
@@ -1,7 +1,8 @@
 from langchain_core.messages import HumanMessage
 from config import ConfigProvider
-from langchain.agents import create_agent
 from agent_protocol import GuessResponse
+from chains.registry import AgentRegistry
+from llm_client_provider import LLMClientProvider
 
 SYSTEM_PROMPT = """
 You are a guesser in a game of Code Breaker.
@@ -22,11 +23,13 @@ class GuesserV1:
     Uses the simplest approach to provide baseline performance.
     """
 
-    def __init__(self):
+    def __init__(
+            self, client_provider: LLMClientProvider | None = None, model: str | None = None):
         self.config = ConfigProvider.get_config()
         self.chat_history: list = [HumanMessage(content="Provide your next guess.")]
-        self.agent = create_agent(
-            self.config.BASE_MODEL, system_prompt=SYSTEM_PROMPT, response_format=GuessResponse)
+        self.agent = AgentRegistry.get_agent(
+            model or self.config.BASE_MODEL, GuessResponse, system_prompt=SYSTEM_PROMPT,
+            client_provider=client_provider)
         self.previous_guess = None
 
     def provide_feedback(self, feedback: tuple[int, int]) -> None:
@@ -52,11 +55,16 @@ class AsyncGuesserV1:
     It uses a LangChain agent to generate guesses and provide feedback asynchronously.
     """
 
-    def __init__(self):
+    def __init__(
+            self, client_provider: LLMClientProvider | None = None, game_id: str | None = None,
+            model: str | None = None):
         self.config = ConfigProvider.get_config()
+        self.client_provider = client_provider or LLMClientProvider.get_provider()
+        self.game_id = game_id
         self.chat_history: list = [HumanMessage(content="Provide your next guess.")]
-        self.agent = create_agent(
-            self.config.BASE_MODEL, system_prompt=SYSTEM_PROMPT, response_format=GuessResponse)
+        self.agent = AgentRegistry.get_agent(
+            model or self.config.BASE_MODEL, GuessResponse, system_prompt=SYSTEM_PROMPT,
+            client_provider=self.client_provider)
         self.previous_guess = None
 
     async def provide_feedback(self, feedback: tuple[int, int]) -> None:
@@ -66,7 +74,8 @@ class AsyncGuesserV1:
         self.chat_history.append(HumanMessage(content=feedback_str))
 
     async def guess(self) -> GuessResponse | None:
-        response = await self.agent.ainvoke({"messages": self.chat_history})
+        async with self.client_provider.limit(self.game_id):
+            response = await self.agent.ainvoke({"messages": self.chat_history})
         structured_response = response.get("structured_response")
         if structured_response is not None:
             self.previous_guess = structured_response.guess
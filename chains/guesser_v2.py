@@ -2,8 +2,9 @@ from langchain_core.messages import HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from config import ConfigProvider
-from langchain.agents import create_agent
 from agent_protocol import GuessResponse
+from chains.registry import AgentRegistry
+from llm_client_provider import LLMClientProvider
 from logger_provider import LoggerProvider
 
 logger = LoggerProvider.get_logger('guesser_v2')
@@ -66,6 +67,8 @@ Context:
 Your next guess:
 """
 
+message_prompt = ChatPromptTemplate.from_template(MESSAGE_TEMPLATE)
+
 
 class GuesserV2Response(BaseModel):
     """Response model for guesser v2."""
@@ -90,30 +93,30 @@ class GuesserV2:
     Uses a more sophisticated approach to provide better performance.
     """
 
-    def __init__(self):
+    def __init__(
+            self, client_provider: LLMClientProvider | None = None, model: str | None = None):
         self.config = ConfigProvider.get_config()
         self.memory = Memory()
-        self.agent = create_agent(
-            self.config.BASE_MODEL, system_prompt=SYSTEM_PROMPT, response_format=GuesserV2Response)
+        self.chain = AgentRegistry.get_chain(
+            "guesser_v2", message_prompt, model or self.config.BASE_MODEL, GuesserV2Response,
+            system_prompt=SYSTEM_PROMPT, client_provider=client_provider)
         self.last_guess: GuesserV2Response | None = None
 
     def provide_feedback(self, feedback: tuple[int, int]) -> None:
         if self.last_guess is None:
             raise ValueError("No guess has been made yet.")
         self.memory.history.append((self.last_guess.guess, feedback))
-        logger.info(f"Feedback: {feedback}")
+        logger.info("Feedback: %s", feedback)
 
     def guess(self) -> GuessResponse | None:
-        logger.info(f"Guessing round {self.memory.guess_count}")
-        prompt = ChatPromptTemplate.from_template(MESSAGE_TEMPLATE)
-        chain = prompt | self.agent
-        response = chain.invoke(self.memory.model_dump())
+        logger.info("Guessing round %s", self.memory.guess_count)
+        response = self.chain.invoke(self.memory.model_dump())
         # update memory
         structured_response = response.get("structured_response")
         assert isinstance(structured_response, GuesserV2Response)
         self.last_guess = structured_response
         self.memory.guess_count += 1
-        logger.info(f"Guess: {structured_response.guess}")
-        logger.info(f"Analysis: {structured_response.analysis}")
+        logger.info("Guess: %s", structured_response.guess)
+        logger.info("Analysis: %s", structured_response.analysis)
         guess = GuessResponse.model_validate(structured_response.model_dump())
         return guess
@@ -1,20 +1,90 @@
+import asyncio
+import logging
+from functools import partial
+from time import perf_counter
+
 from config import ConfigProvider
 
 from langchain_core.prompts import (
     ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate)
 from langchain_core.output_parsers import JsonOutputParser
-from langchain.agents import create_agent
+from langchain_core.runnables import Runnable
 
 from agent_protocol import GuessResponse
+from chains.guess_validator import GuessValidator
+from chains.guesser_v3_rules import respond
+from chains.registry import AgentRegistry
+from chains.response_cache import DefaultCache, ResponseCache, ResponseCacheProvider
+from chains.speculation import Speculator
+from feedback_table import SIMPLIFIED_WIN
+from llm_client_provider import LLMClientProvider, TokenUsage
 from logger_provider import LoggerProvider
-from models.guesser_v3 import State, GuesserV3Response
-from prompts.guesser_v3 import SYSTEM_PROMPT, MESSAGE_PROMPT
+from metrics import STAGE_SECONDS, MetricsRegistry
+from models.guesser_v3 import (
+    CompactGuesserV3Response, CompactState, GuesserV3Response, State, StateFormat)
+from prompts.guesser_v3 import (
+    COMPACT_STATE_INSTRUCTIONS, CORRECTION_PROMPT, MESSAGE_PROMPT, SYSTEM_PROMPT)
+from request_policy import CACHE, LOCAL, RequestPolicy
 
 log = LoggerProvider.get_logger('guesser_v3')
 
+prompt_seconds = MetricsRegistry.get_registry().histogram(STAGE_SECONDS, stage="prompt")
+parse_seconds = MetricsRegistry.get_registry().histogram(STAGE_SECONDS, stage="parse")
+
 system_prompt_template = SystemMessagePromptTemplate.from_template(SYSTEM_PROMPT)
 system_message = system_prompt_template.format(
     state_format_instructions=JsonOutputParser(pydantic_object=State).get_format_instructions())
+message_prompt = ChatPromptTemplate.from_messages([
+    system_message,
+    HumanMessagePromptTemplate.from_template(MESSAGE_PROMPT)])
+correction_prompt = ChatPromptTemplate.from_messages([
+    system_message,
+    HumanMessagePromptTemplate.from_template(MESSAGE_PROMPT),
+    HumanMessagePromptTemplate.from_template(CORRECTION_PROMPT)])
+
+compact_system_message = system_prompt_template.format(
+    state_format_instructions=COMPACT_STATE_INSTRUCTIONS.format(
+        schema=JsonOutputParser(pydantic_object=CompactState).get_format_instructions()))
+compact_message_prompt = ChatPromptTemplate.from_messages([
+    compact_system_message,
+    HumanMessagePromptTemplate.from_template(MESSAGE_PROMPT)])
+compact_correction_prompt = ChatPromptTemplate.from_messages([
+    compact_system_message,
+    HumanMessagePromptTemplate.from_template(MESSAGE_PROMPT),
+    HumanMessagePromptTemplate.from_template(CORRECTION_PROMPT)])
+
+# state format -> (chain name prefix, message prompt, correction prompt, response format)
+STATE_FORMATS: dict[StateFormat, tuple[str, ChatPromptTemplate, ChatPromptTemplate, type]] = {
+    StateFormat.FULL: ("guesser_v3", message_prompt, correction_prompt, GuesserV3Response),
+    StateFormat.COMPACT: (
+        "guesser_v3_compact", compact_message_prompt, compact_correction_prompt,
+        CompactGuesserV3Response)}
+
+
+def encode_state(state: State, state_format: StateFormat) -> dict | str:
+    """The state as it is sent to the model in the given format."""
+    if state_format == StateFormat.COMPACT:
+        return CompactState.diff(None, state).to_wire()
+    return state.model_dump(mode="json")
+
+
+def decode_response(
+        structured_response: GuesserV3Response | CompactGuesserV3Response,
+        state: State) -> GuesserV3Response:
+    """Full response of the model, merging a compact state update into `state`."""
+    if isinstance(structured_response, CompactGuesserV3Response):
+        return structured_response.to_response(state)
+    assert isinstance(structured_response, GuesserV3Response)
+    return structured_response
+
+
+def format_feedback(guess: str, feedback: int) -> str:
+    return f"{guess} has {feedback} correct digits"
+
+
+def cache_key(model: str, inputs: dict) -> str:
+    """Response cache key of a turn, identical turns of the same model share a response."""
+    return ResponseCache.key(f"guesser_v3:{model}", inputs)
 
 
 class GuesserV3:
@@ -24,11 +94,19 @@ class GuesserV3:
     Uses a more sophisticated approach to provide better performance.
     """
 
-    def __init__(self, model: str | None = None):
+    def __init__(
+            self, model: str | None = None, client_provider: LLMClientProvider | None = None,
+            response_cache: ResponseCache | DefaultCache | None = DefaultCache.PROCESS,
+            state_format: StateFormat | None = None):
         self.config = ConfigProvider.get_config()
         self.state = State()
-        model_name = model or self.config.BASE_MODEL
-        self.agent = create_agent(model_name, response_format=GuesserV3Response)
+        self.model_name = model or self.config.BASE_MODEL
+        self.state_format = state_format or StateFormat(self.config.GUESSER_V3_STATE_FORMAT)
+        name, prompt, _, response_format = STATE_FORMATS[self.state_format]
+        self.system_message = prompt.messages[0]
+        self.chain = AgentRegistry.get_chain(
+            name, prompt, self.model_name, response_format, client_provider=client_provider)
+        self.response_cache = ResponseCacheProvider.resolve(response_cache)
         self.last_guess = None
         self.last_feedback = None
         self.round = 1
@@ -36,30 +114,35 @@ class GuesserV3:
     def provide_feedback(self, feedback: tuple[int, int]) -> None:
         if self.last_guess is None:
             raise ValueError("No guess has been made yet.")
-        formatted_feedback = f"{self.last_guess} has {feedback[0] + feedback[1]} correct digits"
-        self.last_feedback = formatted_feedback
+        self.last_feedback = format_feedback(self.last_guess, feedback[0] + feedback[1])
         self.round += 1
 
     def guess(self) -> GuessResponse | None:
         if self.round == 1:
-            log.info(f"system_message: {system_message}")
-        prompt = ChatPromptTemplate.from_messages([
-            system_message,
-            HumanMessagePromptTemplate.from_template(MESSAGE_PROMPT)])
-        chain = prompt | self.agent
-        response = chain.invoke({
-            "round": self.round, "current_state": self.state.model_dump(),
-            "previous_guess": self.last_guess, "feedback": self.last_feedback})
-        structured_response = response.get("structured_response")
-        assert isinstance(structured_response, GuesserV3Response)
+            log.info("system_message: %s", self.system_message)
+        inputs = {
+            "round": self.round, "current_state": encode_state(self.state, self.state_format),
+            "previous_guess": self.last_guess, "feedback": self.last_feedback}
+        key = cache_key(self.model_name, inputs)
+        structured_response = None
+        if self.response_cache is not None:
+            structured_response = self.response_cache.get_response(key, GuesserV3Response)
+        if structured_response is None:
+            response = self.chain.invoke(inputs)
+            structured_response = decode_response(
+                response.get("structured_response"), self.state)
+            if self.response_cache is not None:
+                self.response_cache.put_response(key, structured_response)
+        else:
+            log.info("Response cache hit for round %s", self.round)
         self.state = structured_response.updated_state
         self.last_guess = structured_response.guess
-        log.info(f"Round: {self.round}")
-        log.info(f"Last guess: {self.last_guess}")
-        log.info(f"Feedback: {self.last_feedback}")
-        log.info(f"Updated state: {self.state.model_dump()}")
-        log.info(f"Guess: {structured_response.guess}")
-        log.info(f"Reasoning: {structured_response.reasoning}")
+        log.info("Round: %s", self.round)
+        log.info("Last guess: %s", self.last_guess)
+        log.info("Feedback: %s", self.last_feedback)
+        log.debug("Updated state: %s", self.state)
+        log.info("Guess: %s", structured_response.guess)
+        log.info("Reasoning: %s", structured_response.reasoning)
         return GuessResponse.model_validate(structured_response.model_dump())
 
 
@@ -67,53 +150,310 @@ class AsyncGuesserV3:
     """
     AsyncGuesserV3 is an async version of GuesserV3.
     It uses a LangChain agent to generate guesses and provide feedback asynchronously.
+    Every guess is validated before it is returned: invalid or useless guesses are sent
+    back to the model with a correction, and replaced by a locally computed guess
+    if the model does not fix them within `max_repairs` re-prompts.
+
+    In speculative mode the next turn is requested for up to `speculation_budget` of the
+    most likely feedback values as soon as a guess is made, so the LLM latency overlaps
+    with the opponent's turn. The branch matching the actual feedback is kept.
+
+    Requests follow the `RequestPolicy`: each attempt has a deadline and may be hedged,
+    a stalled or failing model hands over to the next model of the cascade, and when
+    every model failed the turn is answered by the local rule engine.
+
+    With `samples` > 1 each turn requests that many candidate guesses concurrently,
+    from `sample_model` if given, and plays the valid one with the highest expected
+    information over the codes still consistent with the feedback.
     """
 
-    def __init__(self, model: str | None = None):
+    def __init__(
+            self, model: str | None = None, max_repairs: int = 1,
+            client_provider: LLMClientProvider | None = None, game_id: str | None = None,
+            response_cache: ResponseCache | DefaultCache | None = DefaultCache.PROCESS,
+            state_format: StateFormat | None = None, speculative: bool | None = None,
+            speculation_budget: int | None = None, request_policy: RequestPolicy | None = None,
+            samples: int | None = None, sample_model: str | None = None):
         self.config = ConfigProvider.get_config()
+        self.client_provider = client_provider or LLMClientProvider.get_provider()
+        self.request_policy = request_policy or RequestPolicy.get_policy()
+        self.game_id = game_id
         self.state = State()
-        model_name = model or self.config.BASE_MODEL
-        self.agent = create_agent(model_name, response_format=GuesserV3Response)
+        self.model_name = model or self.config.BASE_MODEL
+        self.state_format = state_format or StateFormat(self.config.GUESSER_V3_STATE_FORMAT)
+        name, prompt, correction, response_format = STATE_FORMATS[self.state_format]
+        self.system_message = prompt.messages[0]
+        self.chain = AgentRegistry.get_chain(
+            name, prompt, self.model_name, response_format,
+            client_provider=self.client_provider)
+        self.correction_chain = AgentRegistry.get_chain(
+            f"{name}_correction", correction, self.model_name, response_format,
+            client_provider=self.client_provider)
+        self.samples = samples or self.config.GUESSER_V3_SAMPLES
+        self.sample_model = sample_model or self.config.GUESSER_V3_SAMPLE_MODEL \
+            or self.model_name
+        self.sample_chain = AgentRegistry.get_chain(
+            name, prompt, self.sample_model, response_format,
+            client_provider=self.client_provider)
+        # (model, chain, correction chain) for the models after this guesser's own
+        self.fallback_chains = [
+            (fallback_model,
+             AgentRegistry.get_chain(
+                 name, prompt, fallback_model, response_format,
+                 client_provider=self.client_provider),
+             AgentRegistry.get_chain(
+                 f"{name}_correction", correction, fallback_model, response_format,
+                 client_provider=self.client_provider))
+            for fallback_model in self.request_policy.cascade(self.model_name)[1:]]
+        self.response_cache = ResponseCacheProvider.resolve(response_cache)
         self.last_guess = None
         self.last_feedback = None
+        self.last_feedback_value: int | None = None
+        self.last_model = self.model_name
         self.round = 1
+        self.validator = GuessValidator(simplified=True)
+        self.max_repairs = max_repairs
+        self.token_usage = TokenUsage()
+        # speculative turns keep the model that answered them, see `__answer`
+        self.speculator: Speculator[tuple[str, GuesserV3Response]] | None = None
+        if self.config.GUESSER_V3_SPECULATIVE if speculative is None else speculative:
+            self.speculator = Speculator(
+                speculation_budget or self.config.GUESSER_V3_SPECULATION_BUDGET)
 
     async def provide_feedback(self, feedback: tuple[int, int]) -> None:
         if self.last_guess is None:
             raise ValueError("No guess has been made yet.")
-        formatted_feedback = f"{self.last_guess} has {feedback[0] + feedback[1]} correct digits"
-        self.last_feedback = formatted_feedback
+        self.last_feedback = format_feedback(self.last_guess, feedback[0] + feedback[1])
+        self.last_feedback_value = feedback[0] + feedback[1]
+        self.validator.record_feedback(self.last_guess, feedback)
+        if self.speculator is not None:
+            if feedback[0] + feedback[1] == SIMPLIFIED_WIN:
+                self.speculator.cancel()
+            else:
+                self.speculator.resolve(feedback[0] + feedback[1])
         self.round += 1
 
+    async def aclose(self) -> None:
+        """Cancel the speculative requests still in flight, once the game is over."""
+        if self.speculator is not None:
+            self.speculator.cancel()
+
+    async def _invoke(
+            self, chain: Runnable, inputs: dict, max_retries: int,
+            usage: TokenUsage | None = None, speculative: bool = False,
+            model: str | None = None) -> GuesserV3Response:
+        """
+        Response of the first model of the cascade that answers, `chain` being the chain
+        of `model` (this guesser's own model by default). Errors are retried up to
+        `max_retries` times per model, a model that misses the deadline is not retried.
+        """
+        # speculative requests do not take the per-game slots of the turns being played
+        game_id = None if speculative else self.game_id
+        model = model or self.model_name
+        correction = chain is self.correction_chain
+        stages = [(model, chain)] + [
+            (fallback_model, correction_chain if correction else main_chain)
+            for fallback_model, main_chain, correction_chain in self.fallback_chains
+            if fallback_model != model]
+        error: Exception | None = None
+        for stage, (stage_model, stage_chain) in enumerate(stages):
+            if stage > 0:
+                log.warning("Falling back to %s", stage_model)
+                self.request_policy.record_outcome("fallbacks")
+            for attempt in range(max_retries):
+                try:
+                    response = await self.request_policy.run(
+                        stage_model, partial(stage_chain.ainvoke, inputs),
+                        slot=partial(self.client_provider.limit, game_id))
+                except TimeoutError as e:
+                    log.error(
+                        "%s missed the %ss deadline", stage_model, self.request_policy.deadline)
+                    error = e
+                    break
+                except Exception as e:
+                    log.error("Error guessing with %s: %s", stage_model, e)
+                    error = e
+                    continue
+                self.token_usage.add_response(response)
+                if usage is not None:
+                    usage.add_response(response)
+                try:
+                    with parse_seconds.time():
+                        structured_response = decode_response(
+                            response.get("structured_response"), self.state)
+                except Exception as e:
+                    log.error("Invalid response from %s: %s", stage_model, e)
+                    error = e
+                    continue
+                self.last_model = stage_model
+                return structured_response
+        assert error is not None
+        raise error
+
     async def guess(self, max_retries: int = 3) -> GuessResponse | None:
+        started_at = perf_counter()
         if self.round == 1:
-            log.info(f"system_message: {system_message}")
-        prompt = ChatPromptTemplate.from_messages([
-            system_message,
-            HumanMessagePromptTemplate.from_template(MESSAGE_PROMPT)])
-        chain = prompt | self.agent
+            log.info("system_message: %s", self.system_message)
+        with prompt_seconds.time():
+            inputs = self.__inputs(self.round, self.last_guess, self.last_feedback)
+            key = cache_key(self.model_name, inputs)
+        cached_response = None
+        if self.response_cache is not None:
+            cached_response = await self.response_cache.aget_response(key, GuesserV3Response)
+        if cached_response is not None and self.validator.check(cached_response.guess) is None:
+            # the cached guess still has to pass the rules of this game
+            log.info("Response cache hit for round %s", self.round)
+            self.validator.record_outcome("accepted")
+            if self.speculator is not None:
+                self.speculator.cancel()
+            return self.__accept(cached_response, CACHE, started_at)
 
-        for attempt in range(max_retries):
+        self.last_model = self.model_name
+        answer = None
+        if self.speculator is not None:
+            answer = await self.speculator.take()
+            log.debug("Speculation stats: %s", self.speculator.stats)
+        if answer is None:
             try:
-                response = await chain.ainvoke({
-                    "round": self.round, "current_state": self.state.model_dump(),
-                    "previous_guess": self.last_guess, "feedback": self.last_feedback})
-                break
+                if self.samples > 1:
+                    answer = await self.__sample(inputs, max_retries)
+                else:
+                    answer = await self.__answer(self.chain, inputs, max_retries)
             except Exception as e:
-                log.error(f"Error guessing: {e}")
-                if attempt == max_retries - 1:
-                    raise e
-                continue
+                log.error("No model answered, continuing with the local rule engine: %s", e)
+                self.request_policy.record_outcome("local")
+                return self.__accept_local(started_at)
+        model, structured_response = answer
+
+        rejection_reason = self.validator.check(structured_response.guess)
+        if rejection_reason is None:
+            self.validator.record_outcome("accepted")
+        for _ in range(self.max_repairs if rejection_reason is not None else 0):
+            log.warning("Rejected guess %s: %s", structured_response.guess, rejection_reason)
+            self.validator.record_outcome("reprompts")
+            correction_inputs = {
+                **inputs, "rejected_guess": structured_response.guess,
+                "rejection_reason": rejection_reason}
+            try:
+                model, structured_response = await self.__answer(
+                    self.correction_chain, correction_inputs, max_retries)
+            except Exception as e:
+                log.error("No model answered the correction: %s", e)
+                break
+            rejection_reason = self.validator.check(structured_response.guess)
+            if rejection_reason is None:
+                self.validator.record_outcome("repaired")
+                break
+        if rejection_reason is not None:
+            fallback_guess = self.validator.fallback()
+            if fallback_guess is None:
+                log.error("No code is consistent with the feedback")
+                return None
+            log.warning(
+                "Rejected guess %s: %s, falling back to %s", structured_response.guess,
+                rejection_reason, fallback_guess)
+            self.validator.record_outcome("fallback")
+            # the state of the model was built around the rejected guess
+            structured_response = GuesserV3Response(
+                updated_state=self.state, guess=fallback_guess,
+                reasoning="Best guess consistent with the feedback so far.",
+                comments="Fallback to the best locally computed guess.")
+        elif self.response_cache is not None:
+            # only responses the model got right are worth replaying, as that model's
+            await self.response_cache.aput_response(
+                cache_key(model, inputs), structured_response)
+        self.last_model = model
+        return self.__accept(structured_response, model, started_at)
+
+    async def __answer(
+            self, chain: Runnable, inputs: dict, max_retries: int,
+            **kwargs) -> tuple[str, GuesserV3Response]:
+        """Response of `_invoke` and the model of the cascade that gave it."""
+        response = await self._invoke(chain, inputs, max_retries, **kwargs)
+        # set by `_invoke` right before it returned, no other call can have run since
+        return self.last_model, response
+
+    async def __sample(
+            self, inputs: dict, max_retries: int) -> tuple[str, GuesserV3Response]:
+        """Most informative of `samples` concurrently requested responses."""
+        results = await asyncio.gather(*[
+            self.__answer(self.sample_chain, inputs, max_retries, model=self.sample_model)
+            for _ in range(self.samples)], return_exceptions=True)
+        answers = [result for result in results if isinstance(result, tuple)]
+        if not answers:
+            error = results[0]
+            assert isinstance(error, Exception)
+            raise error
+        scores = [self.__score(response.guess) for _, response in answers]
+        log.info(
+            "Sampled guesses: %s, scores: %s", [response.guess for _, response in answers],
+            scores)
+        # ties go to the earliest response, a rejected best one still gets repaired
+        return answers[scores.index(max(scores))]
+
+    def __score(self, guess: str) -> tuple[bool, float, bool]:
+        """(valid, expected information, can win right away), higher is better."""
+        if self.validator.check(guess) is not None:
+            return False, 0.0, False
+        candidates = self.validator.solver.candidates
+        return True, candidates.expected_information(guess), guess in candidates
 
-        structured_response = response.get("structured_response")
-        assert isinstance(structured_response, GuesserV3Response)
+    def __accept_local(self, started_at: float) -> GuessResponse | None:
+        """Answer the turn without a model, continuing the strategy from the current state."""
+        try:
+            structured_response = respond(self.state, self.last_guess, self.last_feedback_value)
+        except Exception as e:
+            log.error("The rule engine cannot continue from this state: %s", e)
+            structured_response = None
+        if structured_response is None \
+                or self.validator.check(structured_response.guess) is not None:
+            fallback_guess = self.validator.fallback()
+            if fallback_guess is None:
+                log.error("No code is consistent with the feedback")
+                return None
+            structured_response = GuesserV3Response(
+                updated_state=self.state, guess=fallback_guess,
+                reasoning="Best guess consistent with the feedback so far.",
+                comments="Fallback to the best locally computed guess.")
+        self.validator.record_outcome("fallback")
+        return self.__accept(structured_response, LOCAL, started_at)
+
+    def __accept(
+            self, structured_response: GuesserV3Response, answered_by: str,
+            started_at: float) -> GuessResponse:
         self.state = structured_response.updated_state
         self.last_guess = structured_response.guess
-        log.info(f"Round: {self.round}")
-        log.info(f"Last guess: {self.last_guess}")
-        log.info(f"Feedback: {self.last_feedback}")
-        log.info(f"Updated state: {self.state.model_dump()}")
-        log.info(f"Guess: {structured_response.guess}")
-        log.info(f"Reasoning: {structured_response.reasoning}")
+        self.request_policy.record_turn(answered_by, perf_counter() - started_at)
+        log.info("Round: %s", self.round)
+        log.info("Last guess: %s", self.last_guess)
+        log.info("Feedback: %s", self.last_feedback)
+        log.debug("Updated state: %s", self.state)
+        log.info("Guess: %s", structured_response.guess)
+        log.info("Reasoning: %s", structured_response.reasoning)
+        log.debug("Validation stats: %s", self.validator.stats)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Turn latency: %s", self.request_policy.latency_report())
+        self.__speculate()
         return GuessResponse.model_validate({
             "guess": structured_response.guess, "comments": structured_response.comments})
+
+    def __inputs(self, round: int, previous_guess: str | None, feedback: str | None) -> dict:
+        return {
+            "round": round, "current_state": encode_state(self.state, self.state_format),
+            "previous_guess": previous_guess, "feedback": feedback}
+
+    def __speculate(self) -> None:
+        """Start the next turn for the feedback values most likely to follow the last guess."""
+        if self.speculator is None or self.last_guess is None:
+            return
+        guess = self.last_guess
+        sizes = self.validator.solver.candidates.partition_sizes(guess)
+        values = sorted(
+            (value for value, size in enumerate(sizes) if size and value != SIMPLIFIED_WIN),
+            key=lambda value: -sizes[value])
+        # inputs are fixed now, the branches may start after the feedback arrived
+        inputs = {
+            value: self.__inputs(self.round + 1, guess, format_feedback(guess, value))
+            for value in values}
+        self.speculator.start(values, lambda value, usage: self.__answer(
+            self.chain, inputs[value], 1, usage=usage, speculative=True))
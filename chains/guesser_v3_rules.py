@@ -0,0 +1,239 @@
+from itertools import combinations
+
+from agent_protocol import GuessResponse
+from logger_provider import LoggerProvider
+from models.guesser_v3 import GroupStage, GroupState, GuesserV3Response, State
+
+log = LoggerProvider.get_logger('guesser_v3_rules')
+
+GROUP_NAMES = ("group_a", "group_b", "group_c")
+
+
+def _groups(state: State) -> list[tuple[str, GroupState]]:
+    return [(name, getattr(state, name)) for name in GROUP_NAMES]
+
+
+def _unknown(state: State, group: GroupState) -> list[int]:
+    return [d for d in group.digits if d not in state.confirmed and d not in state.eliminated]
+
+
+def _remaining_matches(state: State, group: GroupState) -> int:
+    assert group.matches is not None
+    return group.matches - sum(1 for d in group.digits if d in state.confirmed)
+
+
+def _tests(group: GroupState) -> list[tuple[list[int], int]]:
+    tests = [
+        (group.first_half, group.first_half_matches),
+        (group.diagonal, group.diagonal_matches),
+        (group.tiebreaker, group.tiebreaker_matches)]
+    return [(digits, matches) for digits, matches in tests
+            if digits is not None and matches is not None]
+
+
+def _filler_contribution(state: State, fillers: list[int]) -> int:
+    """Matches contributed by filler digits, known singles or whole groups with known matches."""
+    contribution = sum(1 for d in fillers if d in state.confirmed)
+    for _, group in _groups(state):
+        unknown = _unknown(state, group)
+        included = [d for d in unknown if d in fillers]
+        if not included:
+            continue
+        if len(included) != len(unknown) or group.matches is None:
+            raise ValueError(f"Filler digits {fillers} have unknown contribution")
+        contribution += _remaining_matches(state, group)
+    return contribution
+
+
+def _record_count(state: State, digits: list[int], feedback: int) -> bool:
+    for _, group in _groups(state):
+        if group.stage == GroupStage.PENDING and sorted(group.digits) == sorted(digits):
+            group.matches = feedback
+            group.stage = GroupStage.COUNTED
+            return True
+    return False
+
+
+def _record_test(state: State, digits: list[int], feedback: int) -> None:
+    """Attribute the feedback of a resolving test to the group it was testing."""
+    for _, group in _groups(state):
+        if group.matches is None:
+            continue
+        unknown = _unknown(state, group)
+        tested = [d for d in unknown if d in digits]
+        if not tested or len(tested) == len(unknown):
+            continue
+        matches = feedback - _filler_contribution(state, [d for d in digits if d not in tested])
+        if group.first_half is None:
+            group.first_half, group.first_half_matches = tested, matches
+            group.stage = GroupStage.SPLIT_TESTED
+        elif group.diagonal is None:
+            group.diagonal, group.diagonal_matches = tested, matches
+            group.stage = GroupStage.DIAGONAL_TESTED
+        else:
+            group.tiebreaker, group.tiebreaker_matches = tested, matches
+        return
+
+
+def _deduce(state: State) -> None:
+    """Confirm or eliminate digits that are decided by the counts and tests of each group."""
+    changed = True
+    while changed:
+        changed = False
+        pending = [group for _, group in _groups(state) if group.stage == GroupStage.PENDING]
+        if len(pending) == 1:
+            counted = sum(group.matches or 0 for _, group in _groups(state))
+            pending[0].matches = 4 - counted
+            pending[0].stage = GroupStage.COUNTED
+
+        for _, group in _groups(state):
+            if group.matches is None or group.stage == GroupStage.RESOLVED:
+                continue
+            options = [
+                option for option in map(set, combinations(group.digits, group.matches))
+                if all(d in option for d in group.digits if d in state.confirmed)
+                and not any(d in option for d in group.digits if d in state.eliminated)
+                and all(len(option & set(t)) == m for t, m in _tests(group))]
+            if not options:
+                log.error("Group %s has no consistent resolution", group.digits)
+                continue
+            for d in _unknown(state, group):
+                if all(d in option for option in options):
+                    state.confirmed.append(d)
+                    changed = True
+                elif not any(d in option for option in options):
+                    state.eliminated.append(d)
+                    changed = True
+
+        if len(state.confirmed) == 4:
+            for _, group in _groups(state):
+                for d in _unknown(state, group):
+                    state.eliminated.append(d)
+                    changed = True
+
+        for _, group in _groups(state):
+            if group.matches is not None and not _unknown(state, group):
+                group.stage = GroupStage.RESOLVED
+    state.digits_found = len(state.confirmed)
+
+
+def update_state(state: State, previous_guess: str | None, feedback: int | None) -> State:
+    """
+    Incorporate the feedback for `previous_guess` into a copy of `state`.
+    Mirrors the "update state" step the LLM performs in GuesserV3.
+    """
+    state = state.model_copy(deep=True)
+    if previous_guess is None or feedback is None:
+        return state
+    digits = [int(d) for d in previous_guess]
+    if not _record_count(state, digits, feedback):
+        _record_test(state, digits, feedback)
+    _deduce(state)
+    return state
+
+
+def _pick_fillers(state: State, tested_group: GroupState, count: int) -> list[int]:
+    """Digits with a known total contribution, the control group first."""
+    units: list[list[int]] = []
+    control = state.group_c
+    if control is not tested_group:
+        units.append(_unknown(state, control) if control.matches is not None else [])
+    units += [[d] for d in state.eliminated] + [[d] for d in state.confirmed]
+    units += [_unknown(state, group) for _, group in _groups(state)
+              if group is not tested_group and group is not control and group.matches is not None]
+
+    fillers: list[int] = []
+    for unit in units:
+        if unit and len(fillers) + len(unit) <= count and not any(d in fillers for d in unit):
+            fillers += unit
+            if len(fillers) == count:
+                return fillers
+    raise ValueError(f"Not enough filler digits with known contribution in {state}")
+
+
+def _pick_test(group: GroupState, unknown: list[int]) -> list[int]:
+    """Digits of the group to test next: split, then diagonal, then tiebreaker or isolate."""
+    if len(unknown) == 4:
+        if group.first_half is None:
+            return unknown[:2]
+        first, second = group.first_half, [d for d in unknown if d not in group.first_half]
+        if group.diagonal is None:
+            return [first[0], second[0]]
+        return [first[0], second[1]]
+    return unknown[:1]
+
+
+def next_guess(state: State) -> tuple[str, str]:
+    """Next guess and the reasoning behind it, following the GuesserV3 strategy."""
+    if len(state.confirmed) == 4:
+        return "".join(str(d) for d in state.confirmed), "All 4 digits confirmed, submitting."
+
+    for name, group in _groups(state):
+        if group.stage == GroupStage.PENDING and len(group.digits) == 4:
+            digits = "".join(str(d) for d in group.digits)
+            return digits, f"Partition: counting matches in {name} {group.digits}."
+
+    for name, group in _groups(state):
+        if group.stage == GroupStage.RESOLVED or group.matches is None:
+            continue
+        unknown = _unknown(state, group)
+        test = _pick_test(group, unknown)
+        fillers = _pick_fillers(state, group, 4 - len(test))
+        reasoning = (f"Resolving {name} {group.digits} with {group.matches} matches: "
+                     f"testing {test} with fillers {fillers} of known contribution.")
+        return "".join(str(d) for d in test + fillers), reasoning
+    raise ValueError(f"No group left to resolve in {state}")
+
+
+def respond(state: State, previous_guess: str | None, feedback: int | None) -> GuesserV3Response:
+    """Local equivalent of one GuesserV3 chain invocation."""
+    updated_state = update_state(state, previous_guess, feedback)
+    guess, reasoning = next_guess(updated_state)
+    return GuesserV3Response(
+        updated_state=updated_state, guess=guess, reasoning=reasoning, comments=reasoning)
+
+
+class GuesserV3Rules:
+    """
+    GuesserV3Rules is a class that implements the Guesser interface.
+    It runs the GuesserV3 group-partition strategy locally instead of asking an LLM,
+    producing the same `State` the LLM is asked to emit each round.
+    """
+
+    def __init__(self):
+        self.state = State()
+        self.last_guess: str | None = None
+        self.last_feedback: int | None = None
+        self.round = 1
+
+    def provide_feedback(self, feedback: tuple[int, int]) -> None:
+        if self.last_guess is None:
+            raise ValueError("No guess has been made yet.")
+        self.last_feedback = feedback[0] + feedback[1]
+        self.round += 1
+
+    def guess(self) -> GuessResponse | None:
+        response = respond(self.state, self.last_guess, self.last_feedback)
+        self.state = response.updated_state
+        self.last_guess = response.guess
+        log.info("Round: %s, guess: %s", self.round, response.guess)
+        return GuessResponse(guess=response.guess, comments=response.comments)
+
+
+class AsyncGuesserV3Rules:
+    """
+    AsyncGuesserV3Rules is an async version of GuesserV3Rules.
+    """
+
+    def __init__(self):
+        self.guesser = GuesserV3Rules()
+
+    @property
+    def state(self) -> State:
+        return self.guesser.state
+
+    async def provide_feedback(self, feedback: tuple[int, int]) -> None:
+        self.guesser.provide_feedback(feedback)
+
+    async def guess(self) -> GuessResponse | None:
+        return self.guesser.guess()
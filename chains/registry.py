@@ -0,0 +1,57 @@
+from typing import Any
+
+from langchain.agents import create_agent
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+
+from llm_client_provider import LLMClientProvider
+from logger_provider import LoggerProvider
+
+log = LoggerProvider.get_logger('registry')
+
+
+class AgentRegistry:
+    """
+    Process-wide cache of agents and compiled `prompt | agent` chains.
+
+    Agents are stateless between invocations (history is passed in the input),
+    so one instance per (client provider, model, system prompt, response format)
+    is shared by all guessers. Models come from the `LLMClientProvider`,
+    so all agents of a model share its connection pool.
+    """
+    __agents: dict[tuple[LLMClientProvider, str, str | None, type[BaseModel]], Any] = {}
+    __chains: dict[tuple[LLMClientProvider, str, str, type[BaseModel]], Runnable] = {}
+
+    @classmethod
+    def get_agent(
+            cls, model: str, response_format: type[BaseModel], system_prompt: str | None = None,
+            client_provider: LLMClientProvider | None = None) -> Any:
+        client_provider = client_provider or LLMClientProvider.get_provider()
+        key = (client_provider, model, system_prompt, response_format)
+        if key not in cls.__agents:
+            log.info("Creating agent for model: %s, response: %s", model, response_format.__name__)
+            cls.__agents[key] = create_agent(
+                client_provider.get_chat_model(model), system_prompt=system_prompt,
+                response_format=response_format)
+        return cls.__agents[key]
+
+    @classmethod
+    def get_chain(
+            cls, name: str, prompt: ChatPromptTemplate, model: str,
+            response_format: type[BaseModel], system_prompt: str | None = None,
+            client_provider: LLMClientProvider | None = None) -> Runnable:
+        """Chain of `prompt` into the shared agent of `model`, `name` identifies the prompt."""
+        client_provider = client_provider or LLMClientProvider.get_provider()
+        key = (client_provider, name, model, response_format)
+        if key not in cls.__chains:
+            agent = cls.get_agent(
+                model, response_format, system_prompt=system_prompt,
+                client_provider=client_provider)
+            cls.__chains[key] = prompt | agent
+        return cls.__chains[key]
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.__agents.clear()
+        cls.__chains.clear()
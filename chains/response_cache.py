@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from enum import Enum
+from pathlib import Path
+from time import time
+from typing import Any, Optional, TypeVar
+
+from pydantic import BaseModel
+
+from config import ConfigProvider
+from logger_provider import LoggerProvider
+
+log = LoggerProvider.get_logger('response_cache')
+
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+TRIM_INTERVAL = 100  # writes between two size checks of the disk tier
+
+
+class CacheStats(BaseModel):
+    """Hit and miss counters of a response cache."""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+
+class ResponseCache:
+    """
+    Two-tier cache of LLM responses keyed by a canonical hash of the turn inputs.
+
+    The memory tier is an LRU of `memory_entries` items. The optional disk tier is a SQLite
+    file shared across processes and restarts, trimmed back under `max_entries` rows (least
+    recently used first) every `TRIM_INTERVAL` writes. Entries older than `ttl` seconds are
+    ignored and removed in both tiers.
+    """
+
+    def __init__(
+            self, path: str | Path | None = None, memory_entries: int = 1024,
+            max_entries: int = 100_000, ttl: float = 60 * 60 * 24 * 7):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.__memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.__db: sqlite3.Connection | None = None
+        # the disk tier is used from the event loop and from worker threads
+        self.__db_lock = threading.Lock()
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.__db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.__db.execute("PRAGMA journal_mode=WAL")
+            self.__db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            self.__db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    @staticmethod
+    def key(namespace: str, inputs: dict[str, Any]) -> str:
+        """Canonical hash of the inputs, independent of key order and formatting."""
+        canonical = json.dumps(
+            {"namespace": namespace, "inputs": inputs}, sort_keys=True, separators=(",", ":"),
+            default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time()
+        value = self.__memory_get(key, now)
+        if value is None and self.__db is not None:
+            value = self.__disk_found(key, self.__locked_disk_get(key, now))
+        if value is None:
+            self.stats.misses += 1
+        return value
+
+    async def aget(self, key: str) -> str | None:
+        """`get` with the disk tier read on a worker thread, off the event loop."""
+        now = time()
+        value = self.__memory_get(key, now)
+        if value is None and self.__db is not None:
+            row = await asyncio.to_thread(self.__locked_disk_get, key, now)
+            value = self.__disk_found(key, row)
+        if value is None:
+            self.stats.misses += 1
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time()
+        self.__remember(key, now, value)
+        self.stats.writes += 1
+        if self.__db is not None:
+            self.stats.evictions += self.__disk_put(key, value, now, self.stats.writes)
+
+    async def aput(self, key: str, value: str) -> None:
+        """`put` with the disk tier written on a worker thread, off the event loop."""
+        now = time()
+        self.__remember(key, now, value)
+        self.stats.writes += 1
+        if self.__db is not None:
+            self.stats.evictions += await asyncio.to_thread(
+                self.__disk_put, key, value, now, self.stats.writes)
+
+    def get_response(self, key: str, response_type: type[ResponseT]) -> ResponseT | None:
+        value = self.get(key)
+        return response_type.model_validate_json(value) if value is not None else None
+
+    async def aget_response(
+            self, key: str, response_type: type[ResponseT]) -> ResponseT | None:
+        value = await self.aget(key)
+        return response_type.model_validate_json(value) if value is not None else None
+
+    def put_response(self, key: str, response: BaseModel) -> None:
+        self.put(key, response.model_dump_json())
+
+    async def aput_response(self, key: str, response: BaseModel) -> None:
+        await self.aput(key, response.model_dump_json())
+
+    def close(self) -> None:
+        with self.__db_lock:
+            if self.__db is not None:
+                self.__db.close()
+                self.__db = None
+
+    def __memory_get(self, key: str, now: float) -> str | None:
+        entry = self.__memory.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if created_at + self.ttl > now:
+            self.__memory.move_to_end(key)
+            self.stats.memory_hits += 1
+            return value
+        del self.__memory[key]
+        return None
+
+    def __disk_found(self, key: str, row: tuple[str, float] | None) -> str | None:
+        if row is None:
+            return None
+        value, created_at = row
+        self.__remember(key, created_at, value)
+        self.stats.disk_hits += 1
+        return value
+
+    # the disk methods only touch the database, so that they can run on worker threads
+
+    def __locked_disk_get(self, key: str, now: float) -> tuple[str, float] | None:
+        with self.__db_lock:
+            return self.__disk_get(key, now)
+
+    def __disk_get(self, key: str, now: float) -> tuple[str, float] | None:
+        """(value, created_at) of a live entry."""
+        assert self.__db is not None
+        row = self.__db.execute(
+            "SELECT value, created_at FROM responses WHERE key = ?", (key, )).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if created_at + self.ttl > now:
+            self.__db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return value, created_at
+        self.__db.execute("DELETE FROM responses WHERE key = ?", (key, ))
+        return None
+
+    def __disk_put(self, key: str, value: str, now: float, writes: int) -> int:
+        """Write an entry, returns the number of entries evicted by the trim."""
+        with self.__db_lock:
+            assert self.__db is not None
+            self.__db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)", (key, value, now, now))
+            # trim in batches so that counting and eviction do not run on every write
+            if writes % TRIM_INTERVAL != 0:
+                return 0
+            self.__db.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl, ))
+            count = self.__db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count <= self.max_entries:
+                return 0
+            excess = count - self.max_entries + self.max_entries // 10
+            self.__db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)", (excess, ))
+            return excess
+
+    def __remember(self, key: str, created_at: float, value: str) -> None:
+        self.__memory[key] = (created_at, value)
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.memory_entries:
+            self.__memory.popitem(last=False)
+            self.stats.evictions += 1
+
+
+class DefaultCache(Enum):
+    """
+    Default of the `response_cache` arguments, the cache of `ResponseCacheProvider`,
+    so that None can disable the cache of a single guesser.
+    """
+    PROCESS = "process"
+
+
+class ResponseCacheProvider:
+    """Process-wide response cache configured from `Config`, None when disabled."""
+    __cache: Optional[ResponseCache] = None
+    __loaded: bool = False
+
+    @classmethod
+    def get_cache(cls) -> ResponseCache | None:
+        if not cls.__loaded:
+            config = ConfigProvider.get_config()
+            if config.RESPONSE_CACHE_ENABLED:
+                cls.__cache = ResponseCache(
+                    path=config.RESPONSE_CACHE_PATH,
+                    memory_entries=config.RESPONSE_CACHE_MEMORY_ENTRIES,
+                    max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                    ttl=config.RESPONSE_CACHE_TTL)
+                log.info("Response cache enabled, disk tier: %s", config.RESPONSE_CACHE_PATH)
+            cls.__loaded = True
+        return cls.__cache
+
+    @classmethod
+    def resolve(
+            cls, response_cache: ResponseCache | DefaultCache | None) -> ResponseCache | None:
+        """The cache a guesser was given, None when it was disabled."""
+        if response_cache is DefaultCache.PROCESS:
+            return cls.get_cache()
+        return response_cache
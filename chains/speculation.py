@@ -0,0 +1,119 @@
+import asyncio
+from time import perf_counter
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from pydantic import BaseModel
+
+from llm_client_provider import TokenUsage
+from logger_provider import LoggerProvider
+
+log = LoggerProvider.get_logger('speculation')
+
+ResultT = TypeVar("ResultT")
+
+
+class SpeculationStats(BaseModel):
+    """What speculative precomputation gained and cost."""
+    turns: int = 0  # turns for which branches were started
+    branches: int = 0  # branches started
+    hits: int = 0  # the actual feedback had a branch
+    misses: int = 0  # the actual feedback had no branch, the turn ran normally
+    cancelled: int = 0  # losing branches cancelled while their request was in flight
+    time_saved: float = 0.0  # seconds of LLM latency that ran before the result was needed
+    wasted_tokens: int = 0  # tokens of losing branches that completed before the feedback
+
+
+class _Branch(Generic[ResultT]):
+    __slots__ = ('task', 'usage', 'started_at', 'finished_at')
+
+    def __init__(self, task: "asyncio.Task[ResultT]", usage: TokenUsage):
+        self.task = task
+        self.usage = usage
+        self.started_at = perf_counter()
+        self.finished_at: float | None = None
+
+
+class Speculator(Generic[ResultT]):
+    """
+    Runs the next turn ahead of time for the most likely feedback values while the
+    feedback for the current guess is pending, and keeps the branch that matches.
+
+    Call `start()` right after a guess is made, `resolve()` with the actual feedback
+    value, and `take()` when the next turn begins. Branches that lose are cancelled;
+    the tokens of a cancelled in-flight request are not reported by the provider,
+    so `wasted_tokens` only covers losing branches that had already completed.
+    """
+    totals = SpeculationStats()
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.stats = SpeculationStats()
+        self.__branches: dict[int, _Branch[ResultT]] = {}
+        self.__winner: _Branch[ResultT] | None = None
+
+    def start(
+            self, feedback_values: list[int],
+            run: Callable[[int, TokenUsage], Awaitable[ResultT]]) -> None:
+        """Start `run(value, usage)` for the first `budget` values, most likely first."""
+        self.cancel()
+        values = feedback_values[:self.budget]
+        if not values:
+            return
+        for value in values:
+            usage = TokenUsage()
+            branch = _Branch(asyncio.create_task(run(value, usage)), usage)
+            branch.task.add_done_callback(lambda _, branch=branch: self.__finished(branch))
+            self.__branches[value] = branch
+        self.__record("turns", 1)
+        self.__record("branches", len(values))
+        log.info("Speculating on feedback values %s", values)
+
+    def resolve(self, feedback_value: int) -> None:
+        """Keep the branch of the actual feedback value, cancel the others."""
+        if not self.__branches:
+            return
+        self.__winner = self.__branches.pop(feedback_value, None)
+        self.__record("hits" if self.__winner is not None else "misses", 1)
+        self.__discard()
+
+    async def take(self) -> ResultT | None:
+        """Result of the winning branch, or None if there is none or it failed."""
+        branch, self.__winner = self.__winner, None
+        if branch is None:
+            return None
+        waiting_since = perf_counter()
+        try:
+            result = await branch.task
+        except Exception as e:
+            log.error("Speculative branch failed: %s", e)
+            return None
+        assert branch.finished_at is not None
+        waited = max(0.0, branch.finished_at - waiting_since)
+        self.__record("time_saved", branch.finished_at - branch.started_at - waited)
+        return result
+
+    def cancel(self) -> None:
+        """Drop every branch, including an unclaimed winner."""
+        if self.__winner is not None:
+            self.__drop(self.__winner)
+            self.__winner = None
+        self.__discard()
+
+    def __discard(self) -> None:
+        for branch in self.__branches.values():
+            self.__drop(branch)
+        self.__branches.clear()
+
+    def __drop(self, branch: _Branch[ResultT]) -> None:
+        if not branch.task.done():
+            branch.task.cancel()
+            self.__record("cancelled", 1)
+        elif not branch.task.cancelled() and branch.task.exception() is None:
+            self.__record("wasted_tokens", branch.usage.total_tokens)
+
+    def __finished(self, branch: _Branch[ResultT]) -> None:
+        branch.finished_at = perf_counter()
+
+    def __record(self, name: str, value: int | float) -> None:
+        for stats in (self.stats, Speculator.totals):
+            setattr(stats, name, getattr(stats, name) + value)
@@ -12,12 +12,56 @@ class Config(BaseModel):
     OPENAI_API_KEY: str
 
     GUESSER_MAX_ATTEMPTS: int = 15
+    GUESSER_V3_STATE_FORMAT: str = 'full'  # 'full' or 'compact', see models.guesser_v3
+    GUESSER_V3_SPECULATIVE: bool = False
+    GUESSER_V3_SPECULATION_BUDGET: int = 3  # next turns requested ahead per guess
+    GUESSER_V3_SAMPLES: int = 1  # candidate guesses requested per turn, the best is played
+    GUESSER_V3_SAMPLE_MODEL: str = ''  # model of the candidate guesses, empty for BASE_MODEL
+
+    LLM_MAX_CONNECTIONS: int = 100  # per model
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20  # per model
+    LLM_KEEPALIVE_EXPIRY: float = 60.0  # seconds
+    LLM_REQUEST_TIMEOUT: float = 600.0  # seconds
+    LLM_MAX_CONCURRENT_REQUESTS: int = 32
+    LLM_MAX_CONCURRENT_REQUESTS_PER_GAME: int = 2
+    LLM_REQUEST_DEADLINE: float = 90.0  # seconds per attempt, hedge included
+    LLM_HEDGE_PERCENTILE: float | None = 0.95  # of recent call latencies, None disables hedging
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # calls to a model before it is hedged
+    LLM_FALLBACK_MODELS: str = ''  # comma-separated, tried in order after the guesser's model
     GAME_ENGINE_GAME_TIMEOUT: int = 60 * 60 * 24 * 7  # 7 days
+    GAME_ENGINE_EVENT_LOG_SIZE: int = 256  # last events per game, replayed to resumed streams
+    GAME_ENGINE_SUBSCRIBER_QUEUE_SIZE: int = 64  # pending events per stream, then a snapshot
+    GAME_ENGINE_SLOW_SUBSCRIBER_TIMEOUT: float = 30.0  # seconds behind before a stream is closed
+
+    # used by the offline `fake:<mode>` models, see fake_chat_model
+    FAKE_LLM_LATENCY_MEDIAN: float = 0.5  # seconds
+    FAKE_LLM_LATENCY_SIGMA: float = 0.5  # log-normal shape, 0 for a constant latency
+    FAKE_LLM_SEED: int = 0
+
+    LLM_RECORD_TRANSCRIPTS: bool = False  # append every LLM call to LLM_TRANSCRIPT_PATH
+    LLM_TRANSCRIPT_PATH: str = 'transcripts/llm.jsonl'  # also what `fake:replay` serves
+    LLM_REPLAY_RECORDED_LATENCY: bool = False
+
+    POLICY_BOOK_DIR: str = 'policy_books'
+
+    LOG_LEVEL: str = 'INFO'
+    LOG_DIR: str = 'logs'
+    LOG_ASYNC: bool = True  # write log files on a background thread
+    LOG_JSON: bool = False  # one JSON object per line instead of text
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0  # fraction of DEBUG records kept
+
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_PATH: str | None = 'cache/responses.sqlite3'  # None keeps it in memory
+    RESPONSE_CACHE_MEMORY_ENTRIES: int = 1024
+    RESPONSE_CACHE_MAX_ENTRIES: int = 100_000
+    RESPONSE_CACHE_TTL: int = 60 * 60 * 24 * 7  # 7 days
 
     FASTAPI_HOST: str = '0.0.0.0'
     FASTAPI_PORT: int = 5013
     FASTAPI_RELOAD: bool = False
     FASTAPI_ROOT_PATH: str = '/'
+    RATE_LIMIT_ENABLED: bool = True  # disable for load tests
+    METRICS_TOKEN: str = ''  # bearer token of /metrics scrapers, empty disables the endpoint
 
 
 class ConfigProvider:
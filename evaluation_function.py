@@ -1,3 +1,6 @@
+from feedback_table import CODE_INDEX, FULL_FEEDBACKS, FeedbackTableProvider
+
+
 def validate_input(s: str) -> None:
     if len(s) != 4:
         raise ValueError("Input must be a string of length 4")
@@ -5,32 +8,26 @@ def validate_input(s: str) -> None:
     if len(set(s)) != 4:
         raise ValueError("Input must contain 4 unique digits")
 
-    if not s.isdigit():
+    if not (s.isascii() and s.isdigit()):
         raise ValueError("Input must contain only digits")
 
 
 def evaluate_guess(guess: str, secret: str) -> tuple[int, int]:
     """
     Evaluate a guess against a secret code.
+    Returns a tuple of (correct_positions, correct_numbers).
     """
 
     validate_input(guess)
     validate_input(secret)
 
-    correct_positions = 0
-    correct_numbers = 0
-
-    for i in range(len(guess)):
-        if guess[i] == secret[i]:
-            correct_positions += 1
-        elif guess[i] in secret:
-            correct_numbers += 1
-
-    return correct_positions, correct_numbers
+    table = FeedbackTableProvider.get_table()
+    return FULL_FEEDBACKS[table.full[CODE_INDEX[guess], CODE_INDEX[secret]]]
 
 
 def evaluate_guess_simplified(guess: str, secret: str) -> int:
     validate_input(guess)
     validate_input(secret)
 
-    return len(set(guess) & set(secret))
+    table = FeedbackTableProvider.get_table()
+    return int(table.simplified[CODE_INDEX[guess], CODE_INDEX[secret]])
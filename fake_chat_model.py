@@ -0,0 +1,200 @@
+"""
+Offline stand-in for the OpenAI chat models.
+
+Set `BASE_MODEL` (or any model name a guesser is given) to `fake:<mode>` and
+`LLMClientProvider` returns a `FakeChatModel` instead of a network client. The model
+answers the structured output tool `create_agent` binds for the guesser's response format
+(`GuessResponse`, `GuesserV2Response`, `GuesserV3Response`, `CompactGuesserV3Response`),
+after a latency drawn from a seeded log-normal distribution, and reports estimated
+token usage. Modes:
+
+- `fake:solver`: plays the game locally, the GuesserV3 formats with the rule engine
+  and the others with the candidate solver.
+- `fake:replay`: serves the outputs recorded in `LLM_TRANSCRIPT_PATH` (see `transcripts`)
+  with their recorded token usage, and fails on prompts that were never recorded.
+  The recorded latencies are replayed with `LLM_REPLAY_RECORDED_LATENCY`.
+"""
+import ast
+import asyncio
+import json
+import re
+import time
+import uuid
+from random import Random
+from typing import Any, Callable, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from chains.guesser_solver import CandidateSolver
+from chains.guesser_v3_rules import respond
+from config import Config, ConfigProvider
+from models.guesser_v3 import CompactGuesserV3Response, CompactState, State
+from transcripts import Transcript, message_text
+
+FAKE_PREFIX = "fake:"
+MODES = ("solver", "replay")
+
+V3_ROUND = re.compile(r"Current round: (\d+)")
+V3_STATE = re.compile(r"Current state: (.*)")
+V3_PREVIOUS_GUESS = re.compile(r"Your previous guess: (\d{4})")
+V3_FEEDBACK = re.compile(r"Feedback received: \d{4} has (\d) correct digits")
+V1_FEEDBACK = re.compile(r"Number (\d{4}) has\s+(\d) correct digits")
+V2_HISTORY = re.compile(r"History: (\[.*\])")
+
+
+def is_fake_model(model: str) -> bool:
+    return model.startswith(FAKE_PREFIX)
+
+
+def v3_turn(messages: Sequence[BaseMessage]) -> tuple[State, str | None, int | None]:
+    """State, previous guess and feedback of a GuesserV3 message prompt."""
+    text = next(
+        message_text(message) for message in messages
+        if isinstance(message, HumanMessage) and V3_ROUND.search(message_text(message)))
+    state_match = V3_STATE.search(text)
+    assert state_match is not None
+    encoded_state = state_match.group(1).strip()
+    if encoded_state.startswith("{'"):
+        state = State.model_validate(ast.literal_eval(encoded_state))
+    else:
+        state = CompactState.model_validate_json(encoded_state).apply(State())
+    previous_guess = V3_PREVIOUS_GUESS.search(text)
+    feedback = V3_FEEDBACK.search(text)
+    return (state, previous_guess.group(1) if previous_guess else None,
+            int(feedback.group(1)) if feedback else None)
+
+
+def solve_v3(messages: Sequence[BaseMessage]) -> dict:
+    state, previous_guess, feedback = v3_turn(messages)
+    return respond(state, previous_guess, feedback).model_dump(mode="json")
+
+
+def solve_v3_compact(messages: Sequence[BaseMessage]) -> dict:
+    state, previous_guess, feedback = v3_turn(messages)
+    response = respond(state, previous_guess, feedback)
+    return CompactGuesserV3Response(
+        state_update=CompactState.diff(state, response.updated_state), guess=response.guess,
+        reasoning=response.reasoning,
+        comments=response.comments).model_dump(mode="json", exclude_none=True)
+
+
+def solve_v1(messages: Sequence[BaseMessage]) -> dict:
+    solver = CandidateSolver(simplified=True)
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            for guess, feedback in V1_FEEDBACK.findall(message_text(message)):
+                solver.apply_feedback(guess, (int(feedback), 0))
+    guess = solver.next_guess()
+    return {"guess": guess or "0123", "comments": f"{len(solver.candidates)} codes remain."}
+
+
+def solve_v2(messages: Sequence[BaseMessage]) -> dict:
+    solver = CandidateSolver(simplified=False)
+    for message in messages:
+        history = V2_HISTORY.search(message_text(message))
+        if isinstance(message, HumanMessage) and history is not None:
+            for guess, feedback in ast.literal_eval(history.group(1)):
+                solver.apply_feedback(guess, tuple(feedback))
+    guess = solver.next_guess()
+    return {"analysis": f"{len(solver.candidates)} codes remain.", "guess": guess or "0123"}
+
+
+# response format name -> structured output of the solver mode
+SOLVERS: dict[str, Callable[[Sequence[BaseMessage]], dict]] = {
+    "GuesserV3Response": solve_v3,
+    "CompactGuesserV3Response": solve_v3_compact,
+    "GuessResponse": solve_v1,
+    "GuesserV2Response": solve_v2,
+}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering the structured output tool locally, see the module docstring.
+    Latencies are log-normal with median `latency_median` seconds and shape `latency_sigma`.
+    """
+    mode: str = "solver"
+    latency_median: float = 0.0
+    latency_sigma: float = 0.0
+    seed: int = 0
+    transcript_path: str | None = None
+    replay_latency: bool = False  # sleep the recorded latency instead of a drawn one
+    _random: Random = PrivateAttr()
+
+    def model_post_init(self, context: Any) -> None:
+        self._random = Random(self.seed)
+
+    @classmethod
+    def from_model_name(cls, model: str, config: Config | None = None) -> "FakeChatModel":
+        config = config or ConfigProvider.get_config()
+        mode = model.removeprefix(FAKE_PREFIX)
+        if mode not in MODES:
+            raise ValueError(f"Unknown fake model: {model}, modes: {MODES}")
+        return cls(
+            mode=mode, latency_median=config.FAKE_LLM_LATENCY_MEDIAN,
+            latency_sigma=config.FAKE_LLM_LATENCY_SIGMA, seed=config.FAKE_LLM_SEED,
+            transcript_path=config.LLM_TRANSCRIPT_PATH,
+            replay_latency=config.LLM_REPLAY_RECORDED_LATENCY)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def model_name(self) -> str:
+        return f"{FAKE_PREFIX}{self.mode}"
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Any = None, **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(
+            self, messages: list[BaseMessage], stop: list[str] | None = None,
+            run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        message, latency = self.__answer(messages, kwargs.get("tools", []))
+        time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+            self, messages: list[BaseMessage], stop: list[str] | None = None,
+            run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        message, latency = self.__answer(messages, kwargs.get("tools", []))
+        await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def latency(self) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        return self.latency_median * self._random.lognormvariate(0.0, self.latency_sigma)
+
+    def __answer(self, messages: list[BaseMessage], tools: list[dict]) -> tuple[AIMessage, float]:
+        """Structured output tool call answering `messages`, and the latency to simulate."""
+        names = [tool["function"]["name"] for tool in tools]
+        name = next((name for name in names if name in SOLVERS), None)
+        if name is None:
+            raise ValueError(f"{self.model_name} cannot answer the tools {names}")
+        latency = self.latency()
+        if self.mode == "replay":
+            if self.transcript_path is None:
+                raise ValueError(f"{self.model_name} needs a transcript path")
+            entry = Transcript.get_transcript(self.transcript_path).replay(messages)
+            assert entry.output is not None
+            args, usage = entry.output, entry.usage
+            if self.replay_latency:
+                latency = entry.latency
+        else:
+            args, usage = SOLVERS[name](messages), None
+        if usage is None:
+            # estimated at 4 characters per token
+            input_tokens = sum(len(message_text(message)) for message in messages) // 4
+            output_tokens = len(json.dumps(args)) // 4
+            usage = {
+                "input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+        message = AIMessage(
+            content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex}"}],
+            usage_metadata=usage)
+        return message, latency
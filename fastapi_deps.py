@@ -16,7 +16,7 @@ def validate_code(code: str):
     if len(set(code)) != 4:
         raise HTTPException(
             status_code=400, detail=f"Invalid code: {code}. Code must contain 4 unique digits.")
-    if not code.isdigit():
+    if not (code.isascii() and code.isdigit()):
         raise HTTPException(
             status_code=400, detail=f"Invalid code: {code}. Code must contain only digits")
 
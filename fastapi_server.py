@@ -1,16 +1,26 @@
 import asyncio
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager
+from secrets import compare_digest
+from typing import Annotated
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware import Middleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from agent_protocol import IAsyncGuesser
 from chains.guesser_v1 import AsyncGuesserV1
 from chains.guesser_v3 import AsyncGuesserV3
 from config import ConfigProvider
+from feedback_table import FeedbackTableProvider
+from llm_client_provider import LLMClientProvider
+from logger_provider import LoggerProvider, LogSettings
+from metrics import (
+    GAMES_ACTIVE, GUESSER_TASKS, LLM_IN_FLIGHT, RATE_LIMIT_REJECTIONS, SSE_QUEUE_DEPTH,
+    SSE_QUEUE_DEPTH_MAX, SSE_SUBSCRIBERS, STAGE_SECONDS, MetricsRegistry,
+    RequestMetricsMiddleware)
+from policy_book import PolicyBookProvider
 from api import API
 from fastapi_deps import ApiType, validate_code
-from fastapi import Request
+from fastapi import Header, Request
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -19,23 +29,47 @@ import uvicorn
 from game_engine import GameState, GameStatus, Player
 
 config = ConfigProvider.get_config()
-limiter = Limiter(key_func=get_remote_address)
+LoggerProvider.configure(LogSettings.from_config(config))
+limiter = Limiter(key_func=get_remote_address, enabled=config.RATE_LIMIT_ENABLED)
+metrics = MetricsRegistry.get_registry()
+# strong references to the running guesser tasks, the event loop only keeps weak ones
+guesser_tasks: set[asyncio.Task] = set()
 
 
 def rate_limit_exceeded_handler(request: Request, exc: Exception):
     assert isinstance(exc, RateLimitExceeded)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.increment(RATE_LIMIT_REJECTIONS, route=route)
     return JSONResponse(status_code=429, content={"detail": exc.detail})
 
 
+def register_gauges(api: API) -> None:
+    queues = api.game_engine.queue_manager.queues
+    metrics.gauge(GAMES_ACTIVE, lambda: len(api.game_engine.games))
+    # totals only, game ids would let anyone reading the metrics play in the games
+    metrics.gauge(SSE_SUBSCRIBERS, lambda: sum(len(game_queues) for game_queues in queues.values()))
+    metrics.gauge(SSE_QUEUE_DEPTH, lambda: sum(
+        queue.qsize() for game_queues in queues.values() for queue in game_queues))
+    metrics.gauge(SSE_QUEUE_DEPTH_MAX, lambda: max(
+        (queue.qsize() for game_queues in queues.values() for queue in game_queues), default=0))
+    metrics.gauge(GUESSER_TASKS, lambda: len(guesser_tasks))
+    metrics.gauge(LLM_IN_FLIGHT, lambda: LLMClientProvider.get_provider().in_flight)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     api = API()
+    # build the feedback tables before the first guess is evaluated
+    FeedbackTableProvider.get_table()
+    PolicyBookProvider.get_book(simplified=True)
+    register_gauges(api)
     app.state.limiter = limiter
     app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
     yield {'core_api': api}
 
 
 middleware = [
+    Middleware(RequestMetricsMiddleware),
     Middleware(
         CORSMiddleware,
         allow_methods=["*"],
@@ -47,11 +81,12 @@ middleware = [
 app = FastAPI(middleware=middleware, lifespan=lifespan)
 
 
-async def get_game_updates_stream(api: ApiType, game_id: str):
-    ge = api.game_engine
-    yield f"data: {ge.games[game_id].model_dump_json()}\n\n"
-    async for state in ge.listen_for_updates(game_id):
-        yield f"data: {state.model_dump_json()}\n\n"
+async def get_game_updates_stream(api: ApiType, game_id: str, last_event_id: int | None = None):
+    # the events are encoded once by the engine, whatever the number of subscribers, and
+    # closing the events on disconnect unsubscribes the stream
+    async with aclosing(api.game_engine.listen_for_events(game_id, last_event_id)) as events:
+        async for event in events:
+            yield event.data
 
 
 async def start_guesser_task(
@@ -59,21 +94,37 @@ async def start_guesser_task(
     ge = api.game_engine
     max_attempts = config.GUESSER_MAX_ATTEMPTS
     game_state = ge.games[game_id]
-    for attempt in range(max_attempts):
-        if game_state.status == GameStatus.COMPLETED:
-            break
-        guess = await guesser.guess()
-        if guess is None:
-            break
-
-        if as_player == Player.PLAYER_1:
-            secret_code = game_state.player_1_secret_code
-        else:
-            secret_code = game_state.player_2_secret_code
-
-        await ge.make_guess(game_id, guess.guess, as_player, comments=guess.comments)
-        feedback = await ge.evaluate_guess(guess.guess, secret_code)
-        await guesser.provide_feedback((feedback, 0))
+    turn_seconds = metrics.histogram(
+        STAGE_SECONDS, stage="turn", guesser=type(guesser).__name__)
+    try:
+        for attempt in range(max_attempts):
+            if game_state.status == GameStatus.COMPLETED:
+                break
+            with turn_seconds.time():
+                guess = await guesser.guess()
+            if guess is None:
+                break
+
+            if as_player == Player.PLAYER_1:
+                secret_code = game_state.player_1_secret_code
+            else:
+                secret_code = game_state.player_2_secret_code
+
+            await ge.make_guess(game_id, guess.guess, as_player, comments=guess.comments)
+            feedback = await ge.evaluate_guess(guess.guess, secret_code)
+            await guesser.provide_feedback((feedback, 0))
+    finally:
+        # requests the guesser started ahead, e.g. speculative turns, are no longer needed
+        aclose = getattr(guesser, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def run_guesser_task(
+        api: ApiType, game_id: str, guesser: IAsyncGuesser, as_player: Player = Player.PLAYER_2):
+    task = asyncio.create_task(start_guesser_task(api, game_id, guesser, as_player))
+    guesser_tasks.add(task)
+    task.add_done_callback(guesser_tasks.discard)
 
 
 @app.post("/start-new-game-player-vs-ai")
@@ -86,8 +137,9 @@ async def start_new_game_player_vs_ai(request: Request, api: ApiType, secret_1:
 
     ge = api.game_engine
     game_state = await ge.create_game(secrets=(secret_1, None))
-    guesser = AsyncGuesserV3()
-    asyncio.create_task(start_guesser_task(api, game_state.game_id, guesser))
+    # the engine scores a guess at once, speculative turns would overlap nothing
+    guesser = AsyncGuesserV3(game_id=game_state.game_id, speculative=False)
+    run_guesser_task(api, game_state.game_id, guesser)
     asyncio.create_task(ge.cleanup_games())
     return game_state
 
@@ -102,10 +154,10 @@ async def start_new_game_ai_vs_ai(request: Request, api: ApiType, secret: str):
 
     ge = api.game_engine
     game_state = await ge.create_game(secrets=(secret, secret))
-    guesser1 = AsyncGuesserV1()
-    guesser2 = AsyncGuesserV3()
-    asyncio.create_task(start_guesser_task(api, game_state.game_id, guesser1, Player.PLAYER_1))
-    asyncio.create_task(start_guesser_task(api, game_state.game_id, guesser2, Player.PLAYER_2))
+    guesser1 = AsyncGuesserV1(game_id=game_state.game_id)
+    guesser2 = AsyncGuesserV3(game_id=game_state.game_id, speculative=False)
+    run_guesser_task(api, game_state.game_id, guesser1, Player.PLAYER_1)
+    run_guesser_task(api, game_state.game_id, guesser2, Player.PLAYER_2)
     asyncio.create_task(ge.cleanup_games())
     return game_state.model_dump()
 
@@ -120,12 +172,32 @@ async def make_guess(api: ApiType, game_id: str, guess: str):
     return {"message": "Guess made successfully"}
 
 
+@app.get("/metrics")
+async def get_metrics(authorization: Annotated[str | None, Header()] = None):
+    """
+    Metrics of this process in the Prometheus text format, for scrapers sending
+    `Authorization: Bearer <METRICS_TOKEN>`. Not served when no token is configured.
+    """
+    if not config.METRICS_TOKEN:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    if not compare_digest(authorization or "", f"Bearer {config.METRICS_TOKEN}"):
+        return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+    return PlainTextResponse(
+        metrics.exposition(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/get-game-updates")
-async def get_game_updates(api: ApiType, game_id: str):
+async def get_game_updates(
+        api: ApiType, game_id: str, last_event_id: Annotated[int | None, Header()] = None):
+    """
+    Server-sent events of the game, see `GameEvent`. A client reconnecting with the
+    `Last-Event-ID` header receives the events it missed instead of a new snapshot.
+    """
     ge = api.game_engine
     if game_id not in ge.games:
         return JSONResponse(status_code=404, content={"detail": "Game not found"})
-    return StreamingResponse(get_game_updates_stream(api, game_id), media_type="text/event-stream")
+    return StreamingResponse(
+        get_game_updates_stream(api, game_id, last_event_id), media_type="text/event-stream")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+"""
+Precomputed feedback tables for every pair of legal codes.
+
+All 5040 legal codes (4 unique digits) are enumerated once and indexed by a code id.
+Two 5040x5040 uint8 tables hold the score of every guess/secret pair:
+- `simplified`: number of shared digits (the simplified game)
+- `full`: index into `FULL_FEEDBACKS` of the (correct_position, correct_number) pair
+
+Rows are guesses, columns are secrets. `SharedFeedbackTable` places both tables in shared
+memory for worker processes.
+"""
+import sys
+from itertools import permutations
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Optional
+
+import numpy as np
+
+CODES: tuple[str, ...] = tuple("".join(p) for p in permutations("0123456789", 4))
+CODE_COUNT = len(CODES)
+CODE_INDEX: dict[str, int] = {code: i for i, code in enumerate(CODES)}
+
+# (correct_position, correct_number) pairs that can occur, (3, 1) is impossible
+FULL_FEEDBACKS: tuple[tuple[int, int], ...] = tuple(
+    (bulls, cows) for bulls in range(5) for cows in range(5 - bulls) if (bulls, cows) != (3, 1))
+FULL_FEEDBACK_INDEX: dict[tuple[int, int], int] = {fb: i for i, fb in enumerate(FULL_FEEDBACKS)}
+FULL_FEEDBACK_COUNT = len(FULL_FEEDBACKS)
+FULL_WIN = FULL_FEEDBACK_INDEX[(4, 0)]
+SIMPLIFIED_FEEDBACK_COUNT = 5
+SIMPLIFIED_WIN = 4
+
+# In the simplified game only the digit set matters, so every set of 4 digits is represented
+# by its sorted code (210 codes instead of 5040).
+SIMPLIFIED_CODE_IDS = np.array(
+    [i for i, code in enumerate(CODES) if list(code) == sorted(code)], dtype=np.intp)
+
+FULL_BULLS = np.array([fb[0] for fb in FULL_FEEDBACKS], dtype=np.uint8)
+FULL_COWS = np.array([fb[1] for fb in FULL_FEEDBACKS], dtype=np.uint8)
+
+_BUILD_CHUNK = 512
+
+CodeRef = int | str
+CodeRefs = Iterable[CodeRef] | np.ndarray | None
+
+
+def code_id(code: CodeRef) -> int:
+    """Return the id of a legal code. Ids are passed through unchanged."""
+    if isinstance(code, (int, np.integer)):
+        return int(code)
+    try:
+        return CODE_INDEX[code]
+    except KeyError:
+        raise ValueError(f"Invalid code: {code}") from None
+
+
+def code_ids(codes: CodeRefs) -> np.ndarray | slice:
+    """Return an array of code ids, or a full slice when `codes` is None."""
+    if codes is None:
+        return slice(None)
+    if isinstance(codes, np.ndarray):
+        return codes
+    return np.fromiter((code_id(code) for code in codes), dtype=np.intp)
+
+
+class FeedbackTable:
+    """
+    Lookup tables for the simplified and full score of every guess/secret pair.
+    Use `FeedbackTableProvider.get_table()` to get the process-wide instance.
+    """
+
+    def __init__(self, simplified: np.ndarray, full: np.ndarray):
+        self.simplified = simplified
+        self.full = full
+
+    @classmethod
+    def build(cls) -> "FeedbackTable":
+        digits = np.array([[int(d) for d in code] for code in CODES], dtype=np.uint8)
+        masks = (np.uint16(1) << digits.astype(np.uint16)).sum(axis=1, dtype=np.uint16)
+        popcount = np.array([bin(i).count("1") for i in range(1 << 10)], dtype=np.uint8)
+        full_lookup = np.full(25, 255, dtype=np.uint8)
+        for i, (bulls, cows) in enumerate(FULL_FEEDBACKS):
+            full_lookup[bulls * 5 + cows] = i
+
+        simplified = np.empty((CODE_COUNT, CODE_COUNT), dtype=np.uint8)
+        full = np.empty((CODE_COUNT, CODE_COUNT), dtype=np.uint8)
+        for start in range(0, CODE_COUNT, _BUILD_CHUNK):
+            stop = min(start + _BUILD_CHUNK, CODE_COUNT)
+            shared = popcount[masks[start:stop, None] & masks[None, :]]
+            bulls = (digits[start:stop, None, :] == digits[None, :, :]).sum(axis=2, dtype=np.uint8)
+            simplified[start:stop] = shared
+            full[start:stop] = full_lookup[bulls * 5 + (shared - bulls)]
+        return cls(simplified, full)
+
+    def score_simplified(self, guess: CodeRef, secrets: CodeRefs = None) -> np.ndarray:
+        """Number of shared digits between `guess` and each secret (all codes by default)."""
+        return self.simplified[code_id(guess), code_ids(secrets)]
+
+    def score_full(self, guess: CodeRef, secrets: CodeRefs = None) -> np.ndarray:
+        """`FULL_FEEDBACKS` indices of `guess` against each secret (all codes by default)."""
+        return self.full[code_id(guess), code_ids(secrets)]
+
+    def score_matrix_simplified(self, guesses: CodeRefs = None,
+                                secrets: CodeRefs = None) -> np.ndarray:
+        """M x N matrix of simplified scores for M guesses against N secrets."""
+        return self.simplified[np.ix_(*self.__axes(guesses, secrets))]
+
+    def score_matrix_full(self, guesses: CodeRefs = None, secrets: CodeRefs = None) -> np.ndarray:
+        """M x N matrix of `FULL_FEEDBACKS` indices for M guesses against N secrets."""
+        return self.full[np.ix_(*self.__axes(guesses, secrets))]
+
+    @staticmethod
+    def decode_full(scores: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Split `FULL_FEEDBACKS` indices into (correct_positions, correct_numbers) arrays."""
+        return FULL_BULLS[scores], FULL_COWS[scores]
+
+    @staticmethod
+    def __axes(guesses: CodeRefs, secrets: CodeRefs) -> tuple[np.ndarray, np.ndarray]:
+        rows = code_ids(guesses)
+        cols = code_ids(secrets)
+        all_ids = np.arange(CODE_COUNT)
+        return (all_ids if isinstance(rows, slice) else rows,
+                all_ids if isinstance(cols, slice) else cols)
+
+
+class SharedFeedbackTable:
+    """
+    Both tables copied into one shared memory block, which worker processes attach to
+    with `SharedFeedbackTable.attach(name)` instead of building or unpickling their own.
+    The creating process owns the block and unlinks it on `close()`.
+    """
+
+    def __init__(self, table: FeedbackTable):
+        size = table.simplified.nbytes + table.full.nbytes
+        self.shm = SharedMemory(create=True, size=size)
+        simplified, full = self.__views(self.shm)
+        simplified[:] = table.simplified
+        full[:] = table.full
+        self.table = FeedbackTable(simplified, full)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def attach(cls, name: str) -> FeedbackTable:
+        """Read-only tables over the block `name`, valid while the owner keeps it open."""
+        if sys.version_info >= (3, 13):
+            shm = SharedMemory(name=name, track=False)
+        else:
+            # before 3.13 attaching registers the block again, which is harmless for the
+            # children of the owner as they share its resource tracker
+            shm = SharedMemory(name=name)
+        simplified, full = cls.__views(shm)
+        simplified.flags.writeable = False
+        full.flags.writeable = False
+        table = FeedbackTable(simplified, full)
+        table.shm = shm  # type: ignore[attr-defined]  # the views need the mapping alive
+        return table
+
+    def close(self) -> None:
+        del self.table
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> "SharedFeedbackTable":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def __views(shm: SharedMemory) -> tuple[np.ndarray, np.ndarray]:
+        shape = (CODE_COUNT, CODE_COUNT)
+        simplified = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        full = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=CODE_COUNT * CODE_COUNT)
+        return simplified, full
+
+
+class FeedbackTableProvider:
+    __table: Optional[FeedbackTable] = None
+
+    @classmethod
+    def get_table(cls) -> FeedbackTable:
+        if cls.__table is None:
+            cls.__table = FeedbackTable.build()
+        return cls.__table
+
+    @classmethod
+    def set_table(cls, table: FeedbackTable) -> None:
+        """Use `table` as the process-wide instance, e.g. one attached to shared memory."""
+        cls.__table = table
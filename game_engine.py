@@ -1,17 +1,31 @@
 from asyncio import Queue
+from collections import deque
+from contextlib import aclosing
+from itertools import islice
 from enum import Enum
+from functools import cache, partial
 from random import sample
 import uuid
 from pydantic import BaseModel
-from typing import Any, AsyncGenerator
-from time import time
+from typing import Any, AsyncGenerator, Callable
+from time import monotonic, time
 from evaluation_function import evaluate_guess_simplified
 
 from config import Config, ConfigProvider
 from logger_provider import LoggerProvider
+from metrics import (
+    SSE_COALESCED_UPDATES, SSE_EVICTED_SUBSCRIBERS, SSE_STREAMS, STAGE_SECONDS,
+    MetricsRegistry)
 
 log = LoggerProvider.get_logger('game_engine')
 
+make_guess_seconds = MetricsRegistry.get_registry().histogram(STAGE_SECONDS, stage="make_guess")
+publish_seconds = MetricsRegistry.get_registry().histogram(STAGE_SECONDS, stage="sse_publish")
+snapshot_streams = MetricsRegistry.get_registry().counter(SSE_STREAMS, start="snapshot")
+resumed_streams = MetricsRegistry.get_registry().counter(SSE_STREAMS, start="resume")
+coalesced_updates = MetricsRegistry.get_registry().counter(SSE_COALESCED_UPDATES)
+evicted_subscribers = MetricsRegistry.get_registry().counter(SSE_EVICTED_SUBSCRIBERS)
+
 
 class Player(str, Enum):
     PLAYER_1 = "player_1"
@@ -44,49 +58,189 @@ class GameState(BaseModel):
     buffer: dict[Player, list[Guess]] = {Player.PLAYER_1: list(), Player.PLAYER_2: list()}
 
 
-class QueueManager:
+class EventType(str, Enum):
+    SNAPSHOT = "snapshot"
+    DELTA = "delta"
+
+
+SECRET_FIELDS = {"player_1_secret_code", "player_2_secret_code"}
+
+
+class GameDelta(BaseModel):
+    """
+    Changes of a game since its previous event: the guesses appended to the history, and
+    the status fields that changed, the only ones set and encoded. The secret codes are
+    revealed by the delta completing the game.
+    """
+    history: list[Guess]
+    status: GameStatus | None = None
+    waiting_for_player: Player | None = None
+    winner: Player | None = None
+    player_1_secret_code: str | None = None
+    player_2_secret_code: str | None = None
+
+
+class GameEvent(BaseModel):
+    """
+    Update of a game, encoded once as a server-sent event and shared by every subscriber.
+
+    A stream starts with a `snapshot` event, the game without its buffers, and without
+    the secret codes until it is completed, followed by
+    `delta` events (`GameDelta`) that clients merge into it: the guesses are appended to
+    the history and the other fields replaced. A slow stream can receive another snapshot
+    in place of the deltas it fell behind on. Ids are consecutive per game, a snapshot
+    carries the id of the last delta it includes.
+    """
+    id: int
+    type: EventType
+    state: GameState  # the whole game after the event, for in-process listeners
+    history_length: int
+    data: bytes  # `id: ...\nevent: ...\ndata: ...\n\n`
+
+    @classmethod
+    def snapshot(cls, event_id: int, state: GameState) -> "GameEvent":
+        exclude = {"buffer"}
+        if state.status != GameStatus.COMPLETED:
+            exclude |= SECRET_FIELDS
+        return cls.encode(
+            event_id, EventType.SNAPSHOT, state, state.model_dump_json(exclude=exclude))
+
+    @classmethod
+    def delta(cls, event_id: int, state: GameState, previous: "GameEvent | None") -> "GameEvent":
+        changes: dict[str, Any] = {
+            "history": state.history[previous.history_length if previous else 0:]}
+        for field in ("status", "waiting_for_player", "winner"):
+            if previous is None or getattr(state, field) != getattr(previous.state, field):
+                changes[field] = getattr(state, field)
+        if changes.get("status") == GameStatus.COMPLETED:
+            changes.update({field: getattr(state, field) for field in SECRET_FIELDS})
+        data = GameDelta(**changes).model_dump_json(exclude_unset=True)
+        return cls.encode(event_id, EventType.DELTA, state, data)
+
+    @classmethod
+    def encode(
+            cls, event_id: int, event_type: EventType, state: GameState,
+            data: str) -> "GameEvent":
+        encoded = f"id: {event_id}\nevent: {event_type.value}\ndata: {data}\n\n".encode()
+        return cls(
+            id=event_id, type=event_type, state=state, history_length=len(state.history),
+            data=encoded)
+
+
+class SubscriberQueue:
+    """
+    Events waiting to be sent on one stream. Past `max_size` pending events, they are
+    coalesced into a snapshot of the latest state. A subscriber still behind `evict_after`
+    seconds after it was first coalesced is evicted: its stream ends, and the client can
+    resume it with Last-Event-ID.
+    """
+
+    def __init__(self, game_id: str, max_size: int, evict_after: float):
+        self.game_id = game_id
+        self.max_size = max_size
+        self.evict_after = evict_after
+        self.events = Queue[GameEvent | None]()  # None once closed
+        self.behind_since: float | None = None
+        self.closed = False
+
+    def qsize(self) -> int:
+        return self.events.qsize()
+
+    def put(self, event: GameEvent, snapshot: Callable[[], GameEvent]) -> None:
+        """Queues `event`, or `snapshot()` in place of it and of every pending event."""
+        if self.closed:
+            return
+        if self.events.qsize() < self.max_size:
+            self.events.put_nowait(event)
+            return
+        now = monotonic()
+        if self.behind_since is None:
+            self.behind_since = now
+        if now - self.behind_since >= self.evict_after:
+            log.warning("Evicting a subscriber of game: %s, behind for %.1fs",
+                        self.game_id, now - self.behind_since)
+            self.close()
+            evicted_subscribers.inc()
+            return
+        pending = self.clear()
+        self.events.put_nowait(snapshot())
+        coalesced_updates.inc(pending + 1)
+
+    async def get(self) -> GameEvent | None:
+        """The next event, None once the queue is closed."""
+        event = await self.events.get()
+        if self.events.empty():
+            self.behind_since = None
+        return event
+
+    def close(self) -> None:
+        """Drops the pending events and ends the stream."""
+        self.clear()
+        self.closed = True
+        self.events.put_nowait(None)
+
+    def clear(self) -> int:
+        pending = self.events.qsize()
+        while not self.events.empty():
+            self.events.get_nowait()
+        return pending
 
-    def __init__(self):
-        self.queues: dict[str, set[Queue[GameState]]] = {}
 
-    def create_queue(self, game_id: str) -> Queue[GameState]:
-        log.info(f"Creating queue for game: {game_id}")
-        queue = Queue[GameState]()
+class QueueManager:
+    """
+    Subscriber queues of every game. A queue is the handle of its subscriber and knows its
+    game, so that it is removed in O(1), on completion as on disconnect.
+    """
+
+    def __init__(self, max_size: int = 64, evict_after: float = 30.0):
+        self.queues: dict[str, set[SubscriberQueue]] = {}
+        self.max_size = max_size
+        self.evict_after = evict_after
+
+    def create_queue(self, game_id: str) -> SubscriberQueue:
+        log.info("Creating queue for game: %s", game_id)
+        queue = SubscriberQueue(game_id, self.max_size, self.evict_after)
         if game_id not in self.queues:
             self.queues[game_id] = set()
         self.queues[game_id].add(queue)
         return queue
 
-    def remove_queue(self, queue: Queue[GameState]) -> None:
-        log.info(f"Removing queue: {queue}")
-        for game_id, queues in self.queues.items():
-            if queue in queues:
-                log.info(f"Removing queue: {queue} from game: {game_id}")
-                queues.discard(queue)
-            if len(queues) == 0:
-                log.info(f"Removing game: {game_id} from queues")
-                self.queues.pop(game_id)
-                break
+    def remove_queue(self, queue: SubscriberQueue) -> None:
+        queues = self.queues.get(queue.game_id)
+        if queues is None or queue not in queues:
+            return
+        log.info("Removing queue from game: %s", queue.game_id)
+        queues.discard(queue)
+        if len(queues) == 0:
+            log.info("Removing game: %s from queues", queue.game_id)
+            del self.queues[queue.game_id]
+
+    def remove_game(self, game_id: str) -> None:
+        for queue in self.queues.pop(game_id, set()):
+            queue.close()
 
 
 class GameEngine:
 
     def __init__(self, config: Config = ConfigProvider.get_config()):
         self.games: dict[str, GameState] = {}
-        self.queue_manager = QueueManager()
+        self.queue_manager = QueueManager(
+            config.GAME_ENGINE_SUBSCRIBER_QUEUE_SIZE, config.GAME_ENGINE_SLOW_SUBSCRIBER_TIMEOUT)
+        # the last events of each game, for the streams resumed with Last-Event-ID
+        self.event_logs: dict[str, deque[GameEvent]] = {}
         self.config = config
 
     async def evaluate_guess(self, guess: str, secret: str) -> int:
-        log.info(f"Evaluating guess: {guess} for secret: {secret}")
+        log.info("Evaluating guess: %s for secret: %s", guess, secret)
         return evaluate_guess_simplified(guess, secret)
 
     async def create_game(self, secrets: tuple[str | None, str | None]) -> GameState:
         game_id = str(uuid.uuid4())
-        log.info(f"Creating game with secrets: {secrets}")
+        log.info("Creating game with secrets: %s", secrets)
         secret_1 = secrets[0] or "".join(str(digit) for digit in sample(range(10), 4))
         secret_2 = secrets[1] or "".join(str(digit) for digit in sample(range(10), 4))
 
-        log.info(f"Game created with secrets: {secret_1} and {secret_2}")
+        log.info("Game created with secrets: %s and %s", secret_1, secret_2)
 
         game_state = GameState(
             game_id=game_id, created_at=time(), status=GameStatus.IN_PROGRESS,
@@ -94,33 +248,83 @@ class GameEngine:
             player_1_secret_code=secret_1, player_2_secret_code=secret_2, history=[])
 
         self.games[game_id] = game_state
-        log.info(f"Game created with id: {game_id}")
+        self.get_event_log(game_id).append(GameEvent.snapshot(0, game_state.model_copy()))
+        log.info("Game created with id: %s", game_id)
         return game_state
 
-    async def listen_for_updates(self, game_id: str) -> AsyncGenerator[GameState, Any]:
+    def get_event_log(self, game_id: str) -> deque[GameEvent]:
+        if game_id not in self.event_logs:
+            self.event_logs[game_id] = deque(maxlen=self.config.GAME_ENGINE_EVENT_LOG_SIZE)
+        return self.event_logs[game_id]
+
+    def missed_events(self, game_id: str, last_event_id: int) -> list[GameEvent] | None:
+        """The events after `last_event_id`, None if the log no longer holds all of them."""
+        event_log = self.event_logs.get(game_id)
+        # the client has every event up to `last_event_id`, the log must hold the next one
+        if not event_log or not event_log[0].id - 1 <= last_event_id <= event_log[-1].id:
+            return None
+        return list(islice(event_log, last_event_id - event_log[0].id + 1, None))
+
+    async def listen_for_events(
+            self, game_id: str,
+            last_event_id: int | None = None) -> AsyncGenerator[GameEvent, Any]:
+        """
+        A snapshot of the game, then its updates until it completes. A stream resumed from
+        `last_event_id` starts with the events missed since, when they are still logged.
+        """
         queue = self.queue_manager.create_queue(game_id)
-        state = self.games[game_id]
-        log.info(f"Listening for updates for game: {game_id}")
-        yield state
-        while state.status != GameStatus.COMPLETED:
-            state = await queue.get()
-            log.info(f"Received update for game: {game_id}")
-            yield state
-        log.info(f"Game completed: {game_id}")
-        self.queue_manager.remove_queue(queue)
+        try:
+            events = None if last_event_id is None else self.missed_events(game_id, last_event_id)
+            if events is None:
+                event_log = self.event_logs.get(game_id)
+                events = [GameEvent.snapshot(
+                    event_log[-1].id if event_log else 0, self.games[game_id].model_copy())]
+                snapshot_streams.inc()
+            else:
+                log.info("Resuming stream of game: %s after event: %s", game_id, last_event_id)
+                resumed_streams.inc()
+            event = events[-1] if events else self.event_logs[game_id][-1]
+            log.info("Listening for updates for game: %s", game_id)
+            for replayed in events:
+                yield replayed
+            while event.state.status != GameStatus.COMPLETED:
+                next_event = await queue.get()
+                if next_event is None:
+                    log.info("Subscriber queue closed for game: %s", game_id)
+                    break
+                event = next_event
+                log.debug("Received update for game: %s", game_id)
+                yield event
+            else:
+                log.info("Game completed: %s", game_id)
+        finally:
+            # also when the stream is cancelled, as the client disconnects
+            self.queue_manager.remove_queue(queue)
+
+    async def listen_for_updates(self, game_id: str) -> AsyncGenerator[GameState, Any]:
+        async with aclosing(self.listen_for_events(game_id)) as events:
+            async for event in events:
+                yield event.state
 
     async def publish_update(self, game_id: str, state: GameState) -> None:
-        log.info(f"Publishing update for game: {game_id}")
-        for queue in self.queue_manager.queues.get(game_id, set()):
-            await queue.put(state)
+        log.debug("Publishing update for game: %s", game_id)
+        with publish_seconds.time():
+            event_log = self.get_event_log(game_id)
+            previous = event_log[-1] if event_log else None
+            event = GameEvent.delta(previous.id + 1 if previous else 1, state, previous)
+            event_log.append(event)
+            # encoded at most once, for the subscribers too far behind for deltas
+            snapshot = cache(partial(GameEvent.snapshot, event.id, state))
+            for queue in self.queue_manager.queues.get(game_id, set()):
+                queue.put(event, snapshot)
 
     async def process_guess(self, game_id: str, guess: Guess) -> None:
         game_state = self.games[game_id]
-        log.info(f"Processing guess: {guess} for game: {game_id}")
+        log.info("Processing guess: %s for game: %s", guess, game_id)
         feedback = await self.evaluate_guess(
             guess.code, game_state.player_2_secret_code if game_state.waiting_for_player
             == Player.PLAYER_1 else game_state.player_1_secret_code)
-        log.info(f"Feedback: {feedback}")
+        log.info("Feedback: %s", feedback)
         guess.feedback = feedback
         game_state.history.append(guess)
         game_state.waiting_for_player = (
@@ -131,34 +335,35 @@ class GameEngine:
         await self.publish_update(game_id, game_state.model_copy())
 
     async def process_buffer(self, game_id: str) -> None:
-        log.info('processing buffer for game: {game_id}')
+        log.debug("Processing buffer for game: %s", game_id)
         game_state = self.games[game_id]
 
         if game_state.waiting_for_player is None:
-            log.error(f"Game is not in progress: {game_id}")
+            log.error("Game is not in progress: %s", game_id)
             raise ValueError("Game is not in progress")
 
         player_buffer = game_state.buffer[game_state.waiting_for_player]
-        log.info(f"Player buffer: {player_buffer}")
+        log.debug("Player buffer: %s", player_buffer)
 
         while len(player_buffer) > 0:
             guess = player_buffer.pop(0)
-            log.info(f"Processing guess: {guess}")
             await self.process_guess(game_id, guess)
             player_buffer = game_state.buffer[game_state.waiting_for_player]
-            log.info(f"Player buffer: {player_buffer}")
+            log.debug("Player buffer: %s", player_buffer)
 
     async def make_guess(
             self, game_id: str, guess: str, player: Player, comments: str | None = None) -> None:
-        log.info(f"Making guess: {guess} for player: {player} for game: {game_id}")
-        game_state = self.games[game_id]
-
-        game_state.buffer[player].append(
-            Guess(code=guess, feedback=0, comments=comments, player=player))
-        await self.process_buffer(game_id)
+        log.info("Making guess: %s for player: %s for game: %s", guess, player, game_id)
+        with make_guess_seconds.time():
+            game_state = self.games[game_id]
+            game_state.buffer[player].append(
+                Guess(code=guess, feedback=0, comments=comments, player=player))
+            await self.process_buffer(game_id)
 
     async def cleanup_games(self) -> None:
-        for game_id, game_state in self.games.items():
+        for game_id, game_state in list(self.games.items()):
             if game_state.created_at + self.config.GAME_ENGINE_GAME_TIMEOUT < time():
-                log.info(f"Cleaning up game: {game_id}")
+                log.info("Cleaning up game: %s", game_id)
                 self.games.pop(game_id)
+                self.event_logs.pop(game_id, None)
+                self.queue_manager.remove_game(game_id)
@@ -0,0 +1,129 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from weakref import WeakValueDictionary
+
+import httpx
+from langchain.chat_models import init_chat_model
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from pydantic import BaseModel
+
+from config import Config, ConfigProvider
+from fake_chat_model import FakeChatModel, is_fake_model
+from logger_provider import LoggerProvider
+from metrics import LLMMetricsRecorder
+from transcripts import get_recorder
+
+log = LoggerProvider.get_logger('llm_client_provider')
+
+
+class TokenUsage(BaseModel):
+    """Tokens reported by the provider for one or more LLM calls."""
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add_response(self, response: dict) -> None:
+        """Count one agent invocation, summing the usage of the AI messages it produced."""
+        self.calls += 1
+        for message in response.get("messages", []):
+            usage = getattr(message, "usage_metadata", None)
+            if usage:
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+    def add(self, other: "TokenUsage") -> None:
+        self.calls += other.calls
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+
+
+class LLMClientProvider:
+    """
+    Owns the chat models used by all guessers.
+
+    Each model gets one keep-alive HTTP connection pool shared by every game, and
+    `limit()` caps the number of LLM requests in flight process-wide and per game.
+    """
+    __provider: Optional["LLMClientProvider"] = None
+
+    def __init__(self, config: Config | None = None):
+        self.config = config or ConfigProvider.get_config()
+        self.in_flight = 0
+        self.__models: dict[str, BaseChatModel] = {}
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__global_semaphore: asyncio.Semaphore | None = None
+        # a semaphore nobody holds or waits on is at full capacity, so it can be dropped
+        self.__game_semaphores: WeakValueDictionary[str, asyncio.Semaphore] = \
+            WeakValueDictionary()
+
+    @classmethod
+    def get_provider(cls) -> "LLMClientProvider":
+        if cls.__provider is None:
+            cls.__provider = cls()
+        return cls.__provider
+
+    def get_chat_model(self, model: str) -> BaseChatModel:
+        if model in self.__models:
+            return self.__models[model]
+        callbacks: list[BaseCallbackHandler] = [LLMMetricsRecorder(model)]
+        if self.config.LLM_RECORD_TRANSCRIPTS:
+            recorder = get_recorder(self.config.LLM_TRANSCRIPT_PATH, model)
+            if recorder is not None:
+                callbacks.append(recorder)
+        if is_fake_model(model):
+            log.info("Creating offline chat model: %s", model)
+            self.__models[model] = FakeChatModel.from_model_name(model, self.config)
+            self.__models[model].callbacks = callbacks
+        else:
+            log.info("Creating chat model with pooled connections: %s", model)
+            limits = httpx.Limits(
+                max_connections=self.config.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=self.config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=self.config.LLM_KEEPALIVE_EXPIRY)
+            timeout = httpx.Timeout(self.config.LLM_REQUEST_TIMEOUT)
+            self.__models[model] = init_chat_model(
+                model,
+                http_client=httpx.Client(limits=limits, timeout=timeout),
+                http_async_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+                callbacks=callbacks)
+        return self.__models[model]
+
+    @asynccontextmanager
+    async def limit(self, game_id: str | None = None) -> AsyncIterator[None]:
+        """Hold a slot of the global and (if given) the per-game request limit."""
+        self.__bind_loop()
+        assert self.__global_semaphore is not None
+        game_semaphore = self.__game_semaphore(game_id) if game_id is not None else None
+        if game_semaphore is not None:
+            await game_semaphore.acquire()
+        try:
+            async with self.__global_semaphore:
+                self.in_flight += 1
+                try:
+                    yield
+                finally:
+                    self.in_flight -= 1
+        finally:
+            if game_semaphore is not None:
+                game_semaphore.release()
+
+    def __game_semaphore(self, game_id: str) -> asyncio.Semaphore:
+        semaphore = self.__game_semaphores.get(game_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.config.LLM_MAX_CONCURRENT_REQUESTS_PER_GAME)
+            self.__game_semaphores[game_id] = semaphore
+        return semaphore
+
+    def __bind_loop(self) -> None:
+        # semaphores belong to the event loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self.__loop is not loop:
+            self.__loop = loop
+            self.__global_semaphore = asyncio.Semaphore(self.config.LLM_MAX_CONCURRENT_REQUESTS)
+            self.__game_semaphores = WeakValueDictionary()
@@ -1,21 +1,172 @@
+"""
+Loggers writing to `logs/<name>.log`.
+
+By default records are handed to a queue and written by a background thread
+(`QueueListener`), so the event loop never waits on the disk. Messages use lazy %-style
+arguments (`log.info("Guess: %s", guess)`): disabled levels cost a level check, and
+enabled records are interpolated on the calling thread (so later mutations of the
+arguments cannot leak into the log) and timestamped, formatted and written on the writer
+thread. DEBUG records can be sampled, keeping one in every `1 / debug_sample_rate`.
+
+The defaults apply until `LoggerProvider.configure(LogSettings.from_config(config))`
+reconfigures every logger, from `LOG_LEVEL`, `LOG_ASYNC`, `LOG_JSON`...
+"""
+import atexit
+import json
 import logging
-from pathlib import Path
+import os
 from logging import Logger
-from typing import Dict
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from queue import SimpleQueue
+from typing import TYPE_CHECKING, Dict, Optional
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from config import Config
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class LogSettings(BaseModel):
+    level: str = "INFO"
+    directory: str = "logs"
+    asynchronous: bool = True  # write on a background thread
+    json_format: bool = False  # one JSON object per line instead of text
+    debug_sample_rate: float = 1.0  # fraction of DEBUG records kept
+
+    @classmethod
+    def from_config(cls, config: "Config") -> "LogSettings":
+        return cls(
+            level=config.LOG_LEVEL, directory=config.LOG_DIR, asynchronous=config.LOG_ASYNC,
+            json_format=config.LOG_JSON, debug_sample_rate=config.LOG_DEBUG_SAMPLE_RATE)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record), "level": record.levelname,
+            "logger": record.name, "message": record.getMessage()}
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Keeps every record above DEBUG and one in every `1 / rate` DEBUG records."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = round(1 / rate) if rate > 0 else 0
+        self.seen = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.every == 0:
+            return False
+        self.seen += 1
+        return self.seen % self.every == 1 % self.every
+
+
+class FileRouter(logging.Handler):
+    """Writes each record to the file of its logger, `<directory>/<name>.log`."""
+
+    def __init__(self, directory: str, formatter: logging.Formatter):
+        super().__init__()
+        self.directory = Path(directory)
+        self.setFormatter(formatter)
+        self.files: dict[str, logging.FileHandler] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        handler = self.files.get(record.name)
+        if handler is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            handler = logging.FileHandler(self.directory / f"{record.name}.log")
+            handler.setFormatter(self.formatter)
+            self.files[record.name] = handler
+        handler.emit(record)
+
+    def flush(self) -> None:
+        for handler in self.files.values():
+            handler.flush()
+
+    def close(self) -> None:
+        for handler in self.files.values():
+            handler.close()
+        super().close()
 
 
 class LoggerProvider:
     __loggers: Dict[str, Logger] = {}
+    __settings = LogSettings()
+    __handler: Optional[logging.Handler] = None  # attached to every logger
+    __writer: Optional[FileRouter] = None
+    __listener: Optional[QueueListener] = None
 
     @classmethod
     def get_logger(cls, name: str) -> Logger:
         if name not in cls.__loggers:
-            cls.__loggers[name] = logging.getLogger(name)
-            cls.__loggers[name].setLevel(logging.INFO)
-            log_dir = Path("logs")
-            log_dir.mkdir(parents=True, exist_ok=True)
-            handler = logging.FileHandler(log_dir / f"{name}.log")
-            handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-            cls.__loggers[name].addHandler(handler)
-
+            logger = logging.getLogger(name)
+            cls.__install(logger)
+            cls.__loggers[name] = logger
         return cls.__loggers[name]
+
+    @classmethod
+    def configure(cls, settings: LogSettings) -> None:
+        """Apply `settings` to every logger, after writing what is still queued."""
+        cls.shutdown()
+        cls.__settings = settings
+        cls.__reinstall()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Write the queued records and close the log files."""
+        if cls.__listener is not None:
+            cls.__listener.stop()
+        if cls.__writer is not None:
+            cls.__writer.close()
+        cls.__listener = cls.__writer = cls.__handler = None
+
+    @classmethod
+    def __reinstall(cls) -> None:
+        for logger in cls.__loggers.values():
+            cls.__install(logger)
+
+    @classmethod
+    def after_fork(cls) -> None:
+        """The writer thread does not survive a fork, the child starts its own."""
+        cls.__listener = cls.__writer = cls.__handler = None
+        cls.__reinstall()
+
+    @classmethod
+    def __install(cls, logger: Logger) -> None:
+        settings = cls.__settings
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        for log_filter in list(logger.filters):
+            logger.removeFilter(log_filter)
+        logger.setLevel(settings.level.upper())
+        if settings.debug_sample_rate < 1:
+            logger.addFilter(DebugSampler(settings.debug_sample_rate))
+        logger.addHandler(cls.__get_handler())
+
+    @classmethod
+    def __get_handler(cls) -> logging.Handler:
+        if cls.__handler is None:
+            settings = cls.__settings
+            formatter = JsonFormatter() if settings.json_format else logging.Formatter(TEXT_FORMAT)
+            cls.__writer = FileRouter(settings.directory, formatter)
+            if settings.asynchronous:
+                queue: SimpleQueue = SimpleQueue()
+                cls.__listener = QueueListener(queue, cls.__writer)
+                cls.__listener.start()
+                cls.__handler = QueueHandler(queue)
+            else:
+                cls.__handler = cls.__writer
+        return cls.__handler
+
+
+atexit.register(LoggerProvider.shutdown)
+os.register_at_fork(after_in_child=LoggerProvider.after_fork)
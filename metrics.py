@@ -0,0 +1,345 @@
+"""
+In-process latency and token metrics.
+
+`MetricsRegistry.get_registry()` holds histograms and counters identified by a name and
+labels. Code paths get their histogram once and time themselves with it:
+
+    make_guess_seconds = MetricsRegistry.get_registry().histogram(
+        STAGE_SECONDS, stage="make_guess")
+    with make_guess_seconds.time():
+        ...
+
+or decorate a function with `@timed(STAGE_SECONDS, stage=...)`. The stages of a turn are
+recorded in `STAGE_SECONDS` (stages overlap: `make_guess` includes `sse_publish`), every
+chat model call in `LLM_CALL_SECONDS` and its token usage, as reported by the provider in
+the response metadata, in `LLM_TOKENS`. Gauges are functions read on collection, so
+keeping them up to date costs nothing. `snapshot()` returns everything in-process and
+`exposition()` in the Prometheus text format the server serves on `/metrics`, to scrapers
+holding `METRICS_TOKEN`.
+"""
+import asyncio
+import functools
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Callable, Optional, TypeVar
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import LLMResult
+
+FunctionT = TypeVar("FunctionT", bound=Callable[..., Any])
+
+STAGE_SECONDS = "stage_seconds"  # label stage: prompt, parse, turn, make_guess, sse_publish
+LLM_CALL_SECONDS = "llm_call_seconds"  # label model
+LLM_TOKENS = "llm_tokens"  # counter, labels model and type (input or output)
+LLM_CALLS = "llm_calls"  # counter, label model
+HTTP_REQUEST_SECONDS = "http_request_seconds"  # labels method and route
+RATE_LIMIT_REJECTIONS = "rate_limit_rejections"  # counter, label route
+SSE_STREAMS = "sse_streams"  # counter, label start: snapshot or resume
+SSE_COALESCED_UPDATES = "sse_coalesced_updates"  # counter
+SSE_EVICTED_SUBSCRIBERS = "sse_evicted_subscribers"  # counter
+GAMES_ACTIVE = "games_active"  # gauges of the server, read on collection
+SSE_SUBSCRIBERS = "sse_subscribers"
+SSE_QUEUE_DEPTH = "sse_queue_depth"  # updates waiting in all the queues
+SSE_QUEUE_DEPTH_MAX = "sse_queue_depth_max"  # updates waiting in the longest queue
+GUESSER_TASKS = "guesser_tasks"
+LLM_IN_FLIGHT = "llm_in_flight"
+
+PREFIX = "codebreaker_"
+DESCRIPTIONS = {
+    STAGE_SECONDS: "Seconds spent in each stage of a turn.",
+    LLM_CALL_SECONDS: "Seconds per chat model call.",
+    LLM_TOKENS: "Tokens reported by the chat model provider.",
+    LLM_CALLS: "Chat model calls that returned a response.",
+    HTTP_REQUEST_SECONDS: "Seconds per HTTP request, streams last until the client leaves.",
+    RATE_LIMIT_REJECTIONS: "Requests rejected by the rate limiter.",
+    GAMES_ACTIVE: "Games held by the game engine.",
+    SSE_SUBSCRIBERS: "Update streams open.",
+    SSE_QUEUE_DEPTH: "Updates queued for all the streams.",
+    SSE_QUEUE_DEPTH_MAX: "Updates queued for the stream furthest behind.",
+    SSE_STREAMS: "Update streams opened, with a snapshot or resumed from Last-Event-ID.",
+    SSE_COALESCED_UPDATES: "Updates of slow streams replaced by a snapshot.",
+    SSE_EVICTED_SUBSCRIBERS: "Streams closed for staying behind too long.",
+    GUESSER_TASKS: "Guesser tasks playing a game.",
+    LLM_IN_FLIGHT: "Chat model requests in flight.",
+}
+
+# upper bounds in seconds, from local lookups to slow reasoning models
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, float("inf"))
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def labels_key(labels: dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+class Timer:
+    """Context manager observing its duration in a histogram."""
+    __slots__ = ("histogram", "started_at")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+        self.started_at = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started_at = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(perf_counter() - self.started_at)
+
+
+class Histogram:
+    """Counts of observations per bucket, with their sum."""
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def reset(self) -> None:
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[min(bisect_left(self.buckets, value), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.sum += value
+
+    def time(self) -> Timer:
+        return Timer(self)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile, 0 without observations."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count, "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5), "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)}}
+
+
+class Counter:
+    """Monotonic counter. The event loop thread is its only writer, so it takes no lock."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, value: float = 1) -> None:
+        self.value += value
+
+
+# a gauge is read when metrics are collected, as one value or a value per label set
+GaugeFunction = Callable[[], float | dict[Labels, float]]
+
+
+class MetricsRegistry:
+    """
+    Histograms, counters and gauges by (name, labels).
+    Use `MetricsRegistry.get_registry()` to get the process-wide instance.
+    """
+    __registry: Optional["MetricsRegistry"] = None
+
+    def __init__(self):
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self.counters: dict[tuple[str, Labels], Counter] = {}
+        self.gauges: dict[str, GaugeFunction] = {}
+
+    @classmethod
+    def get_registry(cls) -> "MetricsRegistry":
+        if cls.__registry is None:
+            cls.__registry = cls()
+        return cls.__registry
+
+    def histogram(
+            self, name: str, buckets: tuple[float, ...] = LATENCY_BUCKETS,
+            **labels: str) -> Histogram:
+        key = (name, labels_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        return histogram
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = (name, labels_key(labels))
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = Counter()
+        return counter
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        self.counter(name, **labels).inc(value)
+
+    def gauge(self, name: str, function: GaugeFunction) -> None:
+        """Register (or replace) the function reading gauge `name` on collection."""
+        self.gauges[name] = function
+
+    def collect_gauges(self) -> dict[str, dict[Labels, float]]:
+        gauges = {}
+        for name, function in self.gauges.items():
+            value = function()
+            gauges[name] = value if isinstance(value, dict) else {(): value}
+        return gauges
+
+    def snapshot(self) -> dict[str, list[dict[str, Any]]]:
+        return {
+            "histograms": [
+                {"name": name, "labels": dict(labels), **histogram.snapshot()}
+                for (name, labels), histogram in self.histograms.items()],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": counter.value}
+                for (name, labels), counter in self.counters.items()],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for name, values in self.collect_gauges().items()
+                for labels, value in values.items()]}
+
+    def exposition(self, prefix: str = PREFIX) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        lines: list[str] = []
+        described: set[str] = set()
+
+        def describe(name: str, kind: str) -> None:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {prefix}{name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {prefix}{name} {kind}")
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{prefix}{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{prefix}{name}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{prefix}{name}_count{format_labels(labels)} {histogram.count}")
+        for (name, labels), counter in sorted(self.counters.items()):
+            describe(name, "counter")
+            lines.append(f"{prefix}{name}_total{format_labels(labels)} {counter.value}")
+        for name, values in sorted(self.collect_gauges().items()):
+            describe(name, "gauge")
+            for labels, value in values.items():
+                lines.append(f"{prefix}{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Clear every observation, histograms and counters handed out before stay registered."""
+        for histogram in self.histograms.values():
+            histogram.reset()
+        for counter in self.counters.values():
+            counter.value = 0.0
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+def timed(name: str, **labels: str) -> Callable[[FunctionT], FunctionT]:
+    """Decorator observing the duration of every call of a function or coroutine function."""
+
+    def decorator(function: FunctionT) -> FunctionT:
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with MetricsRegistry.get_registry().histogram(name, **labels).time():
+                    return await function(*args, **kwargs)
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with MetricsRegistry.get_registry().histogram(name, **labels).time():
+                return function(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+class LLMMetricsRecorder(BaseCallbackHandler):
+    """Callback handler of a chat model recording the latency and token usage of its calls."""
+    run_inline = True
+
+    def __init__(self, model: str, registry: MetricsRegistry | None = None):
+        self.model = model
+        registry = registry or MetricsRegistry.get_registry()
+        self.latency = registry.histogram(LLM_CALL_SECONDS, model=model)
+        self.calls = registry.counter(LLM_CALLS, model=model)
+        self.input_tokens = registry.counter(LLM_TOKENS, model=model, type="input")
+        self.output_tokens = registry.counter(LLM_TOKENS, model=model, type="output")
+        self.__started_at: dict[UUID, float] = {}
+
+    def on_chat_model_start(
+            self, serialized: dict[str, Any], messages: list, *, run_id: UUID,
+            **kwargs: Any) -> None:
+        self.__started_at[run_id] = perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started_at = self.__started_at.pop(run_id, None)
+        if started_at is not None:
+            self.latency.observe(perf_counter() - started_at)
+        self.calls.inc()
+        message = getattr(response.generations[0][0], "message", None) \
+            if response.generations and response.generations[0] else None
+        usage = message.usage_metadata if isinstance(message, AIMessage) else None
+        if usage:
+            self.input_tokens.inc(usage["input_tokens"])
+            self.output_tokens.inc(usage["output_tokens"])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.__started_at.pop(run_id, None)
+
+
+class RequestMetricsMiddleware:
+    """
+    Pure ASGI middleware observing the duration of every HTTP request in
+    `HTTP_REQUEST_SECONDS`, by method and route template (not the raw path, which would
+    create a series per game id). Histograms are looked up once per route.
+    """
+
+    def __init__(self, app: Callable, registry: MetricsRegistry | None = None):
+        self.app = app
+        self.registry = registry or MetricsRegistry.get_registry()
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started_at = perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # the router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            key = (scope["method"], route)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = self.registry.histogram(
+                    HTTP_REQUEST_SECONDS, method=scope["method"], route=route)
+            histogram.observe(perf_counter() - started_at)
@@ -1,5 +1,7 @@
 from enum import Enum
-from pydantic import BaseModel, Field
+from typing import Literal
+
+from pydantic import BaseModel, Field, field_validator
 
 
 class GroupStage(str, Enum):
@@ -66,3 +68,122 @@ class GuesserV3Response(BaseModel):
     reasoning: str = Field(description="Reasoning for the guess.")
     comments: str = Field(
         description="Short explanation of the reasoning behind the guess.", max_length=512)
+
+
+class StateFormat(str, Enum):
+    """Wire format of the state exchanged with the model each round."""
+    FULL = "full"  # the whole state in and out, with descriptive keys
+    COMPACT = "compact"  # short keys in, only the changed fields out
+
+
+# GroupState field -> CompactGroupState key
+GROUP_KEYS = {
+    "stage": "s", "digits": "d", "matches": "m", "first_half": "h",
+    "first_half_matches": "hm", "diagonal": "x", "diagonal_matches": "xm",
+    "tiebreaker": "t", "tiebreaker_matches": "tm"}
+# State field -> CompactState key
+STATE_KEYS = {
+    "confirmed": "c", "eliminated": "e", "group_a": "a", "group_b": "b", "group_c": "z",
+    "digits_found": "f"}
+StageCode = Literal["P", "C", "S", "D", "R"]
+STAGE_CODES: dict[GroupStage, StageCode] = {
+    GroupStage.PENDING: "P", GroupStage.COUNTED: "C", GroupStage.SPLIT_TESTED: "S",
+    GroupStage.DIAGONAL_TESTED: "D", GroupStage.RESOLVED: "R"}
+STAGES = {code: stage for stage, code in STAGE_CODES.items()}
+
+
+class CompactGroupState(BaseModel):
+    """GroupState with short keys. A missing (null) key is unset or unchanged."""
+    s: StageCode | None = Field(
+        description="Stage: P pending, C counted, S split tested, D diagonal tested, R resolved.",
+        default=None)
+    d: list[int] | None = Field(description="Digits.", default=None)
+    m: int | None = Field(description="Matches.", default=None)
+    h: list[int] | None = Field(description="First half.", default=None)
+    hm: int | None = Field(description="First half matches.", default=None)
+    x: list[int] | None = Field(description="Diagonal.", default=None)
+    xm: int | None = Field(description="Diagonal matches.", default=None)
+    t: list[int] | None = Field(description="Tiebreaker.", default=None)
+    tm: int | None = Field(description="Tiebreaker matches.", default=None)
+
+    @field_validator("s", mode="before")
+    @classmethod
+    def stage_code(cls, value: object) -> object:
+        """Code of a stage written out in full, e.g. "counted" for C."""
+        if isinstance(value, str):
+            return value.strip().upper()[:1]
+        return value
+
+
+class CompactState(BaseModel):
+    """
+    State with short keys, used both for the full state sent to the model and for the
+    changes it sends back. A missing (null) key is unset or unchanged, so a field is never
+    cleared by an update, which the strategy never needs.
+    """
+    c: list[int] | None = Field(description="Confirmed digits.", default=None)
+    e: list[int] | None = Field(description="Eliminated digits.", default=None)
+    a: CompactGroupState | None = Field(description="Group A.", default=None)
+    b: CompactGroupState | None = Field(description="Group B.", default=None)
+    z: CompactGroupState | None = Field(description="Group C.", default=None)
+    f: int | None = Field(description="Number of digits found.", default=None)
+
+    @classmethod
+    def diff(cls, old: State | None, new: State) -> "CompactState":
+        """Fields of `new` that differ from `old`, everything when `old` is None."""
+        old_values = old.model_dump() if old is not None else {}
+        changes = {}
+        for field, key in STATE_KEYS.items():
+            value = getattr(new, field)
+            if isinstance(value, GroupState):
+                old_group = old_values.get(field, {})
+                group = {}
+                for group_field, group_key in GROUP_KEYS.items():
+                    group_value = getattr(value, group_field)
+                    if group_value != old_group.get(group_field):
+                        group[group_key] = \
+                            STAGE_CODES[group_value] if group_field == "stage" else group_value
+                if group:
+                    changes[key] = group
+            elif value != old_values.get(field):
+                changes[key] = value
+        return cls.model_validate(changes)
+
+    def apply(self, state: State) -> State:
+        """Copy of `state` with the fields set in this update replaced."""
+        state = state.model_copy(deep=True)
+        for field, key in STATE_KEYS.items():
+            value = getattr(self, key)
+            if value is None:
+                continue
+            if isinstance(value, CompactGroupState):
+                group = getattr(state, field)
+                for group_field, group_key in GROUP_KEYS.items():
+                    group_value = getattr(value, group_key)
+                    if group_value is None:
+                        continue
+                    if group_field == "stage":
+                        group_value = STAGES[group_value]
+                    setattr(group, group_field, group_value)
+            else:
+                setattr(state, field, value)
+        return state
+
+    def to_wire(self) -> str:
+        return self.model_dump_json(exclude_none=True)
+
+
+class CompactGuesserV3Response(BaseModel):
+    """Response model for guesser v3 with the compact state format."""
+    state_update: CompactState = Field(
+        description="Only the state fields changed this round, omit unchanged ones.")
+    guess: str = Field(description="Your next guess. ")
+    reasoning: str = Field(description="Reasoning for the guess, one sentence.")
+    comments: str = Field(
+        description="Short explanation of the reasoning behind the guess.", max_length=512)
+
+    def to_response(self, state: State) -> GuesserV3Response:
+        """Full response with the update merged into the previous `state`."""
+        return GuesserV3Response(
+            updated_state=self.state_update.apply(state), guess=self.guess,
+            reasoning=self.reasoning, comments=self.comments)
@@ -0,0 +1,201 @@
+"""
+Offline-compiled decision trees ("policy books") of the candidate-elimination solver.
+
+The whole game tree of `CandidateSolver` is expanded once and serialized to a compact binary
+file, so a guesser can answer every `guess()` with a single array lookup.
+
+File layout (little endian):
+- header: magic, version, simplified flag, strategy, feedback count, node count
+- guesses: uint16[node_count], code id guessed at each node, padded to 4 bytes
+- children: uint32[node_count * feedback_count], child node per feedback value,
+  0 when the game is won or the feedback is impossible (node 0 is the root)
+
+Build with:
+    python policy_book.py [--simplified] [--strategy entropy] [--output path]
+"""
+import argparse
+import mmap
+import os
+import struct
+import tempfile
+from collections import deque
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+import numpy as np
+
+from candidate_set import CandidateSet
+from config import ConfigProvider
+from chains.guesser_solver import CandidateSolver, SolverStrategy
+from feedback_table import CODES, CODE_INDEX, FULL_WIN, SIMPLIFIED_WIN
+from logger_provider import LoggerProvider
+
+log = LoggerProvider.get_logger('policy_book')
+
+MAGIC = b"CBPB"
+VERSION = 1
+HEADER = struct.Struct("<4sHBBHI2x")
+STRATEGY_CODES = {SolverStrategy.MINIMAX: 0, SolverStrategy.ENTROPY: 1}
+DEFAULT_POLICY_BOOK_DIR = "policy_books"
+
+
+def _padding(node_count: int) -> int:
+    """Bytes after the uint16 guesses so that the uint32 children are aligned."""
+    return node_count % 2 * 2
+
+
+def default_path(simplified: bool, directory: str = DEFAULT_POLICY_BOOK_DIR) -> Path:
+    return Path(directory) / ("simplified.cbpb" if simplified else "full.cbpb")
+
+
+class PolicyBook:
+    """
+    Decision tree mapping a feedback history to the next guess.
+    Nodes are addressed by index, node 0 is the opening guess.
+    """
+
+    def __init__(
+            self, simplified: bool, strategy: SolverStrategy, guesses: np.ndarray,
+            children: np.ndarray, buffer: Optional[mmap.mmap] = None):
+        self.simplified = simplified
+        self.strategy = strategy
+        self.guesses = guesses
+        self.children = children
+        self.win_value = SIMPLIFIED_WIN if simplified else FULL_WIN
+        # keeps the mapping alive while the arrays point into it
+        self.__buffer = buffer
+
+    @property
+    def node_count(self) -> int:
+        return len(self.guesses)
+
+    @property
+    def feedback_count(self) -> int:
+        return self.children.shape[1]
+
+    def guess(self, node: int) -> str:
+        return CODES[self.guesses[node]]
+
+    def child(self, node: int, feedback_value: int) -> int | None:
+        """Next node after `feedback_value`, or None if the game is over or off the book."""
+        child = int(self.children[node, feedback_value])
+        return child if child != 0 else None
+
+    @classmethod
+    def build(
+            cls, simplified: bool,
+            strategy: SolverStrategy = SolverStrategy.ENTROPY) -> "PolicyBook":
+        """Expand the full decision tree of `CandidateSolver` breadth first."""
+        strategy = SolverStrategy(strategy)
+        win_value = SIMPLIFIED_WIN if simplified else FULL_WIN
+        solver = CandidateSolver(simplified=simplified, strategy=strategy)
+        masks = solver.candidates.masks
+
+        guesses: list[int] = []
+        children: list[list[int]] = []
+        pending: deque[int] = deque([solver.candidates.bits])
+        while pending:
+            bits = pending.popleft()
+            solver.candidates = CandidateSet(simplified, bits)
+            guess = solver.next_guess()
+            assert guess is not None
+            node_children = [0] * masks.feedback_count
+            for value, mask in enumerate(masks.get(guess)):
+                child_bits = bits & mask
+                if value != win_value and child_bits:
+                    node_children[value] = len(guesses) + len(pending) + 1
+                    pending.append(child_bits)
+            guesses.append(CODE_INDEX[guess])
+            children.append(node_children)
+
+        return cls(
+            simplified, strategy, np.array(guesses, dtype="<u2"),
+            np.array(children, dtype="<u4").reshape(len(guesses), masks.feedback_count))
+
+    def save(self, path: str | Path) -> None:
+        """
+        Write the book to a temporary file renamed into place, so that other processes
+        loading `path` meanwhile never map a partly written book.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with open(fd, "wb") as f:
+                f.write(HEADER.pack(
+                    MAGIC, VERSION, int(self.simplified), STRATEGY_CODES[self.strategy],
+                    self.feedback_count, self.node_count))
+                f.write(self.guesses.astype("<u2").tobytes())
+                f.write(b"\0" * _padding(self.node_count))
+                f.write(self.children.astype("<u4").tobytes())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str | Path) -> "PolicyBook":
+        """Memory-map a policy book file, the arrays are read lazily from the page cache."""
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, simplified, strategy_code, feedback_count, node_count = \
+            HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            buffer.close()
+            raise ValueError(f"Not a policy book (version {VERSION}): {path}")
+        strategies = [s for s, code in STRATEGY_CODES.items() if code == strategy_code]
+        if not strategies:
+            buffer.close()
+            raise ValueError(f"Unknown strategy code {strategy_code} in policy book: {path}")
+        strategy = strategies[0]
+        guesses = np.frombuffer(buffer, dtype="<u2", count=node_count, offset=HEADER.size)
+        children = np.frombuffer(
+            buffer, dtype="<u4", count=node_count * feedback_count,
+            offset=HEADER.size + guesses.nbytes + _padding(node_count))
+        children = children.reshape(node_count, feedback_count)
+        return cls(bool(simplified), strategy, guesses, children, buffer)
+
+
+class PolicyBookProvider:
+    """
+    Process-wide policy books, memory-mapped from `Config.POLICY_BOOK_DIR` on first use.
+    Books missing on disk are built and saved, which takes a few seconds for the full game.
+    """
+    __books: dict[bool, PolicyBook] = {}
+
+    @classmethod
+    def get_book(cls, simplified: bool) -> PolicyBook:
+        if simplified not in cls.__books:
+            cls.__books[simplified] = cls.__load_book(simplified)
+        return cls.__books[simplified]
+
+    @classmethod
+    def __load_book(cls, simplified: bool) -> PolicyBook:
+        path = default_path(simplified, ConfigProvider.get_config().POLICY_BOOK_DIR)
+        if not path.exists():
+            log.warning("Policy book not found: %s, building it", path)
+            PolicyBook.build(simplified).save(path)
+        book = PolicyBook.load(path)
+        log.info("Loaded policy book: %s (%s nodes)", path, book.node_count)
+        return book
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a policy book of the solver.")
+    parser.add_argument("--simplified", action="store_true", help="build for the simplified game")
+    parser.add_argument(
+        "--strategy", choices=[s.value for s in SolverStrategy], default=SolverStrategy.ENTROPY)
+    parser.add_argument("--output", help="output file, defaults to policy_books/<game>.cbpb")
+    args = parser.parse_args()
+
+    t1 = perf_counter()
+    book = PolicyBook.build(args.simplified, SolverStrategy(args.strategy))
+    output = args.output or default_path(args.simplified)
+    book.save(output)
+    print(f"Built {book.node_count} nodes in {perf_counter() - t1:.2f}s -> {output}")
+
+
+if __name__ == "__main__":
+    main()
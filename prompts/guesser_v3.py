@@ -6,6 +6,11 @@ Your previous guess: {previous_guess}
 Feedback received: {feedback}
 """
 
+CORRECTION_PROMPT = """
+Your guess {rejected_guess} was rejected: {rejection_reason}
+Check it against the game rules and your state, then provide a different guess.
+"""
+
 SYSTEM_PROMPT = """
 # Code Breaker Agent - Phase 1: Digit Discovery
 
@@ -143,3 +148,10 @@ INTERPRETATION:
 
 ```
 """
+
+COMPACT_STATE_INSTRUCTIONS = """{schema}
+
+Keys are shortened, their meaning is in the descriptions above.
+Return in `state_update` only the fields that changed this round (inside a group too),
+everything you leave out keeps its current value.
+"""
@@ -0,0 +1,159 @@
+import asyncio
+from collections import deque
+from contextlib import AbstractAsyncContextManager, nullcontext
+from time import perf_counter
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from pydantic import BaseModel
+
+from config import Config, ConfigProvider
+from logger_provider import LoggerProvider
+
+log = LoggerProvider.get_logger('request_policy')
+
+ResultT = TypeVar("ResultT")
+Slot = Callable[[], AbstractAsyncContextManager]
+
+LOCAL = "local"  # turn answered by a local solver after every model failed
+CACHE = "cache"  # turn answered by the response cache
+
+
+class LatencyWindow:
+    """Latencies of the most recent `size` samples."""
+
+    def __init__(self, size: int = 1000):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def add(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict[str, float]:
+        if not self.samples:
+            return {"count": 0}
+        return {
+            "count": len(self.samples), "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95), "p99": self.percentile(0.99)}
+
+
+class PolicyStats(BaseModel):
+    """How often the request policy had to intervene."""
+    calls: int = 0  # attempts started, hedges excluded
+    hedges: int = 0  # duplicate requests fired after the hedge threshold
+    hedge_wins: int = 0  # hedges that answered before the original request
+    deadlines: int = 0  # attempts abandoned at the deadline
+    fallbacks: int = 0  # turns that moved on to the next model of the cascade
+    local: int = 0  # turns answered locally because every model failed
+
+
+class RequestPolicy:
+    """
+    Deadline, hedging and model cascade for LLM requests.
+
+    Every attempt has `LLM_REQUEST_DEADLINE` seconds. When it has not answered once the
+    `LLM_HEDGE_PERCENTILE` latency of recent calls to the same model has passed, a
+    duplicate request is fired and the first answer wins. A guesser tries its own model
+    and then each of `LLM_FALLBACK_MODELS` in order, before answering with a local solver.
+    Use `RequestPolicy.get_policy()` to get the process-wide instance.
+    """
+    __policy: Optional["RequestPolicy"] = None
+
+    def __init__(self, config: Config | None = None):
+        self.config = config or ConfigProvider.get_config()
+        self.deadline = self.config.LLM_REQUEST_DEADLINE
+        self.hedge_percentile = self.config.LLM_HEDGE_PERCENTILE
+        self.hedge_min_samples = self.config.LLM_HEDGE_MIN_SAMPLES
+        self.fallback_models = [
+            model.strip() for model in self.config.LLM_FALLBACK_MODELS.split(",")
+            if model.strip()]
+        self.stats = PolicyStats()
+        self.call_latency: dict[str, LatencyWindow] = {}
+        self.turn_latency: dict[str, LatencyWindow] = {}
+
+    @classmethod
+    def get_policy(cls) -> "RequestPolicy":
+        if cls.__policy is None:
+            cls.__policy = cls()
+        return cls.__policy
+
+    def cascade(self, model: str) -> list[str]:
+        """Models to try in order for a guesser configured with `model`."""
+        return [model] + [fallback for fallback in self.fallback_models if fallback != model]
+
+    def hedge_after(self, model: str) -> float | None:
+        """Seconds after which a call to `model` is hedged, None until enough samples exist."""
+        if self.hedge_percentile is None:
+            return None
+        window = self.call_latency.get(model)
+        if window is None or len(window.samples) < self.hedge_min_samples:
+            return None
+        return window.percentile(self.hedge_percentile)
+
+    async def run(
+            self, model: str, call: Callable[[], Awaitable[ResultT]],
+            slot: Slot = nullcontext) -> ResultT:
+        """
+        Await `call()` within the deadline, hedged with a second `call()` when slow.
+        Every call holds a `slot()`, e.g. of the request limits, and the deadline and hedge
+        timers only start once the first call holds it.
+        Raises TimeoutError when no call answered in time, or the error of the last call.
+        """
+        self.stats.calls += 1
+        async with slot():
+            return await self.__hedged(model, call, slot)
+
+    async def __hedged(
+            self, model: str, call: Callable[[], Awaitable[ResultT]], slot: Slot) -> ResultT:
+        hedge_after = self.hedge_after(model)
+        tasks = [asyncio.create_task(self.__timed(model, call))]
+        try:
+            async with asyncio.timeout(self.deadline):
+                if hedge_after is not None:
+                    done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                    if not done:
+                        log.warning("No answer from %s after %.2fs, hedging", model, hedge_after)
+                        self.stats.hedges += 1
+                        tasks.append(asyncio.create_task(self.__timed(model, call, slot)))
+                pending = set(tasks)
+                while True:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if task is not tasks[0]:
+                                self.stats.hedge_wins += 1
+                            return task.result()
+                    if not pending:
+                        raise done.pop().exception()  # type: ignore[misc]
+        except TimeoutError:
+            self.stats.deadlines += 1
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+            # the calls still running hold the slot until they are cancelled
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def record_turn(self, answered_by: str, latency: float) -> None:
+        """Record the latency of a whole turn answered by a model, the cache or a local solver."""
+        self.turn_latency.setdefault(answered_by, LatencyWindow()).add(latency)
+
+    def record_outcome(self, outcome: str) -> None:
+        """Count a turn outcome, `fallbacks` or `local`."""
+        setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+
+    def latency_report(self) -> dict[str, dict[str, float]]:
+        """p50/p95/p99 turn latency in seconds by what answered the turn."""
+        return {answered_by: window.summary() for answered_by, window in self.turn_latency.items()}
+
+    async def __timed(
+            self, model: str, call: Callable[[], Awaitable[ResultT]],
+            slot: Slot = nullcontext) -> ResultT:
+        async with slot():
+            started_at = perf_counter()
+            result = await call()
+        self.call_latency.setdefault(model, LatencyWindow()).add(perf_counter() - started_at)
+        return result
@@ -0,0 +1,48 @@
+import pytest
+from random import Random
+from agent_protocol import IAsyncGuesser, IGuesser
+from chains.guesser_solver import AsyncGuesserSolver, GuesserSolver, SolverStrategy
+from feedback_table import CODES
+from tests.agent_test_runner import test_agent as run_agent
+from tests.agent_test_runner import test_agent_simplified as run_agent_simplified
+from tests.agent_test_runner import test_agent_simplified_async as run_agent_simplified_async
+
+MAX_ATTEMPTS = 10
+SECRETS = Random(7).sample(CODES, 20)
+
+
+def test_solver_implements_protocols():
+    assert isinstance(GuesserSolver(), IGuesser)
+    assert isinstance(AsyncGuesserSolver(), IAsyncGuesser)
+
+
+@pytest.mark.parametrize("strategy", list(SolverStrategy))
+def test_solver_simplified(strategy: SolverStrategy):
+    for secret in SECRETS:
+        success, attempts = run_agent_simplified(
+            GuesserSolver(simplified=True, strategy=strategy), secret, MAX_ATTEMPTS)
+        assert success
+        assert attempts <= 7
+
+
+@pytest.mark.parametrize("strategy", list(SolverStrategy))
+def test_solver_full_game(strategy: SolverStrategy):
+    for secret in SECRETS:
+        success, attempts = run_agent(
+            GuesserSolver(simplified=False, strategy=strategy), secret, MAX_ATTEMPTS)
+        assert success
+        assert attempts <= 7
+
+
+@pytest.mark.asyncio
+async def test_async_solver_simplified():
+    for secret in SECRETS:
+        success, attempts = await run_agent_simplified_async(
+            AsyncGuesserSolver(), secret, MAX_ATTEMPTS)
+        assert success
+        assert attempts <= 7
+
+
+def test_solver_feedback_before_guess():
+    with pytest.raises(ValueError):
+        GuesserSolver().provide_feedback((1, 0))
@@ -0,0 +1,53 @@
+import pytest
+from chains.guesser_v3_rules import AsyncGuesserV3Rules, GuesserV3Rules, respond
+from feedback_table import CODES, SIMPLIFIED_CODE_IDS
+from models.guesser_v3 import GroupStage, GuesserV3Response, State
+from tests.agent_test_runner import test_agent_simplified as run_agent_simplified
+from tests.agent_test_runner import test_agent_simplified_async as run_agent_simplified_async
+
+MAX_ATTEMPTS = 10
+
+
+def test_guesser_v3_rules_all_digit_sets():
+    for code_id in SIMPLIFIED_CODE_IDS:
+        success, attempts = run_agent_simplified(
+            GuesserV3Rules(), CODES[code_id], max_attempts=MAX_ATTEMPTS)
+        assert success
+        assert attempts <= 9
+
+
+@pytest.mark.asyncio
+async def test_async_guesser_v3_rules():
+    success, _ = await run_agent_simplified_async(
+        AsyncGuesserV3Rules(), "4821", max_attempts=MAX_ATTEMPTS)
+    assert success
+
+
+def test_guesser_v3_rules_state_transitions():
+    response = respond(State(), None, None)
+    assert response.guess == "1234"
+
+    response = respond(response.updated_state, "1234", 3)
+    assert response.guess == "5678"
+    assert response.updated_state.group_a.stage == GroupStage.COUNTED
+    assert response.updated_state.group_a.matches == 3
+
+    # group C is deduced from the first two counts
+    response = respond(response.updated_state, "5678", 1)
+    state = response.updated_state
+    assert state.group_c.matches == 0
+    assert state.group_c.stage == GroupStage.RESOLVED
+    assert sorted(state.eliminated) == [0, 9]
+    assert sorted(response.guess) == sorted("1209")
+
+    # split of group A: (1, 2) contributes both matches
+    response = respond(state, response.guess, 2)
+    state = response.updated_state
+    assert state.group_a.stage == GroupStage.SPLIT_TESTED
+    assert state.group_a.first_half == [1, 2]
+    assert state.group_a.first_half_matches == 2
+    assert state.confirmed == [1, 2]
+    assert state.digits_found == 2
+
+    # the response is the same structured output the LLM has to produce
+    assert GuesserV3Response.model_validate_json(response.model_dump_json()) == response
@@ -0,0 +1,55 @@
+from agent_protocol import GuessResponse
+from candidate_set import CandidateSet, bits_to_ids, ids_to_bits
+from evaluation_function import evaluate_guess, evaluate_guess_simplified
+from feedback_table import CODES
+
+
+def test_bits_round_trip():
+    ids = bits_to_ids(ids_to_bits([0, 7, 5039]))
+    assert ids.tolist() == [0, 7, 5039]
+
+
+def test_full_game_filtering():
+    candidates = CandidateSet()
+    assert len(candidates) == 5040
+
+    candidates.apply("1234", (1, 2))
+    expected = [code for code in CODES if evaluate_guess("1234", code) == (1, 2)]
+    assert list(candidates) == expected
+    assert "1325" in candidates
+    assert "5678" not in candidates
+
+    candidates.apply(GuessResponse(guess="1325"), evaluate_guess("1325", "1352"))
+    assert "1352" in candidates
+    assert len(candidates) < len(expected)
+
+
+def test_simplified_filtering():
+    candidates = CandidateSet(simplified=True)
+    assert len(candidates) == 210
+
+    candidates.apply("1234", (2, 0))
+    assert all(evaluate_guess_simplified("1234", code) == 2 for code in candidates)
+    assert len(candidates) == 6 * 15
+
+
+def test_partition_sizes():
+    candidates = CandidateSet()
+    sizes = candidates.partition_sizes("0123")
+    assert sum(sizes) == len(candidates)
+    assert sizes[-1] == 1  # (4, 0) only for the code itself
+
+    filtered = candidates.filtered("0123", (0, 0))
+    assert len(filtered) == sizes[0]
+    assert len(candidates) == 5040
+    assert filtered.first() == "4567"
+
+
+def test_expected_information():
+    candidates = CandidateSet(simplified=True)
+    candidates.apply("1234", (0, 0))
+    assert len(candidates) == 15
+    # all remaining digits unknown vs. only one of them
+    assert candidates.expected_information("5678") > candidates.expected_information("1235")
+    # a guess without unknown digits cannot tell the candidates apart
+    assert candidates.expected_information("1234") == 0
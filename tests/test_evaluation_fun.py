@@ -1,4 +1,5 @@
-from evaluation_function import evaluate_guess
+import pytest
+from evaluation_function import evaluate_guess, evaluate_guess_simplified
 
 
 def test_evaluate_guess():
@@ -7,3 +8,28 @@ def test_evaluate_guess():
     assert evaluate_guess("1234", "1235") == (3, 0)
     assert evaluate_guess("1234", "1243") == (2, 2)
     assert evaluate_guess("1234", "4321") == (0, 4)
+
+
+def test_evaluate_guess_simplified():
+    assert evaluate_guess_simplified("1234", "1234") == 4
+    assert evaluate_guess_simplified("1234", "5678") == 0
+    assert evaluate_guess_simplified("1234", "4321") == 4
+    assert evaluate_guess_simplified("1234", "1256") == 2
+
+
+def test_evaluate_guess_invalid_input():
+    # non-ASCII digits pass str.isdigit() but are not codes of the game
+    for code in ["123", "1123", "12a4", "١٢٣٤", "²³⁴⁵"]:
+        with pytest.raises(ValueError):
+            evaluate_guess(code, "1234")
+
+
+def test_validate_code_rejects_non_ascii_digits():
+    from fastapi import HTTPException
+    from fastapi_deps import validate_code
+
+    validate_code("1234")
+    for code in ["١٢٣٤", "²³⁴⁵"]:
+        with pytest.raises(HTTPException) as error:
+            validate_code(code)
+        assert error.value.status_code == 400
@@ -0,0 +1,61 @@
+import pytest
+
+from chains.guesser_v1 import AsyncGuesserV1
+from chains.guesser_v2 import GuesserV2
+from chains.guesser_v3 import AsyncGuesserV3
+from chains.response_cache import ResponseCache
+from config import Config
+from fake_chat_model import FakeChatModel
+from llm_client_provider import LLMClientProvider
+from models.guesser_v3 import StateFormat
+from tests.agent_test_runner import test_agent as run_agent
+from tests.agent_test_runner import test_agent_simplified_async as run_agent_simplified_async
+
+FAKE_MODEL = "fake:solver"
+
+
+def instant_provider() -> LLMClientProvider:
+    return LLMClientProvider(Config(OPENAI_API_KEY="test", FAKE_LLM_LATENCY_MEDIAN=0))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("state_format", list(StateFormat))
+async def test_guesser_v3_with_fake_model(state_format):
+    guesser = AsyncGuesserV3(
+        model=FAKE_MODEL, response_cache=ResponseCache(), state_format=state_format,
+        client_provider=instant_provider())
+    success, attempts = await run_agent_simplified_async(guesser, "4821", max_attempts=10)
+    assert success
+    assert attempts <= 9
+    assert guesser.validator.stats.accepted == attempts
+    assert guesser.token_usage.calls == attempts
+    assert guesser.token_usage.output_tokens > 0
+
+
+@pytest.mark.asyncio
+async def test_guesser_v1_with_fake_model():
+    success, _ = await run_agent_simplified_async(
+        AsyncGuesserV1(model=FAKE_MODEL, client_provider=instant_provider()), "0956",
+        max_attempts=10)
+    assert success
+
+
+def test_guesser_v2_with_fake_model():
+    guesser = GuesserV2(model=FAKE_MODEL, client_provider=instant_provider())
+    success, _ = run_agent(guesser, "3719", max_attempts=8)
+    assert success
+
+
+def test_latency_distribution_is_seeded():
+    config = Config(
+        OPENAI_API_KEY="test", FAKE_LLM_LATENCY_MEDIAN=0.5, FAKE_LLM_LATENCY_SIGMA=0.5)
+    first = FakeChatModel.from_model_name(FAKE_MODEL, config)
+    second = FakeChatModel.from_model_name(FAKE_MODEL, config)
+    latencies = [first.latency() for _ in range(200)]
+    assert latencies == [second.latency() for _ in range(200)]
+    assert 0.4 < sorted(latencies)[100] < 0.6
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        FakeChatModel.from_model_name("fake:unknown", Config(OPENAI_API_KEY="test"))
@@ -0,0 +1,57 @@
+from random import Random
+import numpy as np
+from feedback_table import (
+    CODES, CODE_COUNT, CODE_INDEX, FULL_FEEDBACKS, FeedbackTable, FeedbackTableProvider,
+    SharedFeedbackTable)
+
+
+def reference_score(guess: str, secret: str) -> tuple[int, int]:
+    correct_positions = sum(g == s for g, s in zip(guess, secret))
+    shared = len(set(guess) & set(secret))
+    return correct_positions, shared - correct_positions
+
+
+def test_codes_enumeration():
+    assert CODE_COUNT == 5040
+    assert len(set(CODES)) == CODE_COUNT
+    assert all(CODES[CODE_INDEX[code]] == code for code in CODES)
+    assert len(FULL_FEEDBACKS) == 14
+
+
+def test_table_matches_reference():
+    table = FeedbackTableProvider.get_table()
+    rng = Random(42)
+    for _ in range(2000):
+        guess, secret = rng.choice(CODES), rng.choice(CODES)
+        correct_positions, correct_numbers = reference_score(guess, secret)
+        g, s = CODE_INDEX[guess], CODE_INDEX[secret]
+        assert FULL_FEEDBACKS[table.full[g, s]] == (correct_positions, correct_numbers)
+        assert table.simplified[g, s] == correct_positions + correct_numbers
+
+
+def test_vectorized_scoring():
+    table = FeedbackTableProvider.get_table()
+    secrets = ["1234", "4321", "5678", "1243"]
+
+    assert table.score_simplified("1234", secrets).tolist() == [4, 4, 0, 4]
+    bulls, cows = FeedbackTable.decode_full(table.score_full("1234", secrets))
+    assert bulls.tolist() == [4, 0, 0, 2]
+    assert cows.tolist() == [0, 4, 0, 2]
+
+    matrix = table.score_matrix_simplified(["1234", "5678"], secrets)
+    assert matrix.shape == (2, 4)
+    assert matrix[1].tolist() == [0, 0, 4, 0]
+
+    assert table.score_simplified("1234").shape == (CODE_COUNT, )
+    assert np.array_equal(table.score_matrix_full(["1234"])[0], table.score_full("1234"))
+
+
+def test_shared_table_attach():
+    table = FeedbackTableProvider.get_table()
+    with SharedFeedbackTable(table) as shared:
+        attached = SharedFeedbackTable.attach(shared.name)
+        assert np.array_equal(attached.simplified, table.simplified)
+        assert np.array_equal(attached.full, table.full)
+        assert not attached.full.flags.writeable
+        assert attached.score_simplified("0123", ["0123", "4567"]).tolist() == [4, 0]
+        del attached
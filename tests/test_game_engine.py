@@ -1,6 +1,10 @@
+import itertools
+import json
 import pytest
 import asyncio
-from game_engine import GameEngine, GameStatus, Player
+from config import Config
+from game_engine import (
+    EventType, GameEngine, GameStatus, Player, coalesced_updates, evicted_subscribers)
 from chains.guesser_v3 import AsyncGuesserV3
 from logger_provider import LoggerProvider
 
@@ -258,3 +262,152 @@ async def test_multiple_update_listeners():
     # Verify that both listeners have the same history length
     assert len(listener_1_updates[-1].history) == len(listener_2_updates[-1].history), \
         "Both listeners should see the same history length"
+
+
+@pytest.mark.asyncio
+async def test_events_are_encoded_once_for_all_listeners():
+    ge = GameEngine()
+    game_state = await ge.create_game(secrets=("4821", "8135"))
+    game_id = game_state.game_id
+    listeners = [ge.listen_for_events(game_id) for _ in range(3)]
+    snapshots = [await anext(listener) for listener in listeners]
+    assert [snapshot.id for snapshot in snapshots] == [0, 0, 0]
+
+    await ge.make_guess(game_id, "1234", Player.PLAYER_1)
+    await ge.make_guess(game_id, "4821", Player.PLAYER_2)
+    for expected_id in (1, 2):
+        events = [await anext(listener) for listener in listeners]
+        assert all(event is events[0] for event in events)
+        assert events[0].id == expected_id
+        assert events[0].data.startswith(f"id: {expected_id}\nevent: delta\ndata: ".encode())
+    assert events[0].state.status == GameStatus.COMPLETED
+    assert [await anext(listener, None) for listener in listeners] == [None, None, None]
+    assert game_id not in ge.queue_manager.queues
+
+    # a late listener gets a snapshot with the id of the last update
+    assert (await anext(ge.listen_for_events(game_id))).id == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_is_a_snapshot_then_deltas():
+    ge = GameEngine()
+    game_state = await ge.create_game(secrets=("4821", "8135"))
+    game_id = game_state.game_id
+    listener = ge.listen_for_events(game_id)
+    await ge.make_guess(game_id, "1234", Player.PLAYER_1)
+
+    snapshot = json.loads((await anext(listener)).data.decode().split("data: ")[1])
+    assert "buffer" not in snapshot
+    assert "player_1_secret_code" not in snapshot and "player_2_secret_code" not in snapshot
+    assert [guess["code"] for guess in snapshot["history"]] == ["1234"]
+
+    guesses = ["5678", "1235", "9076", "1243", "4821"]
+    for code, player in zip(guesses, itertools.cycle([Player.PLAYER_2, Player.PLAYER_1])):
+        await ge.make_guess(game_id, code, player)
+    sizes = []
+    async for event in listener:
+        sizes.append(len(event.data))
+        lines = event.data.decode().splitlines()
+        assert lines[1] == "event: delta"
+        delta = json.loads(lines[2].removeprefix("data: "))
+        snapshot["history"].extend(delta.pop("history"))
+        snapshot.update(delta)
+
+    assert snapshot == json.loads(ge.games[game_id].model_dump_json(exclude={"buffer"}))
+    assert snapshot["status"] == GameStatus.COMPLETED
+    assert snapshot["winner"] == Player.PLAYER_2
+    # one guess per delta, whatever the length of the history, the last one with the secrets
+    assert max(sizes[:-1]) - min(sizes[:-1]) < 64
+    assert snapshot["player_2_secret_code"] == "8135"
+
+    # the snapshot of a completed game reveals the secrets
+    event = await anext(ge.listen_for_events(game_id))
+    assert json.loads(event.data.decode().split("data: ")[1])["player_1_secret_code"] == "4821"
+
+
+@pytest.mark.asyncio
+async def test_resume_from_last_event_id():
+    ge = GameEngine(Config(OPENAI_API_KEY="fake", GAME_ENGINE_EVENT_LOG_SIZE=4))
+    game_state = await ge.create_game(secrets=("4821", "8135"))
+    game_id = game_state.game_id
+    await ge.make_guess(game_id, "1234", Player.PLAYER_1)
+    await ge.make_guess(game_id, "5678", Player.PLAYER_2)
+
+    listener = ge.listen_for_events(game_id, last_event_id=1)
+    missed = await anext(listener)
+    assert (missed.id, missed.type) == (2, EventType.DELTA)
+    await ge.make_guess(game_id, "1235", Player.PLAYER_1)
+    assert (await anext(listener)).id == 3
+
+    # nothing missed, the stream goes on with the next update
+    listener = ge.listen_for_events(game_id, last_event_id=3)
+    await ge.make_guess(game_id, "4821", Player.PLAYER_2)
+    event = await anext(listener)
+    assert event.id == 4 and event.state.status == GameStatus.COMPLETED
+    assert await anext(listener, None) is None
+
+    # event 0 fell out of the log, a client that has it still misses only 1 to 4
+    assert [event.id for event in ge.missed_events(game_id, 0)] == [1, 2, 3, 4]
+    assert [event.id for event in ge.missed_events(game_id, 1)] == [2, 3, 4]
+    # event 1 is the oldest logged, so a client without event 0 or with an unknown id
+    # gets a snapshot
+    for last_event_id in (-1, 9):
+        event = await anext(ge.listen_for_events(game_id, last_event_id=last_event_id))
+        assert (event.id, event.type) == (4, EventType.SNAPSHOT)
+
+
+@pytest.mark.asyncio
+async def test_slow_subscribers_are_coalesced_then_evicted():
+    config = Config(
+        OPENAI_API_KEY="fake", GAME_ENGINE_SUBSCRIBER_QUEUE_SIZE=2,
+        GAME_ENGINE_SLOW_SUBSCRIBER_TIMEOUT=60)
+    ge = GameEngine(config)
+    game_id = (await ge.create_game(secrets=("4821", "8135"))).game_id
+    coalesced = coalesced_updates.value
+    listener = ge.listen_for_events(game_id)
+    await anext(listener)
+
+    guesses = ["1234", "5678", "1235", "9076"]
+    for code, player in zip(guesses, itertools.cycle([Player.PLAYER_1, Player.PLAYER_2])):
+        await ge.make_guess(game_id, code, player)
+    # two deltas, then a snapshot in place of them and of the third one, then a delta
+    (queue,) = ge.queue_manager.queues[game_id]
+    assert queue.qsize() == 2
+    assert coalesced_updates.value - coalesced == 3
+    events = [await anext(listener) for _ in range(2)]
+    assert [(event.id, event.type) for event in events] == [
+        (3, EventType.SNAPSHOT), (4, EventType.DELTA)]
+    assert queue.behind_since is None
+
+    evicted = evicted_subscribers.value
+    queue.evict_after = 0
+    for code, player in zip(guesses, itertools.cycle([Player.PLAYER_1, Player.PLAYER_2])):
+        await ge.make_guess(game_id, code, player)
+    assert await anext(listener, None) is None
+    assert evicted_subscribers.value - evicted == 1
+    assert game_id not in ge.queue_manager.queues
+
+
+@pytest.mark.asyncio
+async def test_queues_are_removed_when_streams_are_cancelled():
+    ge = GameEngine()
+    game_ids = [(await ge.create_game(secrets=("4821", "8135"))).game_id for _ in range(2)]
+
+    async def follow(game_id: str):
+        async for _ in ge.listen_for_events(game_id):
+            pass
+
+    tasks = [asyncio.create_task(follow(game_id)) for game_id in game_ids + game_ids[:1]]
+    await asyncio.sleep(0)
+    assert {game_id: len(queues) for game_id, queues in ge.queue_manager.queues.items()} == {
+        game_ids[0]: 2, game_ids[1]: 1}
+
+    # the client of the second game disconnects
+    tasks[1].cancel()
+    await asyncio.gather(tasks[1], return_exceptions=True)
+    assert list(ge.queue_manager.queues) == [game_ids[0]]
+
+    ge.config = Config(OPENAI_API_KEY="fake", GAME_ENGINE_GAME_TIMEOUT=-1)
+    await ge.cleanup_games()
+    await asyncio.gather(tasks[0], tasks[2])
+    assert ge.games == {} and ge.queue_manager.queues == {}
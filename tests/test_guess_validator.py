@@ -0,0 +1,72 @@
+import pytest
+from chains.guess_validator import GuessValidator
+from chains.guesser_v3 import AsyncGuesserV3
+from chains.guesser_v3_rules import respond
+from chains.response_cache import ResponseCache
+from models.guesser_v3 import State
+
+
+def test_validator_rules():
+    validator = GuessValidator(simplified=True)
+    assert validator.check("1234") is None
+    assert validator.check("1123") is not None
+    assert validator.check("123") is not None
+
+    validator.record_feedback("1234", (0, 0))
+    # any ordering of the same digits is a repeated guess in the simplified game
+    assert validator.check("4321") is not None
+    # the 5 has not been ruled out, so the feedback still tells candidates apart
+    assert validator.check("1235") is None
+    validator.record_feedback("5678", (2, 0))
+    assert validator.check("1290") is not None
+    assert validator.check("5690") is None
+
+
+def test_validator_require_consistent():
+    validator = GuessValidator(simplified=True, require_consistent=True)
+    validator.record_feedback("1234", (0, 0))
+    assert validator.check("1567") is not None
+    assert validator.check("5678") is None
+    assert validator.fallback() in validator.solver.candidates
+
+
+def scripted_invoke(guesses: list[str]):
+    """Replacement for AsyncGuesserV3._invoke returning the rule engine response
+    with the guess replaced by the scripted one."""
+    calls = []
+
+    async def invoke(chain, inputs, max_retries):
+        calls.append(inputs)
+        response = respond(State(), None, None)
+        response.guess = guesses[len(calls) - 1]
+        return response
+    return invoke, calls
+
+
+@pytest.mark.asyncio
+async def test_guesser_v3_reprompts_invalid_guess():
+    guesser = AsyncGuesserV3(max_repairs=1, response_cache=ResponseCache())
+    guesser._invoke, calls = scripted_invoke(["1123", "1234"])
+    guess = await guesser.guess()
+
+    assert guess is not None and guess.guess == "1234"
+    assert "rejection_reason" in calls[1]
+    assert guesser.validator.stats.reprompts == 1
+    assert guesser.validator.stats.repaired == 1
+
+
+@pytest.mark.asyncio
+async def test_guesser_v3_falls_back_to_local_guess():
+    guesser = AsyncGuesserV3(max_repairs=1, response_cache=ResponseCache())
+    guesser._invoke, _ = scripted_invoke(["1234", "4321", "4321"])
+    await guesser.guess()
+    state = guesser.state
+    await guesser.provide_feedback((1, 0))
+    guess = await guesser.guess()
+
+    assert guess is not None
+    assert guess.guess in guesser.validator.solver.candidates
+    # the state of the rejected response is not carried over to the next turn
+    assert guesser.state is state
+    assert guesser.validator.stats.accepted == 1
+    assert guesser.validator.stats.fallback == 1
@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+from chains.guesser_v3 import AsyncGuesserV3
+from config import Config
+from llm_client_provider import LLMClientProvider
+
+
+def test_chat_model_shared_per_model():
+    provider = LLMClientProvider(Config(OPENAI_API_KEY="test"))
+    model = provider.get_chat_model("gpt-5-nano")
+    assert provider.get_chat_model("gpt-5-nano") is model
+    assert provider.get_chat_model("gpt-5-mini") is not model
+
+    guesser_1 = AsyncGuesserV3(model="gpt-5-nano", client_provider=provider, game_id="a")
+    guesser_2 = AsyncGuesserV3(model="gpt-5-nano", client_provider=provider, game_id="b")
+    assert guesser_1.chain is guesser_2.chain
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limits():
+    provider = LLMClientProvider(Config(
+        OPENAI_API_KEY="test", LLM_MAX_CONCURRENT_REQUESTS=3,
+        LLM_MAX_CONCURRENT_REQUESTS_PER_GAME=2))
+    peak = {"total": 0, "a": 0, "b": 0}
+    running = {"total": 0, "a": 0, "b": 0}
+
+    async def request(game_id: str):
+        async with provider.limit(game_id):
+            for key in ("total", game_id):
+                running[key] += 1
+                peak[key] = max(peak[key], running[key])
+            assert provider.in_flight == running["total"]
+            await asyncio.sleep(0.01)
+            for key in ("total", game_id):
+                running[key] -= 1
+
+    await asyncio.gather(*[request(game_id) for game_id in "ab" * 4])
+    assert peak["total"] == 3
+    assert peak["a"] == 2
+    assert peak["b"] == 2
+    assert provider.in_flight == 0
@@ -0,0 +1,41 @@
+import json
+import logging
+from pathlib import Path
+from logger_provider import LoggerProvider, LogSettings
+
+
+def test_async_json_logging_with_debug_sampling(tmp_path: Path):
+    LoggerProvider.configure(LogSettings(
+        level="DEBUG", directory=str(tmp_path), asynchronous=True, json_format=True,
+        debug_sample_rate=0.25))
+    try:
+        log = LoggerProvider.get_logger("test_logger_provider")
+        state = {"round": 1}
+        log.info("Round: %s", state)
+        state["round"] = 2  # logged arguments are captured when the call is made
+        for i in range(8):
+            log.debug("Debug %d", i)
+        log.warning("Done")
+    finally:
+        LoggerProvider.configure(LogSettings())
+    entries = [json.loads(line)
+               for line in (tmp_path / "test_logger_provider.log").read_text().splitlines()]
+    assert [entry["message"] for entry in entries] == [
+        "Round: {'round': 1}", "Debug 0", "Debug 4", "Done"]
+    assert entries[0]["level"] == "INFO"
+    assert entries[0]["logger"] == "test_logger_provider"
+
+
+def test_level_from_settings(tmp_path: Path):
+    LoggerProvider.configure(LogSettings(
+        level="WARNING", directory=str(tmp_path), asynchronous=False))
+    try:
+        log = LoggerProvider.get_logger("test_logger_provider_level")
+        assert not log.isEnabledFor(logging.INFO)
+        log.info("hidden")
+        log.error("Error %s", 1)
+    finally:
+        LoggerProvider.configure(LogSettings())
+    lines = (tmp_path / "test_logger_provider_level.log").read_text().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith(" - ERROR - Error 1")
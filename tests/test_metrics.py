@@ -0,0 +1,126 @@
+import pytest
+from chains.guesser_v3 import AsyncGuesserV3
+from chains.response_cache import ResponseCache
+from config import Config
+from game_engine import GameEngine, Player
+from llm_client_provider import LLMClientProvider
+from metrics import (
+    HTTP_REQUEST_SECONDS, LLM_CALL_SECONDS, LLM_CALLS, LLM_TOKENS, STAGE_SECONDS, Histogram,
+    MetricsRegistry, timed)
+from tests.agent_test_runner import test_agent_simplified_async as run_agent_simplified_async
+
+FAKE_MODEL = "fake:solver"
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = Histogram(buckets=(0.1, 1.0, float("inf")))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(5.6)
+    assert histogram.percentile(0.5) == 0.1
+    assert histogram.percentile(0.75) == 1.0
+    assert histogram.percentile(1.0) == float("inf")
+
+
+@pytest.mark.asyncio
+async def test_timed_functions():
+    registry = MetricsRegistry.get_registry()
+
+    @timed("test_seconds", stage="sync")
+    def work() -> int:
+        return 1
+
+    @timed("test_seconds", stage="async")
+    async def async_work() -> int:
+        return 2
+
+    before = registry.histogram("test_seconds", stage="sync").count
+    assert work() == 1
+    assert await async_work() == 2
+    assert registry.histogram("test_seconds", stage="sync").count == before + 1
+    assert registry.histogram("test_seconds", stage="async").count >= 1
+
+
+@pytest.mark.asyncio
+async def test_turn_stages_and_tokens_recorded():
+    registry = MetricsRegistry.get_registry()
+    registry.reset()
+    guesser = AsyncGuesserV3(
+        model=FAKE_MODEL, response_cache=ResponseCache(),
+        client_provider=LLMClientProvider(Config(OPENAI_API_KEY="test", FAKE_LLM_LATENCY_MEDIAN=0)))
+    success, attempts = await run_agent_simplified_async(guesser, "4821", max_attempts=10)
+    assert success
+    assert registry.histogram(STAGE_SECONDS, stage="prompt").count == attempts
+    assert registry.histogram(STAGE_SECONDS, stage="parse").count == attempts
+    assert registry.histogram(LLM_CALL_SECONDS, model=FAKE_MODEL).count == attempts
+    assert registry.counter(LLM_CALLS, model=FAKE_MODEL).value == attempts
+    assert registry.counter(LLM_TOKENS, model=FAKE_MODEL, type="input").value \
+        == guesser.token_usage.input_tokens
+    assert registry.counter(LLM_TOKENS, model=FAKE_MODEL, type="output").value \
+        == guesser.token_usage.output_tokens
+
+    engine = GameEngine()
+    game = await engine.create_game(secrets=("0123", "4567"))
+    await engine.make_guess(game.game_id, "0123", Player.PLAYER_1)
+    assert registry.histogram(STAGE_SECONDS, stage="make_guess").count == 1
+    assert registry.histogram(STAGE_SECONDS, stage="sse_publish").count == 1
+    names = {entry["name"] for entry in registry.snapshot()["histograms"]}
+    assert {STAGE_SECONDS, LLM_CALL_SECONDS} <= names
+
+
+def test_prometheus_exposition():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", buckets=(0.1, float("inf")), route="/a")
+    histogram.observe(0.05)
+    histogram.observe(1.0)
+    registry.increment("rejections", route='say "hi"')
+    registry.gauge("games", lambda: 3)
+    registry.gauge("subscribers", lambda: {(("game_id", "g1"),): 2})
+    lines = registry.exposition(prefix="test_").splitlines()
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 2' in lines
+    assert 'test_latency_seconds_count{route="/a"} 2' in lines
+    assert 'test_rejections_total{route="say \\"hi\\""} 1.0' in lines
+    assert "test_games 3" in lines
+    assert 'test_subscribers{game_id="g1"} 2' in lines
+
+
+def test_server_metrics_endpoint(monkeypatch):
+    from fastapi.testclient import TestClient
+    from fastapi_server import app, config
+
+    monkeypatch.setattr(config, "METRICS_TOKEN", "secret")
+
+    requests = MetricsRegistry.get_registry().histogram(
+        HTTP_REQUEST_SECONDS, method="GET", route="/get-game-updates")
+    before = requests.count
+    with TestClient(app) as client:
+        assert client.get("/get-game-updates", params={"game_id": "missing"}).status_code == 404
+        assert client.get("/metrics").status_code == 401
+        assert client.get(
+            "/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert requests.count == before + 1
+    lines = response.text.splitlines()
+    assert f'codebreaker_http_request_seconds_count{{method="GET",route="/get-game-updates"}} ' \
+        f'{before + 1}' in lines
+    assert "codebreaker_games_active 0" in lines
+    assert "codebreaker_guesser_tasks 0" in lines
+    assert "codebreaker_llm_in_flight 0" in lines
+    assert "codebreaker_sse_subscribers 0" in lines
+    assert "codebreaker_sse_queue_depth_max 0" in lines
+    assert "game_id" not in response.text
+
+
+def test_metrics_endpoint_disabled_without_token(monkeypatch):
+    from fastapi.testclient import TestClient
+    from fastapi_server import app, config
+
+    monkeypatch.setattr(config, "METRICS_TOKEN", "")
+    with TestClient(app) as client:
+        assert client.get("/metrics").status_code == 404
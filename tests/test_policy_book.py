@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from chains.guesser_policy_book import GuesserPolicyBook
+from chains.guesser_solver import GuesserSolver
+from feedback_table import CODES, SIMPLIFIED_CODE_IDS
+from policy_book import HEADER, PolicyBook
+from tests.agent_test_runner import test_agent_simplified as run_agent_simplified
+
+
+def test_policy_book_round_trip(tmp_path):
+    book = PolicyBook.build(simplified=True)
+    path = tmp_path / "simplified.cbpb"
+    book.save(path)
+    loaded = PolicyBook.load(path)
+
+    assert loaded.simplified
+    assert loaded.strategy == book.strategy
+    assert np.array_equal(loaded.guesses, book.guesses)
+    assert np.array_equal(loaded.children, book.children)
+    # written to a temporary file renamed into place
+    assert [entry.name for entry in tmp_path.iterdir()] == ["simplified.cbpb"]
+
+
+def test_policy_book_unknown_strategy(tmp_path):
+    path = tmp_path / "simplified.cbpb"
+    PolicyBook.build(simplified=True).save(path)
+    data = bytearray(path.read_bytes())
+    magic, version, simplified, _, feedback_count, node_count = HEADER.unpack_from(data)
+    HEADER.pack_into(data, 0, magic, version, simplified, 9, feedback_count, node_count)
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        PolicyBook.load(path)
+
+
+def test_policy_book_matches_solver():
+    book = PolicyBook.build(simplified=True)
+    for secret in [CODES[i] for i in SIMPLIFIED_CODE_IDS[::10]]:
+        book_guesser = GuesserPolicyBook(book=book)
+        solver = GuesserSolver(simplified=True, strategy=book.strategy)
+        success, attempts = run_agent_simplified(book_guesser, secret)
+        assert success
+        assert (success, attempts) == run_agent_simplified(solver, secret)
@@ -0,0 +1,17 @@
+from chains.guesser_v1 import AsyncGuesserV1, GuesserV1
+from chains.guesser_v3 import AsyncGuesserV3, GuesserV3
+from chains.registry import AgentRegistry
+from models.guesser_v3 import GuesserV3Response
+
+
+def test_guessers_share_agents_and_chains():
+    assert GuesserV1().agent is AsyncGuesserV1().agent
+    assert GuesserV3().chain is AsyncGuesserV3().chain
+    assert AsyncGuesserV3(model="gpt-5-nano").chain is not AsyncGuesserV3().chain
+
+
+def test_agent_per_system_prompt():
+    agent = AgentRegistry.get_agent("gpt-5-nano", GuesserV3Response)
+    assert AgentRegistry.get_agent("gpt-5-nano", GuesserV3Response) is agent
+    assert AgentRegistry.get_agent(
+        "gpt-5-nano", GuesserV3Response, system_prompt="Guess.") is not agent
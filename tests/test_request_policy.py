@@ -0,0 +1,125 @@
+import asyncio
+from time import perf_counter
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from chains.guesser_v3 import AsyncGuesserV3
+from chains.guesser_v3_rules import respond
+from chains.response_cache import ResponseCache
+from config import Config
+from models.guesser_v3 import State
+from request_policy import LOCAL, LatencyWindow, RequestPolicy
+
+
+def policy(**settings) -> RequestPolicy:
+    return RequestPolicy(Config(OPENAI_API_KEY="test", **settings))
+
+
+def test_latency_window_percentiles():
+    window = LatencyWindow(size=100)
+    for latency in range(1, 201):
+        window.add(latency / 100)
+    # only the most recent 100 samples are kept
+    assert window.summary() == {"count": 100, "p50": 1.51, "p95": 1.96, "p99": 2.0}
+
+
+@pytest.mark.asyncio
+async def test_deadline():
+    request_policy = policy(LLM_REQUEST_DEADLINE=0.05)
+
+    async def stalled():
+        await asyncio.sleep(10)
+
+    with pytest.raises(TimeoutError):
+        await request_policy.run("model", stalled)
+    assert request_policy.stats.deadlines == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_starts_once_the_slot_is_held():
+    request_policy = policy(LLM_REQUEST_DEADLINE=0.05)
+    slots = asyncio.Semaphore(1)
+
+    async def busy():
+        async with slots:
+            await asyncio.sleep(0.2)
+
+    other_game = asyncio.create_task(busy())
+    await asyncio.sleep(0)
+    # waiting for the slot longer than the deadline does not count against the call
+    assert await request_policy.run(
+        "model", lambda: asyncio.sleep(0.01, "answer"), slot=lambda: slots) == "answer"
+    assert request_policy.stats.deadlines == 0
+    assert request_policy.call_latency["model"].samples[0] < 0.05
+    await other_game
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins():
+    request_policy = policy(LLM_HEDGE_PERCENTILE=0.95, LLM_HEDGE_MIN_SAMPLES=5)
+    assert request_policy.hedge_after("model") is None
+    for _ in range(5):
+        await request_policy.run("model", lambda: asyncio.sleep(0.01, "fast"))
+    assert request_policy.hedge_after("model") is not None
+
+    delays = iter([10, 0.01])
+
+    async def first_call_stalls():
+        await asyncio.sleep(next(delays))
+        return "answer"
+
+    started_at = perf_counter()
+    assert await request_policy.run("model", first_call_stalls) == "answer"
+    assert perf_counter() - started_at < 1
+    assert request_policy.stats.hedges == 1
+    assert request_policy.stats.hedge_wins == 1
+
+
+def guesser_with_chains(request_policy: RequestPolicy, main, fallbacks) -> AsyncGuesserV3:
+    guesser = AsyncGuesserV3(response_cache=ResponseCache(), request_policy=request_policy)
+    guesser.chain = RunnableLambda(main)
+    guesser.fallback_chains = [
+        (model, RunnableLambda(chain), RunnableLambda(chain)) for model, chain in fallbacks]
+    return guesser
+
+
+async def stalled_model(inputs):
+    await asyncio.sleep(10)
+
+
+async def failing_model(inputs):
+    raise ValueError("unavailable")
+
+
+async def rule_engine_model(inputs):
+    return {"structured_response": respond(State(), None, None)}
+
+
+@pytest.mark.asyncio
+async def test_cascade_moves_past_stalled_model():
+    request_policy = policy(LLM_REQUEST_DEADLINE=0.05)
+    guesser = guesser_with_chains(
+        request_policy, stalled_model,
+        [("gpt-5-nano", failing_model), ("gpt-4.1-mini", rule_engine_model)])
+
+    guess = await guesser.guess(max_retries=2)
+    assert guess is not None and guess.guess == "1234"
+    assert guesser.last_model == "gpt-4.1-mini"
+    assert request_policy.stats.deadlines == 1
+    assert request_policy.stats.fallbacks == 2
+    # the stalled model is not retried, the failing one is
+    assert request_policy.stats.calls == 4
+    assert request_policy.latency_report()["gpt-4.1-mini"]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_local_rule_engine_answers_when_all_models_fail():
+    request_policy = policy()
+    guesser = guesser_with_chains(request_policy, failing_model, [])
+
+    guess = await guesser.guess(max_retries=1)
+    assert guess is not None and guess.guess == "1234"
+    assert request_policy.stats.local == 1
+    assert guesser.validator.stats.fallback == 1
+    assert request_policy.latency_report()[LOCAL]["count"] == 1
@@ -0,0 +1,127 @@
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from chains.guesser_v3 import AsyncGuesserV3
+from chains.guesser_v3_rules import respond
+from chains.response_cache import ResponseCache
+from models.guesser_v3 import GuesserV3Response, State
+
+
+def test_key_is_canonical():
+    key = ResponseCache.key("guesser_v3:model", {"round": 1, "feedback": None})
+    assert key == ResponseCache.key("guesser_v3:model", {"feedback": None, "round": 1})
+    assert key != ResponseCache.key("guesser_v3:other", {"round": 1, "feedback": None})
+
+
+def test_memory_lru_eviction():
+    cache = ResponseCache(memory_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    # "b" is the least recently used entry
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats.evictions == 1
+    assert cache.stats.memory_hits == 3
+    assert cache.stats.misses == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    cache = ResponseCache(path=path)
+    response = respond(State(), None, None)
+    cache.put_response("turn", response)
+    cache.close()
+
+    cache = ResponseCache(path=path)
+    assert cache.get_response("turn", GuesserV3Response) == response
+    assert cache.stats.disk_hits == 1
+    # the second read is served from memory
+    assert cache.get("turn") is not None
+    assert cache.stats.memory_hits == 1
+    cache.close()
+
+
+def test_expired_entries_are_ignored(tmp_path):
+    cache = ResponseCache(path=tmp_path / "responses.sqlite3", ttl=-1)
+    cache.put("a", "1")
+    assert cache.get("a") is None
+    assert cache.stats.misses == 1
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_guesser_v3_replays_cached_turn():
+    cache = ResponseCache()
+    calls = []
+
+    async def invoke(chain, inputs, max_retries):
+        calls.append(inputs)
+        return respond(State(), None, None)
+
+    first = AsyncGuesserV3(response_cache=cache)
+    first._invoke = invoke
+    second = AsyncGuesserV3(response_cache=cache)
+    second._invoke = invoke
+
+    assert (await first.guess()) == (await second.guess())
+    assert len(calls) == 1
+    assert second.state == first.state
+    assert cache.stats.memory_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_guesser_v3_caches_fallback_answer_as_fallback_model():
+    cache = ResponseCache()
+
+    async def failing_model(inputs):
+        raise ValueError("unavailable")
+
+    async def rule_engine_model(inputs):
+        return {"structured_response": respond(State(), None, None)}
+
+    first = AsyncGuesserV3(model="gpt-4.1", response_cache=cache)
+    first.chain = RunnableLambda(failing_model)
+    first.fallback_chains = [
+        ("gpt-4.1-mini", RunnableLambda(rule_engine_model), RunnableLambda(rule_engine_model))]
+    await first.guess(max_retries=1)
+    assert first.last_model == "gpt-4.1-mini"
+
+    # the answer of the fallback model is not replayed as the answer of gpt-4.1
+    calls = []
+
+    async def invoke(chain, inputs, max_retries):
+        calls.append(inputs)
+        return respond(State(), None, None)
+
+    second = AsyncGuesserV3(model="gpt-4.1", response_cache=cache)
+    second._invoke = invoke
+    await second.guess()
+    assert len(calls) == 1
+    third = AsyncGuesserV3(model="gpt-4.1-mini", response_cache=cache)
+    third._invoke = invoke
+    await third.guess()
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_disk_tier(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    cache = ResponseCache(path=path)
+    response = respond(State(), None, None)
+    await cache.aput_response("turn", response)
+    cache.close()
+
+    cache = ResponseCache(path=path)
+    assert await cache.aget_response("turn", GuesserV3Response) == response
+    assert await cache.aget("missing") is None
+    assert (cache.stats.disk_hits, cache.stats.misses) == (1, 1)
+    cache.close()
+
+
+def test_guesser_v3_cache_can_be_disabled():
+    assert AsyncGuesserV3(response_cache=None).response_cache is None
+    cache = ResponseCache()
+    assert AsyncGuesserV3(response_cache=cache).response_cache is cache
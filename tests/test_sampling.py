@@ -0,0 +1,44 @@
+import pytest
+
+from chains.guesser_v3 import AsyncGuesserV3
+from chains.guesser_v3_rules import respond
+from chains.response_cache import ResponseCache
+from models.guesser_v3 import State
+
+
+def sampling_guesser(guesses: list[str]) -> tuple[AsyncGuesserV3, list[str]]:
+    """Guesser whose sampled responses are the rule engine response with scripted guesses."""
+    guesser = AsyncGuesserV3(response_cache=ResponseCache(), samples=3, sample_model="gpt-5-nano")
+    models = []
+
+    async def invoke(chain, inputs, max_retries, usage=None, speculative=False, model=None):
+        models.append(model)
+        response = respond(State(), None, None)
+        response.guess = guesses[len(models) - 1]
+        return response
+    guesser._invoke = invoke
+    return guesser, models
+
+
+@pytest.mark.asyncio
+async def test_sampling_plays_most_informative_guess():
+    guesser, models = sampling_guesser(["1234", "4321", "1235", "5678", "1290"])
+    await guesser.guess()
+    await guesser.provide_feedback((0, 0))
+
+    guess = await guesser.guess()
+    # 4321 repeats the first guess, 1235 only tests one unknown digit
+    assert guess is not None and guess.guess == "5678"
+    assert models == ["gpt-5-nano"] * 6
+    assert guesser.validator.stats.accepted == 2
+
+
+@pytest.mark.asyncio
+async def test_sampling_repairs_when_no_sample_is_valid():
+    guesser, models = sampling_guesser(["1123", "1223", "123", "1234"])
+    guess = await guesser.guess()
+    assert guess is not None and guess.guess == "1234"
+    # the correction goes to the guesser's own model
+    assert models[-1] is None
+    assert guesser.validator.stats.reprompts == 1
+    assert guesser.validator.stats.repaired == 1
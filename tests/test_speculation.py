@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage
+
+from chains.guesser_v3 import AsyncGuesserV3
+from chains.guesser_v3_rules import respond
+from chains.response_cache import ResponseCache
+from models.guesser_v3 import State
+
+LATENCY = 0.02
+USAGE = {"input_tokens": 100, "output_tokens": 10, "total_tokens": 110}
+
+
+def rule_engine_guesser(budget: int) -> tuple[AsyncGuesserV3, list[dict]]:
+    """Speculative guesser whose model is the local rule engine with a fixed latency."""
+    guesser = AsyncGuesserV3(
+        response_cache=ResponseCache(), speculative=True, speculation_budget=budget)
+    calls = []
+
+    async def invoke(chain, inputs, max_retries, usage=None, speculative=False):
+        calls.append(inputs)
+        await asyncio.sleep(LATENCY)
+        feedback = inputs["feedback"]
+        response = respond(
+            State.model_validate(inputs["current_state"]), inputs["previous_guess"],
+            int(feedback.split()[2]) if feedback is not None else None)
+        for token_usage in (guesser.token_usage, usage):
+            if token_usage is not None:
+                token_usage.add_response({"messages": [AIMessage("", usage_metadata=USAGE)]})
+        return response
+    guesser._invoke = invoke
+    return guesser, calls
+
+
+async def play(guesser: AsyncGuesserV3, secret: str) -> int:
+    for attempt in range(1, 11):
+        guess = await guesser.guess()
+        assert guess is not None
+        # the opponent's turn, longer than the model latency
+        await asyncio.sleep(LATENCY * 2)
+        await guesser.provide_feedback((len(set(secret) & set(guess.guess)), 0))
+        if sorted(guess.guess) == sorted(secret):
+            return attempt
+    raise AssertionError("secret not found")
+
+
+@pytest.mark.asyncio
+async def test_speculation_covers_every_feedback():
+    guesser, calls = rule_engine_guesser(budget=4)
+    rounds = await play(guesser, "4821")
+    stats = guesser.speculator.stats
+
+    assert stats.hits == rounds - 1
+    assert stats.misses == 0
+    # every turn after the first was computed during the opponent's turn
+    assert stats.time_saved >= (rounds - 1) * LATENCY * 0.9
+    assert stats.wasted_tokens == (stats.branches - stats.hits - stats.cancelled) * 110
+    # one normal request, then only speculative branches
+    assert len(calls) == 1 + stats.branches
+    # the last guess was the only candidate left, nothing to speculate on
+    assert stats.turns == rounds - 1
+
+
+@pytest.mark.asyncio
+async def test_speculation_budget_and_misses():
+    guesser, _ = rule_engine_guesser(budget=1)
+    rounds = await play(guesser, "0956")
+    stats = guesser.speculator.stats
+
+    assert stats.branches == stats.turns
+    assert stats.hits + stats.misses == rounds - 1
+    assert stats.misses > 0
+
+
+@pytest.mark.asyncio
+async def test_losing_branches_are_cancelled():
+    guesser, _ = rule_engine_guesser(budget=4)
+    await guesser.guess()
+    # feedback arrives before any branch finished
+    await asyncio.sleep(0)
+    await guesser.provide_feedback((1, 0))
+    stats = guesser.speculator.stats
+    assert stats.cancelled == stats.branches - 1
+    assert (await guesser.guess()) is not None
+    assert stats.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_aclose_cancels_branches_in_flight():
+    # the opponent won, no feedback will come for the last guess
+    guesser, _ = rule_engine_guesser(budget=4)
+    await guesser.guess()
+    await asyncio.sleep(0)
+    await guesser.aclose()
+    stats = guesser.speculator.stats
+    assert stats.branches > 0
+    assert stats.cancelled == stats.branches
@@ -0,0 +1,79 @@
+import pytest
+from langchain_core.runnables import RunnableLambda
+from pydantic import ValidationError
+
+from chains.guesser_v3 import AsyncGuesserV3, encode_state
+from chains.guesser_v3_rules import respond
+from chains.response_cache import ResponseCache
+from feedback_table import CODES, SIMPLIFIED_CODE_IDS
+from models.guesser_v3 import (
+    CompactGroupState, CompactGuesserV3Response, CompactState, GroupStage, State,
+    StateFormat)
+
+
+def test_compact_diff_roundtrip_all_digit_sets():
+    for code_id in SIMPLIFIED_CODE_IDS:
+        secret = CODES[code_id]
+        state, previous_guess, feedback = State(), None, None
+        for _ in range(10):
+            response = respond(state, previous_guess, feedback)
+            update = CompactState.diff(state, response.updated_state)
+            assert update.apply(state) == response.updated_state
+            if sorted(response.guess) == sorted(secret):
+                break
+            state, previous_guess = response.updated_state, response.guess
+            feedback = len(set(secret) & set(previous_guess))
+
+
+def test_compact_encoding():
+    state = respond(State(), "1234", 2).updated_state
+    update = CompactState.diff(State(), state)
+    assert update.to_wire() == '{"a":{"s":"C","m":2}}'
+    assert CompactState.model_validate_json(encode_state(state, StateFormat.COMPACT)) \
+        .apply(State()) == state
+    assert encode_state(state, StateFormat.FULL) == state.model_dump(mode="json")
+
+
+@pytest.mark.asyncio
+async def test_guesser_v3_merges_compact_update():
+    guesser = AsyncGuesserV3(state_format=StateFormat.COMPACT, response_cache=ResponseCache())
+    update = CompactState.model_validate({"a": {"s": "counted", "m": 1}})
+
+    async def model(inputs):
+        return {"structured_response": CompactGuesserV3Response(
+            state_update=update, guess="1234", reasoning="", comments="")}
+    guesser.chain = RunnableLambda(model)
+
+    guess = await guesser.guess()
+    assert guess is not None and guess.guess == "1234"
+    assert guesser.state.group_a.stage == GroupStage.COUNTED
+    assert guesser.state.group_a.matches == 1
+    # fields missing from the update keep their value
+    assert guesser.state.group_a.digits == [1, 2, 3, 4]
+    assert guesser.state.group_b == State().group_b
+
+
+def test_compact_unknown_stage_is_rejected():
+    with pytest.raises(ValidationError):
+        CompactState.model_validate({"a": {"s": "X"}})
+    with pytest.raises(ValidationError):
+        CompactState.model_validate({"a": {"s": ""}})
+
+
+@pytest.mark.asyncio
+async def test_guesser_v3_retries_undecodable_response():
+    guesser = AsyncGuesserV3(state_format=StateFormat.COMPACT, response_cache=ResponseCache())
+    updates = iter([
+        # a response the structured output did not validate
+        CompactState.model_construct(a=CompactGroupState.model_construct(s="X")),
+        CompactState.model_validate({"a": {"s": "C", "m": 1}})])
+
+    async def model(inputs):
+        return {"structured_response": CompactGuesserV3Response.model_construct(
+            state_update=next(updates), guess="1234", reasoning="", comments="")}
+    guesser.chain = RunnableLambda(model)
+
+    guess = await guesser.guess(max_retries=2)
+    assert guess is not None and guess.guess == "1234"
+    assert guesser.state.group_a.stage == GroupStage.COUNTED
+    assert guesser.validator.stats.fallback == 0
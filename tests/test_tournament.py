@@ -0,0 +1,69 @@
+import pytest
+from pathlib import Path
+from benchmarks import tournament
+from benchmarks.tournament import (
+    Match, load_results, matches, play_local, run_tournament, summarize)
+from config import Config
+from llm_client_provider import LLMClientProvider
+
+SECRETS = ["0123", "4567", "9081"]
+
+
+@pytest.mark.asyncio
+async def test_tournament_plays_and_resumes(tmp_path: Path):
+    client_provider = LLMClientProvider(Config(
+        OPENAI_API_KEY="fake", FAKE_LLM_LATENCY_MEDIAN=0, RESPONSE_CACHE_ENABLED=False))
+    path = tmp_path / "results.jsonl"
+    first = matches(["v3", "solver"], ["fake:solver"], SECRETS[:2])
+    results = await run_tournament(first, path, workers=1, client_provider=client_provider)
+    assert len(results) == 4
+    assert all(result.success and result.error is None for result in results)
+    assert all(result.input_tokens > 0 for result in results if result.guesser == "v3")
+
+    # only the new secret is played on resume
+    second = matches(["v3", "solver"], ["fake:solver"], SECRETS)
+    results = await run_tournament(second, path, workers=1, client_provider=client_provider)
+    assert len(results) == 6
+    assert len(path.read_text().splitlines()) == 6
+    assert len(load_results(path)) == 6
+
+    summary = {(row["guesser"], row["model"]): row for row in summarize(results)}
+    assert summary[("solver", "local")]["win_rate"] == 1.0
+    assert summary[("v3", "fake:solver")]["games"] == 3
+    assert summary[("v3", "fake:solver")]["tokens_mean"] > 0
+
+
+@pytest.mark.asyncio
+async def test_tournament_sampled_configurations(tmp_path: Path):
+    client_provider = LLMClientProvider(Config(
+        OPENAI_API_KEY="fake", FAKE_LLM_LATENCY_MEDIAN=0, RESPONSE_CACHE_ENABLED=False))
+    path = tmp_path / "results.jsonl"
+    to_play = matches(["v1", "v3"], ["fake:solver"], SECRETS[:2], samples=[1, 3])
+    # only the guessers that sample play each number of samples
+    assert sorted({(match.guesser, match.samples) for match in to_play}) == [
+        ("v1", 1), ("v3", 1), ("v3", 3)]
+    to_play = [match for match in to_play if match.guesser == "v3"]
+    results = await run_tournament(to_play, path, client_provider=client_provider)
+    assert len(results) == 4 and len(load_results(path)) == 4
+    assert all(result.success and result.error is None for result in results)
+
+    summary = {row["samples"]: row for row in summarize(results)}
+    assert summary[1]["rounds_saved"] == 0.0 and summary[1]["extra_tokens"] == 0.0
+    assert summary[3]["extra_tokens"] > 0
+    assert summary[3]["rounds_saved"] == summary[1]["rounds_mean"] - summary[3]["rounds_mean"]
+
+
+def test_unknown_guesser():
+    with pytest.raises(ValueError):
+        matches(["v9"], ["fake:solver"], SECRETS)
+
+
+def test_local_match_error_is_recorded(monkeypatch):
+    class BrokenGuesser:
+        def guess(self):
+            raise RuntimeError("broken")
+
+    monkeypatch.setattr(tournament, "local_guessers", lambda: {"solver": BrokenGuesser})
+    result = play_local(Match(guesser="solver", model="local", secret="0123"), 20)
+    assert not result.success
+    assert result.error == "RuntimeError('broken')"
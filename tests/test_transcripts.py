@@ -0,0 +1,62 @@
+import pytest
+
+from chains.guesser_v1 import AsyncGuesserV1
+from chains.guesser_v3 import AsyncGuesserV3
+from chains.response_cache import ResponseCache
+from config import Config
+from llm_client_provider import LLMClientProvider
+from tests.agent_test_runner import test_agent_simplified_async as run_agent_simplified_async
+from transcripts import Transcript, TranscriptEntry
+
+
+def provider(path, **settings) -> LLMClientProvider:
+    return LLMClientProvider(Config(
+        OPENAI_API_KEY="test", FAKE_LLM_LATENCY_MEDIAN=0, LLM_TRANSCRIPT_PATH=str(path),
+        **settings))
+
+
+async def play(model: str, client_provider: LLMClientProvider) -> tuple[list[str], int]:
+    guesses = []
+    guesser = AsyncGuesserV3(
+        model=model, client_provider=client_provider, response_cache=ResponseCache())
+    guess = guesser.guess
+
+    async def recorded_guess():
+        response = await guess()
+        guesses.append(response.guess)
+        return response
+    guesser.guess = recorded_guess
+    success, _ = await run_agent_simplified_async(guesser, "4821", max_attempts=10)
+    assert success
+    return guesses, guesser.token_usage.total_tokens
+
+
+@pytest.mark.asyncio
+async def test_record_and_replay(tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    recorded, recorded_tokens = await play(
+        "fake:solver", provider(path, LLM_RECORD_TRANSCRIPTS=True))
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == len(recorded)
+    entry = TranscriptEntry.model_validate_json(lines[0])
+    assert entry.model == "fake:solver"
+    assert entry.tool == "GuesserV3Response"
+    assert entry.output is not None and entry.output["guess"] == recorded[0]
+    assert entry.usage is not None and entry.latency >= 0
+
+    replayed, replayed_tokens = await play("fake:replay", provider(path))
+    assert replayed == recorded
+    assert replayed_tokens == recorded_tokens
+    transcript = Transcript.get_transcript(path)
+    assert transcript.hits == len(recorded)
+    assert transcript.misses == 0
+
+
+@pytest.mark.asyncio
+async def test_replay_miss_fails(tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    path.write_text("")
+    guesser = AsyncGuesserV1(model="fake:replay", client_provider=provider(path))
+    with pytest.raises(LookupError):
+        await guesser.guess()
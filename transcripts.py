@@ -0,0 +1,165 @@
+"""
+Append-only JSONL transcripts of chat model calls, and their deterministic replay.
+
+With `LLM_RECORD_TRANSCRIPTS` every call made through `LLMClientProvider` is appended to
+`LLM_TRANSCRIPT_PATH` as one JSON object: the prompt, the structured output, the token
+usage and the latency. The `fake:replay` model serves the recorded outputs back,
+matching calls by the system and human messages of the prompt, which fully determine
+the turn for every guesser (AI and tool messages differ between structured output
+strategies and are ignored).
+"""
+import hashlib
+import json
+import threading
+from pathlib import Path
+from time import perf_counter, time
+from typing import Any, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import LLMResult
+from pydantic import BaseModel
+
+from logger_provider import LoggerProvider
+
+log = LoggerProvider.get_logger('transcripts')
+
+KEY_MESSAGE_TYPES = ("system", "human")
+
+
+def message_text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content)
+
+
+def transcript_key(messages: Sequence[BaseMessage]) -> str:
+    """Hash of the system and human messages of a prompt."""
+    prompt = [(message.type, message_text(message)) for message in messages
+              if message.type in KEY_MESSAGE_TYPES]
+    return hashlib.sha256(json.dumps(prompt).encode()).hexdigest()
+
+
+def structured_output(message: AIMessage) -> tuple[str | None, dict | None]:
+    """(tool name, arguments) of a structured output tool call, or of a JSON answer."""
+    if message.tool_calls:
+        return message.tool_calls[0]["name"], message.tool_calls[0]["args"]
+    try:
+        output = json.loads(message_text(message))
+    except json.JSONDecodeError:
+        return None, None
+    return None, output if isinstance(output, dict) else None
+
+
+class TranscriptEntry(BaseModel):
+    """One recorded chat model call."""
+    key: str
+    model: str
+    recorded_at: float
+    latency: float  # seconds
+    tool: str | None  # structured output tool, None for provider-native structured output
+    output: dict | None
+    usage: dict[str, int] | None
+    messages: list[tuple[str, str]]
+
+
+class TranscriptWriter:
+    """Appends entries to a JSONL file, one writer per path shared by all recorders."""
+    __writers: dict[Path, "TranscriptWriter"] = {}
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.__file = path.open("a", encoding="utf-8")
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def get_writer(cls, path: str | Path) -> "TranscriptWriter":
+        path = Path(path).resolve()
+        if path not in cls.__writers:
+            cls.__writers[path] = cls(path)
+        return cls.__writers[path]
+
+    def write(self, entry: TranscriptEntry) -> None:
+        line = entry.model_dump_json() + "\n"
+        with self.__lock:
+            self.__file.write(line)
+            self.__file.flush()
+
+
+class TranscriptRecorder(BaseCallbackHandler):
+    """Callback handler of a chat model recording each of its calls."""
+    run_inline = True
+
+    def __init__(self, writer: TranscriptWriter, model: str):
+        self.writer = writer
+        self.model = model
+        self.__pending: dict[UUID, tuple[list[BaseMessage], float]] = {}
+
+    def on_chat_model_start(
+            self, serialized: dict[str, Any], messages: list[list[BaseMessage]], *,
+            run_id: UUID, **kwargs: Any) -> None:
+        self.__pending[run_id] = (messages[0], perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        pending = self.__pending.pop(run_id, None)
+        if pending is None:
+            return
+        messages, started_at = pending
+        message = getattr(response.generations[0][0], "message", None)
+        if not isinstance(message, AIMessage):
+            return
+        tool, output = structured_output(message)
+        self.writer.write(TranscriptEntry(
+            key=transcript_key(messages), model=self.model, recorded_at=time(),
+            latency=perf_counter() - started_at, tool=tool, output=output,
+            usage=dict(message.usage_metadata) if message.usage_metadata else None,
+            messages=[(message.type, message_text(message)) for message in messages]))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.__pending.pop(run_id, None)
+
+
+class Transcript:
+    """
+    Recorded outputs by prompt, loaded from a JSONL transcript.
+    Use `Transcript.get_transcript(path)` to share one instance per file.
+    """
+    __transcripts: dict[Path, "Transcript"] = {}
+
+    def __init__(self, entries: list[TranscriptEntry]):
+        self.entries: dict[str, TranscriptEntry] = {}
+        for entry in entries:
+            if entry.output is not None:
+                # the latest recording of a prompt wins
+                self.entries[entry.key] = entry
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Transcript":
+        with Path(path).open(encoding="utf-8") as file:
+            entries = [TranscriptEntry.model_validate_json(line) for line in file if line.strip()]
+        log.info("Loaded %s transcript entries from %s", len(entries), path)
+        return cls(entries)
+
+    @classmethod
+    def get_transcript(cls, path: str | Path) -> "Transcript":
+        resolved = Path(path).resolve()
+        if resolved not in cls.__transcripts:
+            cls.__transcripts[resolved] = cls.load(resolved)
+        return cls.__transcripts[resolved]
+
+    def replay(self, messages: Sequence[BaseMessage]) -> TranscriptEntry:
+        entry = self.entries.get(transcript_key(messages))
+        if entry is None:
+            self.misses += 1
+            raise LookupError("No recorded response for this prompt")
+        self.hits += 1
+        return entry
+
+
+def get_recorder(path: str | Path, model: str) -> Optional[TranscriptRecorder]:
+    """Recorder for `model`, None for models that replay transcripts themselves."""
+    if model == "fake:replay":
+        return None
+    return TranscriptRecorder(TranscriptWriter.get_writer(path), model)